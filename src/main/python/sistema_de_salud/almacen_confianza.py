@@ -0,0 +1,86 @@
+"""Module almacen_confianza"""
+import os
+import threading
+from datetime import datetime, timezone
+
+from cryptography.hazmat.primitives import hashes
+
+
+class AlmacenConfianza:
+    """Trust store: caché de certificados ya cargados y de cadenas de certificación ya verificadas.
+    Una cadena verificada se da por buena sin volver a comprobar las firmas hasta que caduque
+    el primero de sus certificados"""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # ruta -> ((mtime, tamaño) del fichero, certificado)
+        self.__certificados = {}
+        # (huella usuario, huella ACS, huella ACR) -> not_valid_after_utc más próximo de la cadena
+        self.__cadenas = {}
+        self.__aciertos = 0
+        self.__fallos = 0
+
+    @staticmethod
+    def __firma_fichero(ruta: str):
+        """Devuelve (mtime, tamaño) del fichero"""
+        stat = os.stat(ruta)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def huella(cert) -> bytes:
+        """Huella SHA-256 de un certificado"""
+        return cert.fingerprint(hashes.SHA256())
+
+    def obtener_certificado(self, ruta: str, cargar):
+        """Devuelve el certificado del fichero ruta, llamando a cargar(ruta) solo si no está en la caché"""
+        firma = self.__firma_fichero(ruta)
+        with self.__lock:
+            entrada = self.__certificados.get(ruta)
+            if entrada is not None and entrada[0] == firma:
+                return entrada[1]
+        cert = cargar(ruta)
+        self.guardar_certificado(ruta, cert, firma)
+        return cert
+
+    def guardar_certificado(self, ruta: str, cert, firma=None) -> None:
+        """Añade a la caché un certificado guardado en el fichero ruta"""
+        if firma is None:
+            firma = self.__firma_fichero(ruta)
+        with self.__lock:
+            self.__certificados[ruta] = (firma, cert)
+
+    def __clave_cadena(self, cert_usuario, cert_acs, cert_acr) -> tuple:
+        """Clave de una cadena de certificación"""
+        return self.huella(cert_usuario), self.huella(cert_acs), self.huella(cert_acr)
+
+    def cadena_verificada(self, cert_usuario, cert_acs, cert_acr) -> bool:
+        """Comprueba si la cadena ya se verificó y ninguno de sus certificados ha caducado desde entonces"""
+        clave = self.__clave_cadena(cert_usuario, cert_acs, cert_acr)
+        with self.__lock:
+            caducidad = self.__cadenas.get(clave)
+            if caducidad is not None and datetime.now(timezone.utc) < caducidad:
+                self.__aciertos += 1
+                return True
+            # Cadena desconocida o caducada: hay que verificarla de nuevo
+            self.__cadenas.pop(clave, None)
+            self.__fallos += 1
+            return False
+
+    def registrar_cadena(self, cert_usuario, cert_acs, cert_acr) -> None:
+        """Recuerda una cadena verificada hasta el not_valid_after_utc más próximo de sus certificados"""
+        clave = self.__clave_cadena(cert_usuario, cert_acs, cert_acr)
+        caducidad = min(cert_usuario.not_valid_after_utc, cert_acs.not_valid_after_utc, cert_acr.not_valid_after_utc)
+        with self.__lock:
+            self.__cadenas[clave] = caducidad
+
+    def vaciar(self) -> None:
+        """Olvida los certificados y las cadenas verificadas"""
+        with self.__lock:
+            self.__certificados.clear()
+            self.__cadenas.clear()
+
+    def estadisticas(self) -> dict:
+        """Devuelve los aciertos y fallos de las cadenas verificadas y el tamaño de las cachés"""
+        with self.__lock:
+            return {"aciertos": self.__aciertos, "fallos": self.__fallos,
+                    "certificados": len(self.__certificados), "cadenas": len(self.__cadenas)}
@@ -0,0 +1,61 @@
+"""Module cache_claves_privadas"""
+import os
+import threading
+from collections import OrderedDict
+
+
+class CacheClavesPrivadas:
+    """Caché LRU y thread-safe de claves privadas ya cargadas, por ruta del fichero pem.
+    Una entrada deja de ser válida si cambia el mtime o el tamaño del fichero"""
+
+    def __init__(self, max_claves: int):
+        self.__max_claves = max_claves
+        # ruta -> ((mtime, tamaño) del fichero, clave privada), de la menos a la más usada
+        self.__claves = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__aciertos = 0
+        self.__fallos = 0
+
+    @staticmethod
+    def __firma_fichero(ruta: str):
+        """Devuelve (mtime, tamaño) del fichero"""
+        stat = os.stat(ruta)
+        return stat.st_mtime_ns, stat.st_size
+
+    def obtener(self, ruta: str, cargar):
+        """Devuelve la clave del fichero ruta, llamando a cargar(ruta) solo si no está en la caché"""
+        firma = self.__firma_fichero(ruta)
+        with self.__lock:
+            entrada = self.__claves.get(ruta)
+            if entrada is not None and entrada[0] == firma:
+                self.__claves.move_to_end(ruta)
+                self.__aciertos += 1
+                return entrada[1]
+            self.__fallos += 1
+        # Cargamos la clave fuera del lock para no bloquear a los demás hilos mientras se parsea el pem
+        clave = cargar(ruta)
+        self.guardar(ruta, clave, firma)
+        return clave
+
+    def guardar(self, ruta: str, clave, firma=None) -> None:
+        """Añade una clave a la caché, descartando la menos usada si está llena"""
+        if firma is None:
+            firma = self.__firma_fichero(ruta)
+        with self.__lock:
+            self.__claves[ruta] = (firma, clave)
+            self.__claves.move_to_end(ruta)
+            while len(self.__claves) > self.__max_claves:
+                self.__claves.popitem(last=False)
+
+    def invalidar(self, ruta: str = None) -> None:
+        """Quita una clave de la caché (o todas si no se indica ruta)"""
+        with self.__lock:
+            if ruta is None:
+                self.__claves.clear()
+            else:
+                self.__claves.pop(ruta, None)
+
+    def estadisticas(self) -> dict:
+        """Devuelve los aciertos, fallos y número de claves de la caché"""
+        with self.__lock:
+            return {"aciertos": self.__aciertos, "fallos": self.__fallos, "claves": len(self.__claves)}
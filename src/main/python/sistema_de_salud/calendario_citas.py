@@ -0,0 +1,67 @@
+"""Module calendario_citas"""
+import heapq
+import itertools
+from datetime import datetime, timedelta
+
+from sistema_de_salud.storage.cita_json_store import CitaJsonStore
+from sistema_de_salud.storage.medico_json_store import MedicoJsonStore
+from sistema_de_salud.horario_medico import HorarioMedico
+
+
+class CalendarioCitas:
+    """Huecos libres y ocupados de los médicos según su horario de consulta.
+    Consulta los bitmaps por día de store_citas, sin leer las citas"""
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def __ocupados(id_medico: str, fecha) -> int:
+        """Bitmap de huecos ocupados de un médico en un día"""
+        return CitaJsonStore().huecos_ocupados_medico_dia(id_medico, fecha.strftime("%Y-%m-%d"))
+
+    def huecos_libres(self, id_medico: str, fecha) -> list:
+        """Fechas y horas de inicio de los huecos libres de un médico en un día"""
+        horario = HorarioMedico.de_medico(id_medico)
+        ocupados = self.__ocupados(id_medico, fecha)
+        return [horario.fecha_hora_hueco(fecha, hueco) for hueco in range(horario.numero_huecos)
+                if not ocupados >> hueco & 1]
+
+    def hueco_libre(self, id_medico: str, fecha_hora: datetime) -> bool:
+        """Comprueba si fecha_hora es el inicio de un hueco del horario del médico y está libre"""
+        hueco = HorarioMedico.de_medico(id_medico).hueco(fecha_hora)
+        if hueco is None:
+            return False
+        return not self.__ocupados(id_medico, fecha_hora) >> hueco & 1
+
+    @staticmethod
+    def __iterar_huecos_libres(ocupados_dia, id_medico: str, desde: datetime, hasta: datetime):
+        """Genera en orden los huecos libres (fecha_hora, id_medico) de un médico con desde <= fecha_hora < hasta,
+        día a día (ocupados_dia(id_medico, fecha) devuelve el bitmap de huecos ocupados de un día)"""
+        horario = HorarioMedico.de_medico(id_medico)
+        completo = (1 << horario.numero_huecos) - 1
+        fecha = desde.date()
+        while fecha <= hasta.date():
+            ocupados = ocupados_dia(id_medico, fecha.strftime("%Y-%m-%d"))
+            if ocupados != completo:
+                for hueco in range(horario.numero_huecos):
+                    if ocupados >> hueco & 1:
+                        continue
+                    fecha_hora = horario.fecha_hora_hueco(fecha, hueco)
+                    if fecha_hora >= hasta:
+                        return
+                    if fecha_hora >= desde:
+                        yield fecha_hora, id_medico
+            fecha += timedelta(days=1)
+
+    def primeros_huecos_libres(self, especialidad: str, desde: datetime, hasta: datetime, numero: int) -> list:
+        """Los numero primeros huecos libres (fecha_hora, id_medico) entre desde y hasta de todos los médicos
+        de una especialidad. Mezcla con un heap los huecos de cada médico, que se generan en orden y solo
+        hasta llegar a los numero primeros"""
+        # Los huecos ya pasados no se pueden reservar: no se recorren
+        desde = max(desde, datetime.now())
+        # Se comprueba una sola vez si el store ha cambiado, no en cada (médico, día)
+        ocupados_dia = CitaJsonStore().consulta_huecos_ocupados()
+        huecos_medicos = [self.__iterar_huecos_libres(ocupados_dia, id_medico, desde, hasta)
+                          for id_medico in MedicoJsonStore().buscar_medicos_especialidad_store(especialidad)]
+        return list(itertools.islice(heapq.merge(*huecos_medicos), numero))
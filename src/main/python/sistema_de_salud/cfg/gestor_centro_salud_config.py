@@ -5,3 +5,54 @@ FOLDER_PATH = str(Path.home()) + "/PycharmProjects/cripto_23"
 JSON_FILES_PATH = FOLDER_PATH + "/src/JsonFiles/"
 KEY_FILES_PATH =  FOLDER_PATH + "/src/Keys/"
 CERT_FILES_PATH = FOLDER_PATH + "/src/Cert/"
+
+# Motor de almacenamiento de los stores: "json" (fichero Json completo), "journal" (log JSONL append-only)
+# o "sqlite" (base de datos SQLite con índices)
+STORE_ENGINE = "json"
+# Formato de los ficheros del motor "json": "json_lineas" (un item por línea, se puede leer en streaming),
+# "json" (indentado), "json_compacto", "msgpack" o "binario"
+# (los ficheros se leen en cualquier formato, este es el que se usa al escribir)
+STORE_CODEC = "json_lineas"
+# Registros muertos a partir de los cuales el motor "journal" compacta el log en segundo plano
+JOURNAL_COMPACTION_THRESHOLD = 500
+# Base de datos del motor "sqlite" (una tabla por store)
+SQLITE_DB_PATH = JSON_FILES_PATH + "store.db"
+# Reparte store_citas en un fichero por mes de la fecha de la cita, con un manifiesto de particiones
+CITAS_PARTICIONADAS_POR_MES = False
+# Claves privadas ya cargadas que Criptografia mantiene en memoria (caché LRU)
+PRIVATE_KEY_CACHE_SIZE = 64
+# Cifrado de los datos sensibles de las citas: True = sobre digital (una clave AES-GCM por cita cifrada con RSA),
+# False = cada campo cifrado con RSA (las citas guardadas en cualquiera de los dos modos se pueden leer)
+CITA_CIFRADO_SOBRE = True
+# Procesos del pool que deriva las claves de las contraseñas (None = uno por núcleo)
+KDF_POOL_WORKERS = None
+# KDF de las contraseñas nuevas: "pbkdf2_sha256" o "scrypt", con los parámetros de cada algoritmo
+KDF_ALGORITMO = "pbkdf2_sha256"
+KDF_PARAMETROS = {
+    "pbkdf2_sha256": {"iteraciones": 480000},
+    "scrypt": {"n": 2 ** 15, "r": 8, "p": 1},
+}
+# Parámetros calibrados con python -m sistema_de_salud.kdf_password (tienen prioridad sobre los anteriores)
+KDF_PARAMETROS_FILE_PATH = JSON_FILES_PATH + "kdf_parametros.json"
+# Claves RSA que se mantienen generadas por adelantado y hilos que las generan (0 = sin pool)
+RSA_KEY_POOL_SIZE = 8
+RSA_KEY_POOL_WORKERS = 2
+# Hilos para firmar y verificar firmas por lotes (None = uno por núcleo)
+SIGNATURE_BATCH_WORKERS = None
+# Sesiones paciente-médico: segundos y número de citas durante los que se reutiliza la clave simétrica
+# y los certificados ya validados sin repetir el intercambio RSA (0 usos = sin sesiones)
+SESION_CITA_TTL = 600
+SESION_CITA_MAX_USOS = 20
+# Perfil de las claves y certificados nuevos de pacientes y médicos: "rsa" (RSA 2048) o "ec_p256" (curva P-256,
+# firmas ECDSA y cifrado ECIES). Las Autoridades de Certificación siguen usando RSA; los perfiles pueden convivir
+USER_KEY_PROFILE = "rsa"
+# Hilos con los que preparacion_sistema ejecuta en paralelo los pasos independientes (None = por defecto del pool)
+BOOTSTRAP_WORKERS = None
+# Si preparacion_sistema imprime el informe con los tiempos de cada paso (siempre lo devuelve)
+BOOTSTRAP_INFORME = False
+# Hilos con los que registro_citas_lote hace en paralelo el intercambio de cada pareja (paciente, médico)
+CITAS_LOTE_WORKERS = None
+# Horario de consulta de los médicos: hora de inicio, hora de fin y minutos de cada hueco de cita
+HORARIO_CONSULTA = {"inicio": "08:00", "fin": "15:00", "minutos_hueco": 30}
+# Horarios distintos para médicos concretos (id_medico -> horario con el formato anterior)
+HORARIOS_MEDICOS = {}
@@ -9,11 +9,15 @@ from sistema_de_salud.registro_medico import RegistroMedico
 from sistema_de_salud.storage.cita_json_store import CitaJsonStore
 from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
 from sistema_de_salud.criptografia import Criptografia
+from sistema_de_salud.cfg.gestor_centro_salud_config import CITA_CIFRADO_SOBRE
 
 
 class CitaMedica:
     """Clase que representa una cita médica de un paciente"""
-    def __init__(self, id_medico, especialidad, fecha_hora, id_paciente, telefono_paciente, motivo_consulta, estado_cita="Activa", identificador_cita=None):
+    # Campos que se guardan cifrados en store_citas
+    CAMPOS_CIFRADOS = ("id_paciente", "telefono_paciente", "motivo_consulta")
+
+    def __init__(self, id_medico, especialidad, fecha_hora, id_paciente, telefono_paciente, motivo_consulta, estado_cita="Activa", identificador_cita=None, clave_cita=None):
         # Creamos los atributos
         self.__id_medico = id_medico
         self.__especialidad = especialidad
@@ -28,6 +32,8 @@ class CitaMedica:
         else:
             self.__identificador_cita = identificador_cita
         self.__estado_cita = estado_cita
+        # Clave AES-GCM de la cita cifrada con RSA (None si los campos no están cifrados o se cifraron solo con RSA)
+        self.__clave_cita = clave_cita
 
     def __str__(self):
         return "CitaMedica:" + json.dumps(self.__dict__)
@@ -51,7 +57,8 @@ class CitaMedica:
                    cita_encontrada["_CitaMedica__telefono_paciente"],
                    cita_encontrada["_CitaMedica__motivo_consulta"],
                    cita_encontrada["_CitaMedica__estado_cita"],
-                   cita_encontrada["_CitaMedica__identificador_cita"])
+                   cita_encontrada["_CitaMedica__identificador_cita"],
+                   cita_encontrada.get("_CitaMedica__clave_cita"))
         freezer.stop()
         cita.desencriptar_cita(id_paciente)
         return cita
@@ -92,29 +99,57 @@ class CitaMedica:
         store_citas.update_item(self, self.__identificador_cita)
 
     def encriptar_cita(self, id_paciente) -> None:
-        """Encripta con RSA los datos sensibles de la cita"""
+        """Encripta los datos sensibles de la cita (sobre digital AES-GCM + RSA, o solo RSA)"""
         # Encriptamos con la clave pública del paciente para que solo él pueda desencriptar
         criptografia = Criptografia()
         paciente = RegistroPaciente.obtener_paciente(id_paciente)
         cert_paciente = criptografia.obtener_certificado(paciente.cert_file_name)
 
-        id_paciente_cifrado = criptografia.encriptar_RSA(self.__id_paciente.encode('utf-8'), cert_paciente)
-        telefono_paciente_cifrado = criptografia.encriptar_RSA(self.__telefono_paciente.encode('utf-8'), cert_paciente)
-        motivo_consulta_cifrado = criptografia.encriptar_RSA(self.__motivo_consulta.encode('utf-8'), cert_paciente)
+        if CITA_CIFRADO_SOBRE:
+            # Una sola operación RSA por cita y sin límite de tamaño para el motivo de la consulta
+            campos = {
+                "id_paciente": self.__id_paciente.encode('utf-8'),
+                "telefono_paciente": self.__telefono_paciente.encode('utf-8'),
+                "motivo_consulta": self.__motivo_consulta.encode('utf-8')
+            }
+            clave_cita, campos_cifrados = criptografia.encriptar_sobre(campos, cert_paciente, self.__identificador_cita)
+            self.__clave_cita = clave_cita.hex()
+            self.__id_paciente = campos_cifrados["id_paciente"].hex()
+            self.__telefono_paciente = campos_cifrados["telefono_paciente"].hex()
+            self.__motivo_consulta = campos_cifrados["motivo_consulta"].hex()
+            return
+        self.__clave_cita = None
+        id_paciente_cifrado = criptografia.encriptar_asimetrico(self.__id_paciente.encode('utf-8'), cert_paciente)
+        telefono_paciente_cifrado = criptografia.encriptar_asimetrico(self.__telefono_paciente.encode('utf-8'), cert_paciente)
+        motivo_consulta_cifrado = criptografia.encriptar_asimetrico(self.__motivo_consulta.encode('utf-8'), cert_paciente)
 
         self.__id_paciente = id_paciente_cifrado.hex()
         self.__telefono_paciente = telefono_paciente_cifrado.hex()
         self.__motivo_consulta = motivo_consulta_cifrado.hex()
 
     def desencriptar_cita(self, id_paciente) -> None:
-        """Desencripta con RSA los datos sensibles de la cita"""
+        """Desencripta los datos sensibles de la cita"""
         # Desencriptamos con la clave privada del paciente
         criptografia = Criptografia()
         paciente = RegistroPaciente.obtener_paciente(id_paciente)
 
-        id_paciente_cifrado = criptografia.desencriptar_RSA(bytes.fromhex(self.__id_paciente), paciente.private_key_file_name)
-        telefono_paciente_cifrado = criptografia.desencriptar_RSA(bytes.fromhex(self.__telefono_paciente), paciente.private_key_file_name)
-        motivo_consulta_cifrado = criptografia.desencriptar_RSA(bytes.fromhex(self.__motivo_consulta), paciente.private_key_file_name)
+        if self.__clave_cita is not None:
+            campos_cifrados = {
+                "id_paciente": bytes.fromhex(self.__id_paciente),
+                "telefono_paciente": bytes.fromhex(self.__telefono_paciente),
+                "motivo_consulta": bytes.fromhex(self.__motivo_consulta)
+            }
+            campos = criptografia.desencriptar_sobre(bytes.fromhex(self.__clave_cita), campos_cifrados,
+                                                     paciente.private_key_file_name, self.__identificador_cita)
+            self.__clave_cita = None
+            self.__id_paciente = campos["id_paciente"].hex()
+            self.__telefono_paciente = campos["telefono_paciente"].hex()
+            self.__motivo_consulta = campos["motivo_consulta"].hex()
+            return
+        # Citas guardadas con cada campo cifrado con RSA
+        id_paciente_cifrado = criptografia.desencriptar_asimetrico(bytes.fromhex(self.__id_paciente), paciente.private_key_file_name)
+        telefono_paciente_cifrado = criptografia.desencriptar_asimetrico(bytes.fromhex(self.__telefono_paciente), paciente.private_key_file_name)
+        motivo_consulta_cifrado = criptografia.desencriptar_asimetrico(bytes.fromhex(self.__motivo_consulta), paciente.private_key_file_name)
 
         self.__id_paciente = id_paciente_cifrado.hex()
         self.__telefono_paciente = telefono_paciente_cifrado.hex()
@@ -1,31 +1,119 @@
 """Criptografia"""
 import os
+import hmac
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import cryptography
 
 from sistema_de_salud.storage.autenticacion_json_store import AutenticacionJsonStore
+from sistema_de_salud.cache_claves_privadas import CacheClavesPrivadas
+from sistema_de_salud.almacen_confianza import AlmacenConfianza
+from sistema_de_salud.pool_claves_rsa import PoolClavesRSA
+from sistema_de_salud.kdf_password import KDF_LEGACY
+from sistema_de_salud.kdf_password import derivar_clave_password
+from sistema_de_salud.kdf_password import parametros_kdf_actuales
 
 from sistema_de_salud.cfg.gestor_centro_salud_config import KEY_FILES_PATH
 from sistema_de_salud.cfg.gestor_centro_salud_config import CERT_FILES_PATH
+from sistema_de_salud.cfg.gestor_centro_salud_config import PRIVATE_KEY_CACHE_SIZE
+from sistema_de_salud.cfg.gestor_centro_salud_config import KDF_POOL_WORKERS
+from sistema_de_salud.cfg.gestor_centro_salud_config import RSA_KEY_POOL_SIZE
+from sistema_de_salud.cfg.gestor_centro_salud_config import RSA_KEY_POOL_WORKERS
+from sistema_de_salud.cfg.gestor_centro_salud_config import SIGNATURE_BATCH_WORKERS
+from sistema_de_salud.cfg.gestor_centro_salud_config import USER_KEY_PROFILE
 
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
-from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 from cryptography import x509
 from cryptography.x509.oid import NameOID
 from cryptography import exceptions
 
+# Pool de procesos para derivar claves de contraseñas sin bloquear al llamante
+_pool_kdf = None
+_pool_kdf_lock = threading.Lock()
+
+
+def obtener_pool_kdf() -> ProcessPoolExecutor:
+    """Devuelve el pool de procesos de la KDF, creándolo la primera vez"""
+    global _pool_kdf
+    with _pool_kdf_lock:
+        if _pool_kdf is None:
+            # Con fork los hijos heredarían los bloqueos de los hilos que ya están en marcha (pools de claves
+            # y de firmas): se crean desde el proceso forkserver, que no tiene hilos
+            _pool_kdf = ProcessPoolExecutor(max_workers=KDF_POOL_WORKERS or os.cpu_count(),
+                                            mp_context=multiprocessing.get_context("forkserver"))
+        return _pool_kdf
+
+
+def cerrar_pool_kdf() -> None:
+    """Cierra el pool de procesos de la KDF esperando a que terminen las derivaciones pendientes"""
+    global _pool_kdf
+    with _pool_kdf_lock:
+        if _pool_kdf is not None:
+            _pool_kdf.shutdown()
+            _pool_kdf = None
+
+
+# Pool de hilos para firmar y verificar por lotes (OpenSSL libera el GIL durante las operaciones RSA)
+_pool_firmas = None
+_pool_firmas_lock = threading.Lock()
+
+
+def obtener_pool_firmas() -> ThreadPoolExecutor:
+    """Devuelve el pool de hilos de firma, creándolo la primera vez"""
+    global _pool_firmas
+    with _pool_firmas_lock:
+        if _pool_firmas is None:
+            _pool_firmas = ThreadPoolExecutor(max_workers=SIGNATURE_BATCH_WORKERS or os.cpu_count(),
+                                              thread_name_prefix="firmas")
+        return _pool_firmas
+
+
+def _encadenar(futuro: Future, funcion) -> Future:
+    """Devuelve un Future con el resultado de funcion(resultado de futuro). Si funcion devuelve a su vez
+    un Future, el resultado es el de ese Future"""
+    resultado = Future()
+
+    def al_terminar(futuro_terminado):
+        try:
+            valor = funcion(futuro_terminado.result())
+        except Exception as exception:
+            # Cualquier error se entrega al llamante a través del Future
+            resultado.set_exception(exception)
+            return
+        if isinstance(valor, Future):
+            valor.add_done_callback(lambda futuro_valor: _copiar_resultado(futuro_valor, resultado))
+        else:
+            resultado.set_result(valor)
+    futuro.add_done_callback(al_terminar)
+    return resultado
+
+
+def _copiar_resultado(origen: Future, destino: Future) -> None:
+    """Entrega en destino el resultado o el error de origen, ya terminado"""
+    try:
+        destino.set_result(origen.result())
+    except Exception as exception:
+        destino.set_exception(exception)
+
 
 class Criptografia:
     """Clase que recoge las principales funciones criptográficas utilizadas"""
     KEY_LABEL_USER_ID =   "_AutenticacionUsuario__id_usuario"
     KEY_LABEL_USER_SALT = "_AutenticacionUsuario__salt"
     KEY_LABEL_USER_KEY =  "_AutenticacionUsuario__key"
+    KEY_LABEL_USER_KDF =  "_AutenticacionUsuario__kdf"
 
     PRIVATE_KEY_FILE_NAME_AC1 = "ministerioSanidad_private_key.pem"
     CERT_FILE_NAME_AC1 = "ministerioSanidad_cert.pem"
@@ -33,6 +121,20 @@ class Criptografia:
     PRIVATE_KEY_FILE_NAME_AC3 = "policia_private_key.pem"
     CERT_FILE_NAME_AC3 = "policia_cert.pem"
 
+    # Perfiles de clave de los usuarios: RSA 2048 (firmas RSA-PSS, cifrado RSA-OAEP)
+    # o curva elíptica P-256 (firmas ECDSA, cifrado ECIES)
+    PERFIL_RSA = "rsa"
+    PERFIL_EC_P256 = "ec_p256"
+    # Información de contexto de la HKDF de ECIES
+    ECIES_INFO = b"sistema_de_salud ECIES P-256 AES-256-GCM"
+
+    # Compartida por todas las instancias: cada clave se parsea una vez mientras no cambie su fichero
+    _cache_claves = CacheClavesPrivadas(PRIVATE_KEY_CACHE_SIZE)
+    # Certificados cargados y cadenas de certificación ya verificadas
+    _almacen_confianza = AlmacenConfianza()
+    # Claves RSA generadas por adelantado para que el registro de usuarios no espere a generarlas
+    _pool_claves = PoolClavesRSA(RSA_KEY_POOL_SIZE, RSA_KEY_POOL_WORKERS)
+
     def __init__(self):
         pass
 
@@ -40,11 +142,23 @@ class Criptografia:
         """Deriva y almacena una clave segura a partir de la contraseña del usuario"""
         # Derivamos una clave segura mediante una KDF (Key Derivation Function)
         salt = os.urandom(16)  # generamos un salt aleatorio, los valores seguros tienen 16 bytes (128 bits) o más
-        # Algoritmo de coste variable PBKDF2 (Password Based Key Derivation Function 2)
-        # algoritmo: SHA256 ; longitud max: 2^32 - 1
-        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=480000)
+        # Algoritmo de coste variable (PBKDF2 o scrypt) con los parámetros configurados
+        kdf = parametros_kdf_actuales()
         # Derivamos la clave criptográfica a partir del password introducido por el usuario
-        key = kdf.derive(password.encode('utf-8'))      # encode('utf-8') para convertir de string a bytes
+        key = derivar_clave_password(password.encode('utf-8'), salt, kdf)
+        self.__guardar_credenciales(id_usuario, salt, key, kdf)
+
+    def __guardar_credenciales(self, id_usuario: str, salt: bytes, key: bytes, kdf: dict, rehash: bool = False) -> None:
+        """Almacena el salt, la clave derivada y el algoritmo KDF de un usuario (o los sustituye si rehash)"""
+        usuario = self.credenciales_usuario(id_usuario, salt, key, kdf)
+        store_credenciales = AutenticacionJsonStore()
+        if rehash:
+            store_credenciales.update_item(usuario, id_usuario)
+            return
+        store_credenciales.guardar_credenciales_store(usuario)
+
+    def credenciales_usuario(self, id_usuario: str, salt: bytes, key: bytes, kdf: dict) -> dict:
+        """Devuelve el item de store_credenciales de un usuario"""
         # Convertimos el salt y la derived key en strings hexadecimales para almacenarlos
         salt_hex = salt.hex()
         key_hex = key.hex()
@@ -52,10 +166,24 @@ class Criptografia:
         usuario = {
             self.KEY_LABEL_USER_ID: id_usuario,
             self.KEY_LABEL_USER_SALT: salt_hex,
-            self.KEY_LABEL_USER_KEY: key_hex
+            self.KEY_LABEL_USER_KEY: key_hex,
+            self.KEY_LABEL_USER_KDF: kdf
         }
-        store_credenciales = AutenticacionJsonStore()
-        store_credenciales.guardar_credenciales_store(usuario)
+        return usuario
+
+    def __kdf_credenciales(self, item: dict) -> dict:
+        """Algoritmo y parámetros KDF con los que se derivó una credencial guardada"""
+        return item.get(self.KEY_LABEL_USER_KDF, KDF_LEGACY)
+
+    def __kdf_obsoleta(self, item: dict, kdf: dict) -> bool:
+        """Comprueba si una credencial no registra su algoritmo KDF o se derivó con parámetros distintos de kdf"""
+        return self.KEY_LABEL_USER_KDF not in item or item[self.KEY_LABEL_USER_KDF] != kdf
+
+    def __rehash_password(self, id_usuario: str, password: str, kdf: dict) -> None:
+        """Vuelve a derivar y guardar la clave de un usuario con los parámetros KDF actuales"""
+        salt = os.urandom(16)
+        key = derivar_clave_password(password.encode('utf-8'), salt, kdf)
+        self.__guardar_credenciales(id_usuario, salt, key, kdf, rehash=True)
 
     def comprobar_password(self, id_usuario: str, password: str):
         """Comprueba una contraseña introducida por el usuario con la clave derivada almacenada"""
@@ -68,23 +196,87 @@ class Criptografia:
         #print("Stored key:   ", stored_key_hex)
         # Convertimos el salt a bytes
         stored_salt = bytes.fromhex(stored_salt_hex)
-        # Derivamos la clave a partir del password introducido por el usuario
-        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=stored_salt, iterations=480000)
-        key = kdf.derive(password.encode('utf-8'))
-        # Convertimos la key a hexadecimal y comparamos con la key almacenada
+        # Derivamos la clave a partir del password introducido por el usuario, con el mismo algoritmo y parámetros
+        stored_kdf = self.__kdf_credenciales(item)
+        key = derivar_clave_password(password.encode('utf-8'), stored_salt, stored_kdf)
+        # Convertimos la key a hexadecimal y comparamos con la key almacenada (en tiempo constante)
         key_hex = key.hex()
         #print("Generated key:", key_hex)
-        if key_hex != stored_key_hex:
+        if not hmac.compare_digest(key_hex, stored_key_hex):
             return False
+        # Contraseña correcta: si los parámetros guardados no son los actuales, aprovechamos para actualizarlos
+        kdf = parametros_kdf_actuales()
+        if self.__kdf_obsoleta(item, kdf):
+            self.__rehash_password(id_usuario, password, kdf)
         return True
 
+    def guardar_password_futuro(self, id_usuario: str, password: str) -> Future:
+        """Como guardar_password, pero deriva la clave en el pool de procesos y devuelve un Future"""
+        salt = os.urandom(16)
+        kdf = parametros_kdf_actuales()
+        futuro = obtener_pool_kdf().submit(derivar_clave_password, password.encode('utf-8'), salt, kdf)
+        return _encadenar(futuro, lambda key: self.__guardar_credenciales(id_usuario, salt, key, kdf))
+
+    def comprobar_password_futuro(self, id_usuario: str, password: str) -> Future:
+        """Como comprobar_password, pero deriva la clave en el pool de procesos y devuelve un Future con el resultado"""
+        store_credenciales = AutenticacionJsonStore()
+        item = store_credenciales.buscar_credenciales_store(id_usuario)
+        stored_salt = bytes.fromhex(item[self.KEY_LABEL_USER_SALT])
+        stored_key_hex = item[self.KEY_LABEL_USER_KEY]
+        stored_kdf = self.__kdf_credenciales(item)
+        futuro = obtener_pool_kdf().submit(derivar_clave_password, password.encode('utf-8'), stored_salt, stored_kdf)
+
+        def comprobar(key):
+            if not hmac.compare_digest(key.hex(), stored_key_hex):
+                return False
+            kdf = parametros_kdf_actuales()
+            if not self.__kdf_obsoleta(item, kdf):
+                return True
+            # El rehash también se deriva en el pool. El Future devuelto termina cuando se ha guardado,
+            # como en comprobar_password, para que sus errores lleguen al llamante
+            salt = os.urandom(16)
+            rehash = obtener_pool_kdf().submit(derivar_clave_password, password.encode('utf-8'), salt, kdf)
+
+            def guardar_rehash(new_key):
+                self.__guardar_credenciales(id_usuario, salt, new_key, kdf, rehash=True)
+                return True
+            return _encadenar(rehash, guardar_rehash)
+        return _encadenar(futuro, comprobar)
+
+    async def guardar_password_async(self, id_usuario: str, password: str) -> None:
+        """Versión asíncrona de guardar_password"""
+        await asyncio.wrap_future(self.guardar_password_futuro(id_usuario, password))
+
+    async def comprobar_password_async(self, id_usuario: str, password: str) -> bool:
+        """Versión asíncrona de comprobar_password"""
+        # comprobar_password_futuro lee store_credenciales antes de enviar la KDF al pool: se llama desde un hilo
+        futuro = await asyncio.to_thread(self.comprobar_password_futuro, id_usuario, password)
+        return await asyncio.wrap_future(futuro)
+
     def generar_claves_RSA(self, private_key_file_name: str):
         """Genera un par de claves (pública y privada) para un usuario con el criptosistema asimétrico RSA"""
-        # Generamos una pareja de claves con RSA para el usuario
-        private_key = rsa.generate_private_key(
-            public_exponent=65537,              # Almost everyone should use 65537
-            key_size=2048                       # Se recomienda que la clave sea de al menos 2048 bits (NIST 2016)
-        )
+        # Obtenemos una pareja de claves RSA (2048 bits, e=65537) del pool, o la generamos si está vacío
+        private_key = self._pool_claves.obtener_clave()
+        self.guardar_clave_privada(private_key, private_key_file_name)
+
+    def generar_claves_EC(self, private_key_file_name: str):
+        """Genera un par de claves para un usuario sobre la curva elíptica P-256"""
+        # Generar una clave EC es mucho más rápido que una RSA, no hace falta pool
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        self.guardar_clave_privada(private_key, private_key_file_name)
+
+    def generar_claves_usuario(self, private_key_file_name: str, perfil: str = None):
+        """Genera las claves de un paciente o un médico con el perfil indicado (por defecto USER_KEY_PROFILE)"""
+        perfil = perfil or USER_KEY_PROFILE
+        if perfil == self.PERFIL_EC_P256:
+            self.generar_claves_EC(private_key_file_name)
+        elif perfil == self.PERFIL_RSA:
+            self.generar_claves_RSA(private_key_file_name)
+        else:
+            raise ValueError("Perfil de clave desconocido: " + str(perfil))
+
+    def guardar_clave_privada(self, private_key, private_key_file_name: str) -> None:
+        """Guarda una clave privada en un PEM file y en la caché de claves"""
         # Serializamos y guardamos la clave privada en un PEM file
         private_key_pem = private_key.private_bytes(
             encoding=serialization.Encoding.PEM,
@@ -94,11 +286,33 @@ class Criptografia:
         private_key_path = os.path.join(KEY_FILES_PATH, private_key_file_name)
         with open(private_key_path, 'wb') as private_key_file:
             private_key_file.write(private_key_pem)
+        # Guardamos en la caché la clave recién generada para no tener que volver a leer el pem
+        self._cache_claves.guardar(private_key_path, private_key)
         # La clave pública se obtiene a partir de la clave privada, no es necesario crear un PEM
 
+    @classmethod
+    def perfil_clave(cls, key) -> str:
+        """Perfil (rsa o ec_p256) de una clave pública o privada"""
+        if isinstance(key, (rsa.RSAPublicKey, rsa.RSAPrivateKey)):
+            return cls.PERFIL_RSA
+        if isinstance(key, (ec.EllipticCurvePublicKey, ec.EllipticCurvePrivateKey)) \
+                and isinstance(key.curve, ec.SECP256R1):
+            return cls.PERFIL_EC_P256
+        raise ValueError("Tipo de clave no soportado: " + type(key).__name__)
+
+    @classmethod
+    def perfil_certificado(cls, cert) -> str:
+        """Perfil de un certificado, que queda registrado en el tipo de su clave pública"""
+        return cls.perfil_clave(cert.public_key())
+
     def obtener_clave_privada(self, private_key_file_name: str):
         """Obtiene la clave privada a partir de un archivo pem"""
         private_key_path = os.path.join(KEY_FILES_PATH, private_key_file_name)
+        return self._cache_claves.obtener(private_key_path, self.__cargar_clave_privada)
+
+    @staticmethod
+    def __cargar_clave_privada(private_key_path: str):
+        """Lee y parsea la clave privada de un archivo pem"""
         with open(private_key_path, "rb") as key_file:
             private_key = serialization.load_pem_private_key(
                 key_file.read(),
@@ -106,6 +320,26 @@ class Criptografia:
             )
         return private_key
 
+    @classmethod
+    def estadisticas_cache_claves(cls) -> dict:
+        """Devuelve los aciertos y fallos de la caché de claves privadas"""
+        return cls._cache_claves.estadisticas()
+
+    @classmethod
+    def iniciar_pool_claves(cls) -> None:
+        """Arranca la generación de claves RSA en segundo plano antes de que se necesiten"""
+        cls._pool_claves.iniciar()
+
+    @classmethod
+    def estadisticas_pool_claves(cls) -> dict:
+        """Devuelve las claves RSA servidas desde el pool y las generadas en el momento"""
+        return cls._pool_claves.estadisticas()
+
+    @classmethod
+    def estadisticas_almacen_confianza(cls) -> dict:
+        """Devuelve los aciertos y fallos de la caché de cadenas de certificación verificadas"""
+        return cls._almacen_confianza.estadisticas()
+
     def encriptar_RSA(self, message: bytes, cert):
         """Encripta un mensaje con el criptosistema asimétrico RSA"""
         public_key = cert.public_key()
@@ -132,9 +366,78 @@ class Criptografia:
         )
         return message
 
+    def encriptar_ECIES(self, message: bytes, cert):
+        """Cifrado híbrido ECIES: ECDH con una clave efímera P-256, HKDF-SHA256 y AES-GCM"""
+        ephemeral_key = ec.generate_private_key(ec.SECP256R1())
+        shared_key = ephemeral_key.exchange(ec.ECDH(), cert.public_key())
+        ephemeral_public_bytes = ephemeral_key.public_key().public_bytes(
+            encoding=serialization.Encoding.X962,
+            format=serialization.PublicFormat.UncompressedPoint
+        )
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=self.ECIES_INFO).derive(shared_key)
+        nonce = os.urandom(12)
+        # La clave pública efímera se autentica como datos asociados
+        ciphertext = AESGCM(key).encrypt(nonce, message, ephemeral_public_bytes)
+        # Clave pública efímera (65 bytes) + nonce (12 bytes) + mensaje cifrado
+        return ephemeral_public_bytes + nonce + ciphertext
+
+    def desencriptar_ECIES(self, ciphertext: bytes, private_key_file_name):
+        """Desencripta un mensaje cifrado con ECIES"""
+        private_key = self.obtener_clave_privada(private_key_file_name)
+        ephemeral_public_bytes, nonce, ciphertext = ciphertext[:65], ciphertext[65:77], ciphertext[77:]
+        ephemeral_public_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), ephemeral_public_bytes)
+        shared_key = private_key.exchange(ec.ECDH(), ephemeral_public_key)
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=self.ECIES_INFO).derive(shared_key)
+        # Si el mensaje ha sido modificado (o la clave no es la del destinatario) lanza cryptography.exceptions.InvalidTag
+        return AESGCM(key).decrypt(nonce, ciphertext, ephemeral_public_bytes)
+
+    def encriptar_asimetrico(self, message: bytes, cert):
+        """Encripta un mensaje para el titular de un certificado con RSA-OAEP o ECIES según su perfil"""
+        if self.perfil_certificado(cert) == self.PERFIL_EC_P256:
+            return self.encriptar_ECIES(message, cert)
+        return self.encriptar_RSA(message, cert)
+
+    def desencriptar_asimetrico(self, ciphertext: bytes, private_key_file_name):
+        """Desencripta un mensaje con la clave privada del usuario, RSA-OAEP o ECIES según su perfil"""
+        private_key = self.obtener_clave_privada(private_key_file_name)
+        if self.perfil_clave(private_key) == self.PERFIL_EC_P256:
+            return self.desencriptar_ECIES(ciphertext, private_key_file_name)
+        return self.desencriptar_RSA(ciphertext, private_key_file_name)
+
+    def encriptar_sobre(self, campos: dict, cert, contexto: str):
+        """Cifrado híbrido: cifra cada campo (bytes) con AES-GCM usando una clave aleatoria
+        y cifra esa clave con RSA o ECIES para el titular del certificado"""
+        key = AESGCM.generate_key(bit_length=256)
+        aesgcm = AESGCM(key)
+        campos_cifrados = {}
+        for nombre, valor in campos.items():
+            nonce = os.urandom(12)      # nonce de 96 bits, distinto para cada campo
+            # Autenticamos el contexto y el nombre del campo para que no se puedan intercambiar campos cifrados
+            campos_cifrados[nombre] = nonce + aesgcm.encrypt(nonce, valor, (contexto + ":" + nombre).encode('utf-8'))
+        encrypted_key = self.encriptar_asimetrico(key, cert)
+        return encrypted_key, campos_cifrados
+
+    def desencriptar_sobre(self, encrypted_key: bytes, campos_cifrados: dict, private_key_file_name: str, contexto: str):
+        """Desencripta los campos de un sobre digital con la clave privada del titular"""
+        # Una sola operación asimétrica por sobre, el resto es AES-GCM
+        key = self.desencriptar_asimetrico(encrypted_key, private_key_file_name)
+        aesgcm = AESGCM(key)
+        campos = {}
+        for nombre, valor in campos_cifrados.items():
+            # Si el campo ha sido modificado lanza cryptography.exceptions.InvalidTag
+            campos[nombre] = aesgcm.decrypt(valor[:12], valor[12:], (contexto + ":" + nombre).encode('utf-8'))
+        return campos
+
     def firmar_mensaje(self, message: bytes, private_key_file_name: str):
         """Firma un mensaje con la clave privada del usuario"""
         private_key = self.obtener_clave_privada(private_key_file_name)
+        return self.__firmar(message, private_key)
+
+    @staticmethod
+    def __firmar(message: bytes, private_key):
+        """Firma un mensaje con RSA-PSS o ECDSA (según la clave) y una clave privada ya cargada"""
+        if isinstance(private_key, ec.EllipticCurvePrivateKey):
+            return private_key.sign(message, ec.ECDSA(hashes.SHA256()))
         signature = private_key.sign(
             message,
             padding.PSS(
@@ -145,9 +448,29 @@ class Criptografia:
         )
         return signature
 
+    def firmar_lote(self, messages, private_key_file_name: str) -> list:
+        """Firma varios mensajes con la misma clave privada (cargada una sola vez) repartiéndolos entre varios hilos"""
+        private_key = self.obtener_clave_privada(private_key_file_name)
+        return list(obtener_pool_firmas().map(lambda message: self.__firmar(message, private_key), messages))
+
+    def verificar_lote(self, items) -> list:
+        """Comprueba varias firmas (message, signature, public_key) en varios hilos
+        y devuelve True o False para cada una en lugar de lanzar una excepción"""
+        def verificar(item):
+            message, signature, public_key = item
+            try:
+                self.comprobar_firma(message, signature, public_key)
+            except cryptography.exceptions.InvalidSignature:
+                return False
+            return True
+        return list(obtener_pool_firmas().map(verificar, items))
+
     def comprobar_firma(self, message: bytes, signature, public_key):
         """Comprueba la firma de un mensaje con la clave pública de quien lo firmó"""
         # Si la firma no coincide lanza una excepción
+        if isinstance(public_key, ec.EllipticCurvePublicKey):
+            public_key.verify(signature, message, ec.ECDSA(hashes.SHA256()))
+            return
         public_key.verify(
             signature,
             message,
@@ -218,6 +541,12 @@ class Criptografia:
 
     def crear_certificado(self, subject, issuer, duration, public_key_subject, private_key_ac, cert_file_name):
         """Crea un certificado X.509"""
+        cert = self.construir_certificado(subject, issuer, duration, public_key_subject, private_key_ac)
+        self.guardar_certificado(cert, cert_file_name)
+        return cert
+
+    def construir_certificado(self, subject, issuer, duration, public_key_subject, private_key_ac):
+        """Crea y firma un certificado X.509 sin guardarlo"""
         cert = x509.CertificateBuilder().subject_name(
             subject
         ).issuer_name(
@@ -231,30 +560,47 @@ class Criptografia:
         ).not_valid_after(
             datetime.utcnow() + timedelta(days=duration)
         ).sign(private_key_ac, hashes.SHA256())  # Firmar el certificado con la clave privada de la Autoridad de Certificación
-        # Guardamos el certificado en un PEM file
+        return cert
+
+    def guardar_certificado(self, cert, cert_file_name: str) -> None:
+        """Guarda un certificado en un PEM file"""
         cert_path = os.path.join(CERT_FILES_PATH, cert_file_name)
         with open(cert_path, 'wb') as cert_file:
             cert_file.write(cert.public_bytes(serialization.Encoding.PEM))
-        return cert
+        self._almacen_confianza.guardar_certificado(cert_path, cert)
 
     def obtener_certificado(self, cert_file_name: str):
         """Obtiene el certificado a partir de un archivo pem"""
         cert_path = os.path.join(CERT_FILES_PATH, cert_file_name)
+        return self._almacen_confianza.obtener_certificado(cert_path, self.__cargar_certificado)
+
+    @staticmethod
+    def __cargar_certificado(cert_path: str):
+        """Lee y parsea un certificado de un archivo pem"""
         with open(cert_path, 'rb') as cert_file:
             cert = x509.load_pem_x509_certificate(cert_file.read())
         return cert
 
+    @staticmethod
+    def verificar_firma_x509(public_key, signature: bytes, data: bytes, hash_algorithm) -> None:
+        """Verifica la firma de un certificado o una CSR con la clave pública del firmante (RSA o EC)"""
+        # Si la firma no coincide lanza cryptography.exceptions.InvalidSignature
+        if isinstance(public_key, ec.EllipticCurvePublicKey):
+            public_key.verify(signature, data, ec.ECDSA(hash_algorithm))
+        else:
+            public_key.verify(signature, data, padding.PKCS1v15(), hash_algorithm)
+
     def validar_certificado(self, cert_usuario, cert_acs, cert_acr):
         """Validar certificado utilizando la cadena de certificación"""
+        if self._almacen_confianza.cadena_verificada(cert_usuario, cert_acs, cert_acr):
+            # Cadena ya verificada y sin certificados caducados
+            return
         public_key_acs = cert_acs.public_key()
         # Validar la firma del certificado del usuario con la clave pública de la Autoridad de Certificación Subordinada
+        # (el usuario puede tener perfil RSA o EC; la firma es la de la clave de la ACS)
         try:
-            public_key_acs.verify(
-                cert_usuario.signature,
-                cert_usuario.tbs_certificate_bytes,
-                padding.PKCS1v15(),
-                cert_usuario.signature_hash_algorithm,
-            )
+            self.verificar_firma_x509(public_key_acs, cert_usuario.signature, cert_usuario.tbs_certificate_bytes,
+                                      cert_usuario.signature_hash_algorithm)
         except cryptography.exceptions.InvalidSignature as e:
             raise ValueError(f"Error al verificar la firma del certificado del usuario: {e}")
         # Validar caducidad del certificado del usuario
@@ -264,12 +610,8 @@ class Criptografia:
         public_key_acr = cert_acr.public_key()
         # Validar la firma del certificado de la ACS con la clave pública de la Autoridad de Certificación Raíz
         try:
-            public_key_acr.verify(
-                cert_acs.signature,
-                cert_acs.tbs_certificate_bytes,
-                padding.PKCS1v15(),
-                cert_acs.signature_hash_algorithm,
-            )
+            self.verificar_firma_x509(public_key_acr, cert_acs.signature, cert_acs.tbs_certificate_bytes,
+                                      cert_acs.signature_hash_algorithm)
         except cryptography.exceptions.InvalidSignature as e:
             raise ValueError(f"Error al verificar la firma del certificado de la ACS: {e}")
         # Validar caducidad del certificado de la ACS
@@ -277,22 +619,20 @@ class Criptografia:
             raise ValueError("El certificado de la ACS ha expirado o aún no es válido.")
         # Validar la firma del certificado de la ACR consigo misma
         try:
-            public_key_acr.verify(
-                cert_acr.signature,
-                cert_acr.tbs_certificate_bytes,
-                padding.PKCS1v15(),
-                cert_acr.signature_hash_algorithm,
-            )
+            self.verificar_firma_x509(public_key_acr, cert_acr.signature, cert_acr.tbs_certificate_bytes,
+                                      cert_acr.signature_hash_algorithm)
         except cryptography.exceptions.InvalidSignature as e:
             raise ValueError(f"Error al verificar la firma del certificado de la ACR: {e}")
         # Validar caducidad del certificado de la ACR
         if not cert_acr.not_valid_before < now < cert_acr.not_valid_after:
             raise ValueError("El certificado de la ACR ha expirado o aún no es válido.")
         # Confiamos en la ACR
+        self._almacen_confianza.registrar_cadena(cert_usuario, cert_acs, cert_acr)
 
-    def crear_CSR_medico(self, centro_salud, medico):
-        """Crea una Solicitud de Firma de Certificado (CSR) para un médico"""
-        private_key = self.obtener_clave_privada(medico.private_key_file_name)
+    def crear_CSR_medico(self, centro_salud, medico, private_key=None):
+        """Crea una Solicitud de Firma de Certificado (CSR) para un médico (con su clave privada del PEM o la recibida)"""
+        if private_key is None:
+            private_key = self.obtener_clave_privada(medico.private_key_file_name)
         # Generate a CSR
         csr = x509.CertificateSigningRequestBuilder().subject_name(x509.Name([
             # Información del médico y del centro de salud en el que trabaja
@@ -305,9 +645,10 @@ class Criptografia:
         ])).sign(private_key, hashes.SHA256())       # Firmar la CSR con la clave privada
         return csr
 
-    def crear_CSR_paciente(self, paciente):
-        """Crea una Solicitud de Firma de Certificado (CSR) para un paciente"""
-        private_key = self.obtener_clave_privada(paciente.private_key_file_name)
+    def crear_CSR_paciente(self, paciente, private_key=None):
+        """Crea una Solicitud de Firma de Certificado (CSR) para un paciente (con su clave privada del PEM o la recibida)"""
+        if private_key is None:
+            private_key = self.obtener_clave_privada(paciente.private_key_file_name)
         # Generate a CSR
         csr = x509.CertificateSigningRequestBuilder().subject_name(x509.Name([
             # Información del paciente
@@ -324,12 +665,7 @@ class Criptografia:
         private_key_ac2 = self.obtener_clave_privada(centro_salud.private_key_file_name)
         cert_ac2 = self.obtener_certificado(centro_salud.cert_file_name)
         # Verificar la firma de la CSR con la clave pública del médico, si la firma no coincide lanza una excepción
-        public_key.verify(
-            csr.signature,
-            csr.tbs_certrequest_bytes,
-            padding.PKCS1v15(),
-            csr.signature_hash_algorithm,
-        )
+        self.verificar_firma_x509(public_key, csr.signature, csr.tbs_certrequest_bytes, csr.signature_hash_algorithm)
         # Si la firma es correcta emitimos el certificado
         cert = self.crear_certificado(csr.subject, cert_ac2.subject, 365, csr.public_key(), private_key_ac2, cert_file_name)
         return cert
@@ -339,12 +675,7 @@ class Criptografia:
         private_key_ac3 = self.obtener_clave_privada(self.PRIVATE_KEY_FILE_NAME_AC3)
         cert_ac3 = self.obtener_certificado(self.CERT_FILE_NAME_AC3)
         # Verificar la firma de la CSR con la clave pública del paciente, si la firma no coincide lanza una excepción
-        public_key.verify(
-            csr.signature,
-            csr.tbs_certrequest_bytes,
-            padding.PKCS1v15(),
-            csr.signature_hash_algorithm,
-        )
+        self.verificar_firma_x509(public_key, csr.signature, csr.tbs_certrequest_bytes, csr.signature_hash_algorithm)
         # Si la firma es correcta emitimos el certificado
         cert = self.crear_certificado(csr.subject, cert_ac3.subject, 365, csr.public_key(), private_key_ac3, cert_file_name)
         return cert
@@ -0,0 +1,66 @@
+"""Module emisor_certificados"""
+from cryptography.exceptions import InvalidSignature
+from sistema_de_salud.criptografia import Criptografia
+from sistema_de_salud.criptografia import obtener_pool_firmas
+
+
+class EmisorCertificados:
+    """Sesión de una Autoridad de Certificación (AC2 o AC3): carga su clave privada y su certificado
+    una sola vez y emite certificados para lotes de CSR"""
+
+    def __init__(self, private_key_file_name: str, cert_file_name: str, duration: int = 365):
+        self.__criptografia = Criptografia()
+        self.__private_key = self.__criptografia.obtener_clave_privada(private_key_file_name)
+        self.__cert = self.__criptografia.obtener_certificado(cert_file_name)
+        self.__duration = duration
+
+    @classmethod
+    def centro_salud(cls, centro_salud):
+        """Emisor del centro de salud (AC2), que emite los certificados de los médicos"""
+        return cls(centro_salud.private_key_file_name, centro_salud.cert_file_name)
+
+    @classmethod
+    def policia(cls):
+        """Emisor de la Dirección General de Policía (AC3), que emite los certificados de los pacientes"""
+        return cls(Criptografia.PRIVATE_KEY_FILE_NAME_AC3, Criptografia.CERT_FILE_NAME_AC3)
+
+    @property
+    def cert(self):
+        """Certificado de la Autoridad de Certificación"""
+        return self.__cert
+
+    def __firmar_certificado(self, solicitud):
+        """Verifica la firma de una CSR y crea su certificado (sin guardarlo)"""
+        csr, public_key, _ = solicitud
+        # Verificar la firma de la CSR con la clave pública del solicitante, si la firma no coincide lanza una excepción
+        Criptografia.verificar_firma_x509(public_key, csr.signature, csr.tbs_certrequest_bytes,
+                                          csr.signature_hash_algorithm)
+        return self.__criptografia.construir_certificado(csr.subject, self.__cert.subject, self.__duration,
+                                                         csr.public_key(), self.__private_key)
+
+    def __firmar_solicitud(self, solicitud):
+        """Firma una solicitud y devuelve su certificado, o la excepción si la CSR no es válida"""
+        try:
+            return self.__firmar_certificado(solicitud)
+        except (InvalidSignature, ValueError, TypeError) as exception:
+            # Firma que no coincide o clave pública que no corresponde a la CSR
+            return exception
+
+    def emitir(self, csr, public_key, cert_file_name: str):
+        """Emite y guarda el certificado de una CSR"""
+        resultado = self.emitir_lote([(csr, public_key, cert_file_name)])[0]
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    def emitir_lote(self, solicitudes, guardar: bool = True) -> list:
+        """Emite los certificados de una lista de solicitudes (csr, public_key, cert_file_name) firmándolos en paralelo.
+        Devuelve, por solicitud, su certificado o la excepción que impidió emitirlo; una CSR inválida no
+        descarta las demás. Con guardar=True se escriben los PEM de los certificados emitidos"""
+        solicitudes = list(solicitudes)
+        resultados = list(obtener_pool_firmas().map(self.__firmar_solicitud, solicitudes))
+        if guardar:
+            for resultado, (_, _, cert_file_name) in zip(resultados, solicitudes):
+                if not isinstance(resultado, Exception):
+                    self.__criptografia.guardar_certificado(resultado, cert_file_name)
+        return resultados
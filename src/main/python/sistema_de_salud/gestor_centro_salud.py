@@ -1,17 +1,31 @@
 """GestorCentroSalud"""
-import os
 import json
+import asyncio
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from sistema_de_salud.storage.paciente_json_store import PacienteJsonStore
 from sistema_de_salud.storage.medico_json_store import MedicoJsonStore
 from sistema_de_salud.storage.cita_json_store import CitaJsonStore
+from sistema_de_salud.storage.autenticacion_json_store import AutenticacionJsonStore
+from sistema_de_salud.storage.transaccion_store import TransaccionStore
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
 
 from sistema_de_salud.registro_paciente import RegistroPaciente
 from sistema_de_salud.registro_medico import RegistroMedico
 from sistema_de_salud.cita_medica import CitaMedica
 from sistema_de_salud.criptografia import Criptografia
-from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
+from sistema_de_salud.sesiones_cita import CacheSesionesCita
+from sistema_de_salud.registro_masivo import leer_usuarios
+from sistema_de_salud.registro_masivo import registrar_usuarios
+from sistema_de_salud.grafo_tareas import GrafoTareas
+from sistema_de_salud.calendario_citas import CalendarioCitas
+from sistema_de_salud.horario_medico import HorarioMedico
+from sistema_de_salud.cfg.gestor_centro_salud_config import SESION_CITA_TTL
+from sistema_de_salud.cfg.gestor_centro_salud_config import SESION_CITA_MAX_USOS
+from sistema_de_salud.cfg.gestor_centro_salud_config import BOOTSTRAP_WORKERS
+from sistema_de_salud.cfg.gestor_centro_salud_config import BOOTSTRAP_INFORME
+from sistema_de_salud.cfg.gestor_centro_salud_config import CITAS_LOTE_WORKERS
 
 from cryptography.fernet import Fernet
 
@@ -29,6 +43,15 @@ class GestorCentroSalud:
     KEY_LABEL_CITA_MOTIVO = "_CitaMedica__motivo_consulta"
     KEY_LABEL_CITA_MEDICO = "_CitaMedica__id_medico"
     KEY_LABEL_CITA_ESPECIALIDAD = "_CitaMedica__especialidad"
+    __ERROR_MESSAGE_HUECO_OCUPADO = "Hueco ya reservado: "
+    __ERROR_MESSAGE_FUERA_HORARIO = "La hora no es el inicio de un hueco del horario del médico: "
+    __ERROR_MESSAGE_NO_CONFIRMADA = "Cita no confirmada por el médico"
+    __ERROR_MESSAGE_CAMPOS_SOLICITUD = "Campos de la solicitud de cita incorrectos: "
+    # Campos de cada solicitud de registro_citas_lote (los argumentos de registro_cita, en su orden)
+    __CAMPOS_SOLICITUD_CITA = ("id_medico", "especialidad", "fecha_hora", "id_paciente", "telefono_paciente",
+                               "motivo_consulta")
+    # Sesiones (paciente, médico) ya establecidas, compartidas por todas las instancias
+    _sesiones_cita = CacheSesionesCita(SESION_CITA_TTL, SESION_CITA_MAX_USOS)
 
     def __init__(self):
         # Creamos los atributos
@@ -90,8 +113,8 @@ class GestorCentroSalud:
             criptografia = Criptografia()
             # Derivamos una password segura mediante una KDF y la almacenamos
             criptografia.guardar_password(id_paciente, password)
-            # Generamos una pareja de claves con RSA para el paciente
-            criptografia.generar_claves_RSA(paciente.private_key_file_name)
+            # Generamos una pareja de claves para el paciente con el perfil configurado (RSA o EC)
+            criptografia.generar_claves_usuario(paciente.private_key_file_name)
             # Crear una Solicitud de Firma de Certificado (CSR) para el paciente
             csr = criptografia.crear_CSR_paciente(paciente)
             # Solicitamos el certificado del paciente a la Dirección General de Policía (AC3)
@@ -110,8 +133,8 @@ class GestorCentroSalud:
             criptografia = Criptografia()
             # Derivamos una password segura mediante una KDF y la almacenamos
             criptografia.guardar_password(id_medico, password)
-            # Generamos una pareja de claves con RSA para el médico
-            criptografia.generar_claves_RSA(medico.private_key_file_name)
+            # Generamos una pareja de claves para el médico con el perfil configurado (RSA o EC)
+            criptografia.generar_claves_usuario(medico.private_key_file_name)
             # Crear una Solicitud de Firma de Certificado (CSR) para el médico
             csr = criptografia.crear_CSR_medico(self, medico)
             # Solicitamos el certificado del médico al centro de salud (AC2)
@@ -120,70 +143,211 @@ class GestorCentroSalud:
             criptografia.solicitar_certificado_medico(self, csr, public_key, medico.cert_file_name)
         return medico.id_medico
 
+    def registro_masivo(self, ruta_fichero: str) -> dict:
+        """Registra en bloque los pacientes y médicos de un fichero CSV o JSONL y devuelve el informe
+        (registrados, errores por fila y usuarios por segundo)"""
+        return registrar_usuarios(self, leer_usuarios(ruta_fichero))
+
     def registro_cita(self, id_medico: str, especialidad: str, fecha_hora, id_paciente: str, telefono_paciente: str, motivo_consulta: str):
         """Registra una cita médica"""
         cita = CitaMedica(id_medico, especialidad, fecha_hora, id_paciente, telefono_paciente, motivo_consulta)
-        # Cifrado simétrico
-        key = Fernet.generate_key()         # clave simétrica de sesión
-        # El paciente valida el certificado del médico, con el certificado del Centro de Salud (AC2)
-        # y el certificado del Ministerio de Sanidad (AC1)
+        self.__comprobar_horario(cita)
+        paciente = RegistroPaciente.obtener_paciente(id_paciente)
         medico = RegistroMedico.obtener_medico(id_medico)
+        info_cita_medico = self.__intercambiar_cita(cita, paciente, medico)
+        if info_cita_medico is not None:
+            # Las escrituras en store_medicos, store_pacientes y store_citas se confirman juntas
+            with TransaccionStore(MedicoJsonStore(), PacienteJsonStore(), CitaJsonStore()):
+                # Guardamos la información de la cita en la lista mis_citas del médico
+                medico = RegistroMedico.obtener_medico(id_medico)
+                medico.registrar_cita_medico(info_cita_medico)
+                MedicoJsonStore().update_item(medico, medico.id_medico)
+                # Guardamos la información de la cita en la lista mis_citas del paciente
+                paciente = RegistroPaciente.obtener_paciente(id_paciente)
+                paciente.registrar_cita_paciente(self.__info_cita_paciente(cita))
+                PacienteJsonStore().update_item(paciente, paciente.id_paciente)
+                # Guardamos la cita en el fichero store_citas
+                store_citas = CitaJsonStore()
+                store_citas.guardar_cita_store(cita, paciente.id_paciente)
+        return cita
+
+    def registro_citas_lote(self, solicitudes: list) -> list:
+        """Registra muchas citas a la vez (cada solicitud es un diccionario con los argumentos de registro_cita).
+        Los intercambios de parejas (paciente, médico) distintas se hacen en paralelo y las escrituras se
+        agrupan en una sola por store. Devuelve {"identificador_cita", "error"} de cada solicitud, en su orden"""
+        resultados = [None] * len(solicitudes)
+        store_citas = CitaJsonStore()
+        # Huecos (id_medico, fecha_hora) ya pedidos por una solicitud anterior del lote
+        huecos_lote = set()
+        # Pacientes y médicos se obtienen en este hilo: obtener_paciente y obtener_medico congelan
+        # la hora (freeze_time) para todo el proceso y no pueden coincidir con los intercambios
+        pacientes = {}
+        medicos = {}
+        # (id_paciente, id_medico) -> [(posicion, cita)]: las citas de una pareja van en serie y reutilizan su sesión
+        parejas = {}
+        for posicion, solicitud in enumerate(solicitudes):
+            try:
+                campos = set(solicitud) if isinstance(solicitud, dict) else set()
+                campos_incorrectos = campos.symmetric_difference(self.__CAMPOS_SOLICITUD_CITA)
+                if campos_incorrectos:
+                    # Solo los argumentos de registro_cita: ni campos internos de la cita ni campos que falten
+                    raise ExcepcionesGestor(self.__ERROR_MESSAGE_CAMPOS_SOLICITUD +
+                                            ", ".join(sorted(campos_incorrectos)))
+                cita = CitaMedica(*(solicitud[campo] for campo in self.__CAMPOS_SOLICITUD_CITA))
+                self.__comprobar_horario(cita)
+                hueco = (cita.id_medico, cita.fecha_hora.strftime("%Y-%m-%d %H:%M:%S"))
+                if hueco in huecos_lote or store_citas.buscar_citas_activas_medico_fecha_hora_store(*hueco):
+                    raise ExcepcionesGestor(self.__ERROR_MESSAGE_HUECO_OCUPADO + hueco[1])
+                if cita.id_paciente not in pacientes:
+                    pacientes[cita.id_paciente] = RegistroPaciente.obtener_paciente(cita.id_paciente)
+                if cita.id_medico not in medicos:
+                    medicos[cita.id_medico] = RegistroMedico.obtener_medico(cita.id_medico)
+            except (ExcepcionesGestor, TypeError, AttributeError) as e:
+                # Solicitud mal formada, fuera del horario, usuario no registrado o hueco ocupado
+                resultados[posicion] = {"identificador_cita": None, "error": str(e)}
+                continue
+            huecos_lote.add(hueco)
+            parejas.setdefault((cita.id_paciente, cita.id_medico), []).append((posicion, cita))
+
+        def intercambiar_pareja(citas_pareja):
+            """Intercambia en serie las citas de una pareja y devuelve las confirmadas"""
+            confirmadas_pareja = []
+            for posicion, cita in citas_pareja:
+                try:
+                    info_cita_medico = self.__intercambiar_cita(cita, pacientes[cita.id_paciente],
+                                                                medicos[cita.id_medico])
+                except Exception as e:
+                    # Cualquier error en el intercambio solo descarta su cita
+                    resultados[posicion] = {"identificador_cita": None, "error": str(e)}
+                    continue
+                if info_cita_medico is None:
+                    resultados[posicion] = {"identificador_cita": None, "error": self.__ERROR_MESSAGE_NO_CONFIRMADA}
+                    continue
+                confirmadas_pareja.append((posicion, cita, info_cita_medico))
+            return confirmadas_pareja
+
+        with ThreadPoolExecutor(max_workers=CITAS_LOTE_WORKERS, thread_name_prefix="citas-lote") as pool:
+            confirmadas = [confirmada for confirmadas_pareja in pool.map(intercambiar_pareja, parejas.values())
+                           for confirmada in confirmadas_pareja]
+        if not confirmadas:
+            return resultados
+        # Una sola escritura por store al confirmar la transacción
+        with TransaccionStore(MedicoJsonStore(), PacienteJsonStore(), store_citas):
+            medicos = {cita.id_medico: RegistroMedico.obtener_medico(cita.id_medico) for _, cita, _ in confirmadas}
+            pacientes = {cita.id_paciente: RegistroPaciente.obtener_paciente(cita.id_paciente)
+                         for _, cita, _ in confirmadas}
+            for _, cita, info_cita_medico in confirmadas:
+                medicos[cita.id_medico].registrar_cita_medico(info_cita_medico)
+                pacientes[cita.id_paciente].registrar_cita_paciente(self.__info_cita_paciente(cita))
+            MedicoJsonStore().update_items(list(medicos.values()))
+            PacienteJsonStore().update_items(list(pacientes.values()))
+            store_citas.guardar_citas_store([(cita, cita.id_paciente) for _, cita, _ in confirmadas])
+        for posicion, cita, _ in confirmadas:
+            resultados[posicion] = {"identificador_cita": cita.identificador_cita, "error": None}
+        return resultados
+
+    def __comprobar_horario(self, cita: CitaMedica) -> None:
+        """Comprueba que la cita empieza en un hueco del horario del médico: el calendario de huecos
+        solo ve las citas que ocupan uno"""
+        if HorarioMedico.de_medico(cita.id_medico).hueco(cita.fecha_hora) is None:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_FUERA_HORARIO +
+                                    cita.fecha_hora.strftime("%Y-%m-%d %H:%M:%S"))
+
+    def __info_cita_paciente(self, cita: CitaMedica) -> dict:
+        """Información de la cita que se guarda en la lista mis_citas del paciente"""
+        return {
+            self.KEY_LABEL_CITA_ID: cita.identificador_cita,
+            self.KEY_LABEL_CITA_FECHA: cita.fecha_hora.strftime("%Y-%m-%d %H:%M:%S"),
+            self.KEY_LABEL_CITA_MEDICO: cita.id_medico,
+            self.KEY_LABEL_CITA_ESPECIALIDAD: cita.especialidad
+        }
+
+    def __intercambiar_cita(self, cita: CitaMedica, paciente: RegistroPaciente, medico: RegistroMedico):
+        """Intercambio cifrado y firmado de la solicitud y la confirmación de una cita entre el paciente y el médico,
+        sin escribir en los stores. Devuelve la información de la cita para mis_citas del médico, o None si
+        el médico no la confirma"""
         criptografia = Criptografia()
-        cert_medico = criptografia.obtener_certificado(medico.cert_file_name)
-        cert_ac2 = criptografia.obtener_certificado(self.cert_file_name)
-        cert_ac1 = criptografia.obtener_certificado(criptografia.CERT_FILE_NAME_AC1)
-        criptografia.validar_certificado(cert_medico, cert_ac2, cert_ac1)
-        # Encriptamos la key con la clave pública del médico (RSA) para transmitirla de forma segura
-        encrypted_key = criptografia.encriptar_RSA(key, cert_medico)
+        # Si el paciente y el médico ya tienen una sesión establecida reutilizamos su clave simétrica
+        # y los certificados que ya se validaron, sin repetir el intercambio RSA
+        sesion = self._sesiones_cita.reutilizar(paciente.id_paciente, medico.id_medico)
+        if sesion is None:
+            # Cifrado simétrico
+            key = Fernet.generate_key()         # clave simétrica de sesión
+            # El paciente valida el certificado del médico, con el certificado del Centro de Salud (AC2)
+            # y el certificado del Ministerio de Sanidad (AC1)
+            cert_medico = criptografia.obtener_certificado(medico.cert_file_name)
+            cert_ac2 = criptografia.obtener_certificado(self.cert_file_name)
+            cert_ac1 = criptografia.obtener_certificado(criptografia.CERT_FILE_NAME_AC1)
+            criptografia.validar_certificado(cert_medico, cert_ac2, cert_ac1)
+            # Encriptamos la key con la clave pública del médico (RSA o ECIES) para transmitirla de forma segura
+            encrypted_key = criptografia.encriptar_asimetrico(key, cert_medico)
+            # Enviaremos la cita encriptada al médico, con el certificado del paciente
+            cert_paciente = criptografia.obtener_certificado(paciente.cert_file_name)
+            cert_ac3 = criptografia.obtener_certificado(criptografia.CERT_FILE_NAME_AC3)
+            id_sesion = None
+        else:
+            key = sesion.key
+            encrypted_key = None
+            cert_medico, cert_paciente = sesion.cert_medico, sesion.cert_paciente
+            cert_ac1 = cert_ac2 = cert_ac3 = None
+            id_sesion = sesion.id_sesion
         # Serializamos la cita como un string y lo convertimos a bytes
         bytes_data = json.dumps(cita.__dict__).encode('utf-8')
         # Firmamos la cita con la clave privada del paciente
-        paciente = RegistroPaciente.obtener_paciente(id_paciente)
         firma = criptografia.firmar_mensaje(bytes_data, paciente.private_key_file_name)
         # Encriptamos la cita con Fernet
         f = Fernet(key)
         token = f.encrypt(bytes_data)       # obtenemos la cita encriptada como un token
-        # Enviamos la cita encriptada al médico, con el certificado del paciente
-        cert_paciente = criptografia.obtener_certificado(paciente.cert_file_name)
-        cert_ac3 = criptografia.obtener_certificado(criptografia.CERT_FILE_NAME_AC3)
-        confirmacion_encriptada, signature, cert_medico = self.enviar_cita(token, encrypted_key, id_medico, firma, cert_paciente, cert_ac3, cert_ac1)
+        confirmacion_encriptada, signature, cert_recibido, info_cita_medico = self.__atender_solicitud_cita(
+            token, encrypted_key, medico, firma, cert_paciente, cert_ac3, cert_ac1, id_sesion)
+        if sesion is None:
+            cert_medico = cert_recibido
         # Recibimos la confirmación y la desencriptamos
-        id_cita_confirmada = self.recibir_confirmacion(confirmacion_encriptada, key, id_paciente, signature, cert_medico, cert_ac2, cert_ac1)
-        if id_cita_confirmada == cita.identificador_cita:
-            # Guardamos la información de la cita en la lista mis_citas del paciente
-            paciente = RegistroPaciente.obtener_paciente(id_paciente)
-            info_cita = {
-                self.KEY_LABEL_CITA_ID: cita.identificador_cita,
-                self.KEY_LABEL_CITA_FECHA: cita.fecha_hora.strftime("%Y-%m-%d %H:%M:%S"),
-                self.KEY_LABEL_CITA_MEDICO: cita.id_medico,
-                self.KEY_LABEL_CITA_ESPECIALIDAD: cita.especialidad
-            }
-            paciente.registrar_cita_paciente(info_cita)
-            # Actualizamos el paciente en el fichero JSON
-            store_pacientes = PacienteJsonStore()
-            store_pacientes.update_item(paciente, paciente.id_paciente)
-            # Guardamos la cita en el fichero store_citas
-            store_citas = CitaJsonStore()
-            store_citas.guardar_cita_store(cita, paciente.id_paciente)
-        return cita
-
-    def enviar_cita(self, token, encrypted_key, id_medico, firma, cert_paciente, cert_ac3, cert_ac1):
-        """Envía una solicitud de cita del paciente al médico"""
-        # Desencriptamos la key con la clave privada del médico (RSA)
+        id_cita_confirmada = self.recibir_confirmacion(confirmacion_encriptada, key, paciente.id_paciente, signature,
+                                                       cert_medico, cert_ac2, cert_ac1, id_sesion)
+        if id_cita_confirmada != cita.identificador_cita:
+            return None
+        if sesion is None:
+            # El intercambio completo ha ido bien: las siguientes citas entre ambos reutilizan la sesión
+            self._sesiones_cita.crear(paciente.id_paciente, medico.id_medico, key, cert_paciente, cert_medico)
+        return info_cita_medico
+
+    def enviar_cita(self, token, encrypted_key, id_medico, firma, cert_paciente, cert_ac3, cert_ac1, id_sesion=None):
+        """Envía una solicitud de cita del paciente al médico
+        (con id_sesion, por una sesión ya establecida: sin clave RSA ni certificados)"""
         medico = RegistroMedico.obtener_medico(id_medico)
+        confirmacion_encriptada, firma_confirmacion, cert_medico, info_cita = self.__atender_solicitud_cita(
+            token, encrypted_key, medico, firma, cert_paciente, cert_ac3, cert_ac1, id_sesion)
+        # Guardamos la información de la cita en la lista mis_citas del médico
+        medico.registrar_cita_medico(info_cita)
+        # Actualizamos el médico en el fichero JSON
+        store_medicos = MedicoJsonStore()
+        store_medicos.update_item(medico, medico.id_medico)
+        return confirmacion_encriptada, firma_confirmacion, cert_medico
+
+    def __atender_solicitud_cita(self, token, encrypted_key, medico, firma, cert_paciente, cert_ac3, cert_ac1, id_sesion):
+        """El médico desencripta y comprueba la solicitud de cita y firma la confirmación, sin escribir en los stores.
+        Devuelve la confirmación encriptada, su firma, el certificado del médico y la información para mis_citas"""
         criptografia = Criptografia()
-        key = criptografia.desencriptar_RSA(encrypted_key, medico.private_key_file_name)
+        if id_sesion is None:
+            # Desencriptamos la key con la clave privada del médico (RSA o ECIES)
+            key = criptografia.desencriptar_asimetrico(encrypted_key, medico.private_key_file_name)
+        else:
+            # La key y el certificado del paciente ya validado son los de la sesión
+            sesion = self._sesiones_cita.obtener(id_sesion, medico.id_medico)
+            key, cert_paciente = sesion.key, sesion.cert_paciente
         # Desencriptamos la cita con Fernet
         f = Fernet(key)
         bytes_data = f.decrypt(token)
-        # El médico valida el certificado del paciente, con el certificado de la Dirección General de Policía (AC3)
-        # y el certificado del Ministerio de Sanidad (AC1)
-        criptografia.validar_certificado(cert_paciente, cert_ac3, cert_ac1)
+        if id_sesion is None:
+            # El médico valida el certificado del paciente, con el certificado de la Dirección General de Policía (AC3)
+            # y el certificado del Ministerio de Sanidad (AC1)
+            criptografia.validar_certificado(cert_paciente, cert_ac3, cert_ac1)
         # Obtenemos la clave pública del paciente de su certificado
         public_key_paciente = cert_paciente.public_key()
         # Comprobamos la firma de la cita
         criptografia.comprobar_firma(bytes_data, firma, public_key_paciente)
-        # Guardamos la información de la cita en la lista mis_citas del médico
+        # Información de la cita para la lista mis_citas del médico
         cita_dict = json.loads(bytes_data.decode('utf-8'))
         identificador_cita = cita_dict[self.KEY_LABEL_CITA_ID]
         info_cita = {
@@ -192,28 +356,25 @@ class GestorCentroSalud:
             self.KEY_LABEL_CITA_PACIENTE: cita_dict[self.KEY_LABEL_CITA_PACIENTE],
             self.KEY_LABEL_CITA_MOTIVO: cita_dict[self.KEY_LABEL_CITA_MOTIVO]
         }
-        medico.registrar_cita_medico(info_cita)
-        # Actualizamos el médico en el fichero JSON
-        store_medicos = MedicoJsonStore()
-        store_medicos.update_item(medico, medico.id_medico)
         # Firmamos la confirmación de la cita con la clave privada del médico
         confirmacion = identificador_cita.encode('utf-8')
         firma = criptografia.firmar_mensaje(confirmacion, medico.private_key_file_name)
         # Encriptamos la confirmación
         confirmacion_encriptada = f.encrypt(confirmacion)
-        # Devolvemos la confirmación
-        cert_medico = criptografia.obtener_certificado(medico.cert_file_name)
-        return confirmacion_encriptada, firma, cert_medico
+        # Devolvemos la confirmación (por una sesión establecida el paciente ya tiene el certificado del médico)
+        cert_medico = criptografia.obtener_certificado(medico.cert_file_name) if id_sesion is None else None
+        return confirmacion_encriptada, firma, cert_medico, info_cita
 
-    def recibir_confirmacion(self, token, key, id_paciente, firma, cert_medico, cert_ac2, cert_ac1):
+    def recibir_confirmacion(self, token, key, id_paciente, firma, cert_medico, cert_ac2, cert_ac1, id_sesion=None):
         """Recibe la confirmación de la cita del médico"""
         # Desencriptamos la confirmación con Fernet
         f = Fernet(key)
         bytes_data = f.decrypt(token)
-        # El paciente valida el certificado del médico, con el certificado del Centro de Salud (AC2)
-        # y el certificado del Ministerio de Sanidad (AC1)
         criptografia = Criptografia()
-        criptografia.validar_certificado(cert_medico, cert_ac2, cert_ac1)
+        if id_sesion is None:
+            # El paciente valida el certificado del médico, con el certificado del Centro de Salud (AC2)
+            # y el certificado del Ministerio de Sanidad (AC1)
+            criptografia.validar_certificado(cert_medico, cert_ac2, cert_ac1)
         # Obtenemos la clave pública del médico de su certificado
         public_key_medico = cert_medico.public_key()
         # Comprobamos la firma de la cita
@@ -221,31 +382,52 @@ class GestorCentroSalud:
         identificador_cita = bytes_data.decode('utf-8')
         return identificador_cita
 
-    def autenticacion_paciente(self, id_paciente: str, password: str):
-        """Autentica a un paciente"""
-        # Comprobamos que el paciente esté registrado
-        store_pacientes = PacienteJsonStore()
-        paciente = store_pacientes.buscar_paciente_store(id_paciente)
-        if paciente is None:
-            return 1
-        criptografia = Criptografia()
-        if criptografia.comprobar_password(paciente[self.KEY_LABEL_PACIENTE_ID], password) is False:
+    def __id_usuario_registrado(self, tipo_usuario: str, id_usuario: str):
+        """Id guardado del paciente o médico id_usuario, o None si no está registrado"""
+        if tipo_usuario == "paciente":
+            usuario = PacienteJsonStore().buscar_paciente_store(id_usuario)
+            return None if usuario is None else usuario[self.KEY_LABEL_PACIENTE_ID]
+        usuario = MedicoJsonStore().buscar_medico_store(id_usuario)
+        return None if usuario is None else usuario[self.KEY_LABEL_MEDICO_ID]
+
+    @staticmethod
+    def __resultado_autenticacion(password_correcta: bool) -> int:
+        """Resultado de la autenticación de un usuario registrado: 0 si la contraseña es correcta y 2 si no"""
+        if password_correcta is False:
             print("Contraseña incorrecta\n")
             return 2
         return 0
 
+    def __autenticacion(self, tipo_usuario: str, id_usuario: str, password: str) -> int:
+        """Autentica a un usuario: 0 si es correcta, 1 si no está registrado y 2 si la contraseña es incorrecta"""
+        id_registrado = self.__id_usuario_registrado(tipo_usuario, id_usuario)
+        if id_registrado is None:
+            return 1
+        return self.__resultado_autenticacion(Criptografia().comprobar_password(id_registrado, password))
+
+    async def __autenticacion_async(self, tipo_usuario: str, id_usuario: str, password: str) -> int:
+        """Versión asíncrona de __autenticacion: la búsqueda en el store se hace en un hilo
+        y la KDF en el pool de procesos, sin bloquear el bucle de eventos"""
+        id_registrado = await asyncio.to_thread(self.__id_usuario_registrado, tipo_usuario, id_usuario)
+        if id_registrado is None:
+            return 1
+        return self.__resultado_autenticacion(await Criptografia().comprobar_password_async(id_registrado, password))
+
+    def autenticacion_paciente(self, id_paciente: str, password: str):
+        """Autentica a un paciente"""
+        return self.__autenticacion("paciente", id_paciente, password)
+
     def autenticacion_medico(self, id_medico: str, password: str):
         """Autentica a un médico"""
-        # Comprobamos que el médico esté registrado
-        store_medicos = MedicoJsonStore()
-        medico = store_medicos.buscar_medico_store(id_medico)
-        if medico is None:
-            return 1
-        criptografia = Criptografia()
-        if criptografia.comprobar_password(medico[self.KEY_LABEL_MEDICO_ID], password) is False:
-            print("Contraseña incorrecta\n")
-            return 2
-        return 0
+        return self.__autenticacion("medico", id_medico, password)
+
+    async def autenticacion_paciente_async(self, id_paciente: str, password: str):
+        """Versión asíncrona de autenticacion_paciente (la KDF se ejecuta en el pool de procesos)"""
+        return await self.__autenticacion_async("paciente", id_paciente, password)
+
+    async def autenticacion_medico_async(self, id_medico: str, password: str):
+        """Versión asíncrona de autenticacion_medico (la KDF se ejecuta en el pool de procesos)"""
+        return await self.__autenticacion_async("medico", id_medico, password)
 
     def autenticacion_usuarios(self, tipo_usuario: str):
         """Interfaz de autenticación de usuarios"""
@@ -308,25 +490,23 @@ class GestorCentroSalud:
                 medico = RegistroMedico.obtener_medico(id_medico)
 
                 fecha_str = input("\nIntroduzca una fecha (YYYY-MM-DD): ")
-                fecha_hora_str = fecha_str + " " + "00:00:00"
-
-                # Mostrar citas ocupadas para ese médico en esa fecha
-                store_citas = CitaJsonStore()
-                lista_citas = store_citas.buscar_citas_activas_medico_fecha_store(medico.id_medico, fecha_hora_str)
-                if lista_citas:
-                    print("\nHoras ocupadas para la fecha introducida: ")
-                    for item in lista_citas:
-                        print(item["_CitaMedica__fecha_hora"] + " - " + medico.nombre_completo + " - " + item["_CitaMedica__especialidad"] + " -> Ocupado")
+                fecha = datetime.strptime(fecha_str, "%Y-%m-%d")
+
+                # Mostrar las horas libres de ese médico en esa fecha (calendario de huecos, sin leer store_citas)
+                calendario = CalendarioCitas()
+                huecos_libres = calendario.huecos_libres(medico.id_medico, fecha)
+                if huecos_libres:
+                    print("\nHoras libres para la fecha introducida: ")
+                    print(", ".join(hueco.strftime("%H:%M") for hueco in huecos_libres))
                 else:
-                    print("\nTodas las horas están libres para la fecha introducida ")
+                    print("\nNo quedan horas libres para la fecha introducida ")
                 hora_str = input("\nIntroduzca una hora disponible (HH:MM): ")
                 fecha_hora_str = fecha_str + " " + hora_str + ":00"  # YYYY-MM-DD HH:MM:SS
+                # Convert the string to a datetime object
+                fecha_hora = datetime.strptime(fecha_hora_str, "%Y-%m-%d %H:%M:%S")
 
-                # Consultar si la fecha_hora introducida está libre
-                item = store_citas.buscar_citas_activas_medico_fecha_hora_store(medico.id_medico, fecha_hora_str)
-                if not item:
-                    # Convert the string to a datetime object
-                    fecha_hora = datetime.strptime(fecha_hora_str, "%Y-%m-%d %H:%M:%S")
+                # Consultar si la fecha_hora introducida es un hueco libre
+                if calendario.hueco_libre(medico.id_medico, fecha_hora):
                     motivo_consulta = input("\nIntroduzca el motivo de la consulta: ")
                     # Iniciamos el registro de la cita
                     paciente = RegistroPaciente.obtener_paciente(id_paciente)
@@ -466,39 +646,58 @@ class GestorCentroSalud:
             else:
                 print("Opción no válida. Inténtelo de nuevo.")
 
-    def preparacion_sistema(self):
-        """Preparación del sistema"""
-        # Borrar stores
-        store = JSON_FILES_PATH + "store_pacientes.json"
-        if os.path.isfile(store):
-            os.remove(store)
-        store = JSON_FILES_PATH + "store_medicos.json"
-        if os.path.isfile(store):
-            os.remove(store)
-        store = JSON_FILES_PATH + "store_credenciales.json"
-        if os.path.isfile(store):
-            os.remove(store)
-        store = JSON_FILES_PATH + "store_citas.json"
-        if os.path.isfile(store):
-            os.remove(store)
-        # Crear Autoridad de Certificación Raíz (Ministerio de Sanidad)
+    def preparacion_sistema(self) -> str:
+        """Preparación del sistema: los pasos independientes (autoridades subordinadas, cada usuario)
+        se ejecutan en paralelo según sus dependencias. Devuelve el informe con los tiempos de cada paso"""
+        # Empezamos a generar claves RSA en segundo plano mientras se borran los stores
+        Criptografia.iniciar_pool_claves()
         criptografia = Criptografia()
-        cert_ac1 = criptografia.crear_autoridad_raiz()
-        # Crear Autoridad de Certificación Subordinada (Centro de Salud)
-        criptografia.crear_autoridad_subordinada_centro_salud(self, cert_ac1)
-        # Crear Autoridad de Certificación Subordinada (Dirección General de Policía)
-        criptografia.crear_autoridad_subordinada_policia(cert_ac1)
-        # Registrar pacientes
-        self.registro_paciente("54026189V", "Lorenzo Largacha Sanz", "+34666888166", "22", "12345ABC")
-        self.registro_paciente("58849111T", "Pedro Hernandez Bernaldo", "+34111555888", "22", "12345ABC")
-        # Registrar médicos
-        self.registro_medico("76281872A", "Manuel Fernandez Gil", "+34222444777", "51", "Atencion Primaria", "1234asdf")
-        self.registro_medico("84202258V", "Isabel Gomez Rivas", "+34333444666", "42", "Pediatria", "1234asdf")
-        self.registro_medico("92213124Y", "Juan Martin Perez", "+34555444222", "36", "Odontologia", "1234asdf")
-        self.registro_medico("67720890N", "Candela Martinez Sanchez", "+34888444111", "38", "Matrona", "1234asdf")
-        # Registrar cita
+        grafo = GrafoTareas()
+        grafo.agregar("borrar_stores", self.__borrar_stores)
+        # Crear Autoridad de Certificación Raíz (Ministerio de Sanidad)
+        grafo.agregar("AC1", criptografia.crear_autoridad_raiz)
+        # Crear Autoridad de Certificación Subordinada (Centro de Salud), solo depende de AC1
+        grafo.agregar("AC2", lambda cert_ac1: criptografia.crear_autoridad_subordinada_centro_salud(self, cert_ac1),
+                      ["AC1"])
+        # Crear Autoridad de Certificación Subordinada (Dirección General de Policía), solo depende de AC1
+        grafo.agregar("AC3", criptografia.crear_autoridad_subordinada_policia, ["AC1"])
+        # Registrar pacientes (certificados emitidos por AC3)
+        pacientes = [
+            ("54026189V", "Lorenzo Largacha Sanz", "+34666888166", "22", "12345ABC"),
+            ("58849111T", "Pedro Hernandez Bernaldo", "+34111555888", "22", "12345ABC"),
+        ]
+        for datos in pacientes:
+            grafo.agregar("paciente " + datos[0], lambda *_, datos=datos: self.registro_paciente(*datos),
+                          ["borrar_stores", "AC3"])
+        # Registrar médicos (certificados emitidos por AC2)
+        medicos = [
+            ("76281872A", "Manuel Fernandez Gil", "+34222444777", "51", "Atencion Primaria", "1234asdf"),
+            ("84202258V", "Isabel Gomez Rivas", "+34333444666", "42", "Pediatria", "1234asdf"),
+            ("92213124Y", "Juan Martin Perez", "+34555444222", "36", "Odontologia", "1234asdf"),
+            ("67720890N", "Candela Martinez Sanchez", "+34888444111", "38", "Matrona", "1234asdf"),
+        ]
+        for datos in medicos:
+            grafo.agregar("medico " + datos[0], lambda *_, datos=datos: self.registro_medico(*datos),
+                          ["borrar_stores", "AC2"])
+        # Registrar cita, cuando ya están registrados todos los usuarios: obtener_paciente y obtener_medico
+        # congelan la hora (freeze_time) para todo el proceso, no solo para su hilo
         fecha_hora = datetime(2024, 2, 21, 14, 30)
-        self.registro_cita("76281872A", "Atencion Primaria", fecha_hora, "54026189V", "+34666888166", "Dolor de cabeza")
+        grafo.agregar("cita", lambda *_: self.registro_cita("76281872A", "Atencion Primaria", fecha_hora, "54026189V",
+                                                            "+34666888166", "Dolor de cabeza"),
+                      ["paciente " + datos[0] for datos in pacientes] + ["medico " + datos[0] for datos in medicos])
+        grafo.ejecutar(BOOTSTRAP_WORKERS)
+        informe = grafo.informe()
+        if BOOTSTRAP_INFORME:
+            print(informe)
+        return informe
+
+    @staticmethod
+    def __borrar_stores():
+        """Borra los stores (cada motor de almacenamiento sabe qué ficheros tiene que borrar)"""
+        PacienteJsonStore().borrar_store()
+        MedicoJsonStore().borrar_store()
+        AutenticacionJsonStore().borrar_store()
+        CitaJsonStore().borrar_store()
 
     def main(self):
         """Función Principal"""
@@ -0,0 +1,89 @@
+"""Module grafo_tareas"""
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+
+
+class GrafoTareas:
+    """Grafo de tareas con dependencias: ejecuta en paralelo (en un pool de hilos) cada tarea
+    en cuanto han terminado todas sus dependencias y mide lo que tarda cada una"""
+
+    __ERROR_MESSAGE_TAREA_REPETIDA = "Tarea ya añadida al grafo: "
+    __ERROR_MESSAGE_DEPENDENCIA = "Dependencia desconocida: "
+
+    def __init__(self):
+        # nombre -> (funcion, dependencias), en orden de inserción
+        self.__tareas = {}
+        # nombre -> (segundo de inicio desde que empezó la ejecución, duración en segundos)
+        self.__tiempos = {}
+        self.__total = 0.0
+
+    def agregar(self, nombre: str, funcion, dependencias=()) -> None:
+        """Añade una tarea; funcion recibe los resultados de sus dependencias en el mismo orden.
+        Las dependencias tienen que estar ya en el grafo, así que no puede haber ciclos"""
+        if nombre in self.__tareas:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_TAREA_REPETIDA + nombre)
+        for dependencia in dependencias:
+            if dependencia not in self.__tareas:
+                raise ExcepcionesGestor(self.__ERROR_MESSAGE_DEPENDENCIA + dependencia)
+        self.__tareas[nombre] = (funcion, tuple(dependencias))
+
+    def __ejecutar_tarea(self, nombre: str, argumentos: list, inicio_grafo: float):
+        """Ejecuta una tarea y anota cuándo empezó y cuánto ha tardado"""
+        funcion, _ = self.__tareas[nombre]
+        inicio = time.perf_counter()
+        try:
+            return funcion(*argumentos)
+        finally:
+            self.__tiempos[nombre] = (inicio - inicio_grafo, time.perf_counter() - inicio)
+
+    def ejecutar(self, max_workers: int = None) -> dict:
+        """Ejecuta todas las tareas y devuelve sus resultados por nombre.
+        Si una tarea falla no se lanzan más, se espera a las que están en curso y se relanza el error"""
+        inicio_grafo = time.perf_counter()
+        pendientes = {nombre: set(dependencias) for nombre, (_, dependencias) in self.__tareas.items()}
+        dependientes = {nombre: [] for nombre in self.__tareas}
+        for nombre, (_, dependencias) in self.__tareas.items():
+            for dependencia in dependencias:
+                dependientes[dependencia].append(nombre)
+        resultados = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="grafo-tareas") as pool:
+            en_curso = {}
+
+            def lanzar(nombre):
+                del pendientes[nombre]
+                argumentos = [resultados[dependencia] for dependencia in self.__tareas[nombre][1]]
+                en_curso[pool.submit(self.__ejecutar_tarea, nombre, argumentos, inicio_grafo)] = nombre
+
+            for nombre in [nombre for nombre, faltan in pendientes.items() if not faltan]:
+                lanzar(nombre)
+            while en_curso:
+                terminadas, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in terminadas:
+                    nombre = en_curso.pop(futuro)
+                    if futuro.exception() is not None:
+                        error = error or futuro.exception()
+                        continue
+                    resultados[nombre] = futuro.result()
+                    if error is not None:
+                        continue
+                    for dependiente in dependientes[nombre]:
+                        pendientes[dependiente].discard(nombre)
+                        if not pendientes[dependiente]:
+                            lanzar(dependiente)
+        self.__total = time.perf_counter() - inicio_grafo
+        if error is not None:
+            raise error
+        return resultados
+
+    def informe(self) -> str:
+        """Tiempos de cada tarea (ordenadas por inicio) y tiempo total de la ejecución"""
+        lineas = []
+        for nombre, (inicio, duracion) in sorted(self.__tiempos.items(), key=lambda tarea: tarea[1][0]):
+            lineas.append("{:<28} inicio {:7.3f} s  duración {:7.3f} s".format(nombre, inicio, duracion))
+        # Suma de las duraciones de todas las tareas, para compararla con el tiempo total
+        suma = sum(duracion for _, duracion in self.__tiempos.values())
+        lineas.append("{:<28} total  {:7.3f} s  (suma de tareas {:.3f} s)".format("", self.__total, suma))
+        return "\n".join(lineas)
@@ -0,0 +1,56 @@
+"""Module horario_medico"""
+from datetime import datetime, timedelta
+
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.cfg.gestor_centro_salud_config import HORARIO_CONSULTA
+from sistema_de_salud.cfg.gestor_centro_salud_config import HORARIOS_MEDICOS
+
+
+class HorarioMedico:
+    """Horario de consulta de un médico dividido en huecos de cita de la misma duración.
+    El hueco n de un día empieza n * minutos_hueco minutos después de la hora de inicio"""
+
+    __ERROR_MESSAGE_HORARIO = "Horario de consulta no válido"
+
+    def __init__(self, inicio: str, fin: str, minutos_hueco: int):
+        # Horas en minutos desde las 00:00
+        self.__inicio = self.__minutos(inicio)
+        self.__fin = self.__minutos(fin)
+        self.__minutos_hueco = minutos_hueco
+        if minutos_hueco <= 0 or self.__fin <= self.__inicio:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_HORARIO)
+
+    @staticmethod
+    def __minutos(hora: str) -> int:
+        """Convierte una hora HH:MM en minutos desde las 00:00"""
+        horas, minutos = hora.split(":")
+        return int(horas) * 60 + int(minutos)
+
+    @classmethod
+    def de_medico(cls, id_medico: str):
+        """Horario de un médico (el suyo si está en HORARIOS_MEDICOS o, si no, el general)"""
+        horario = HORARIOS_MEDICOS.get(id_medico, HORARIO_CONSULTA)
+        return cls(horario["inicio"], horario["fin"], horario["minutos_hueco"])
+
+    @property
+    def minutos_hueco(self) -> int:
+        """Duración de cada hueco en minutos"""
+        return self.__minutos_hueco
+
+    @property
+    def numero_huecos(self) -> int:
+        """Huecos de cita que caben en un día"""
+        return (self.__fin - self.__inicio) // self.__minutos_hueco
+
+    def hueco(self, fecha_hora: datetime):
+        """Número del hueco que empieza en fecha_hora, o None si no es el inicio de un hueco del horario"""
+        minutos = fecha_hora.hour * 60 + fecha_hora.minute - self.__inicio
+        if fecha_hora.second or minutos < 0 or minutos % self.__minutos_hueco:
+            return None
+        hueco = minutos // self.__minutos_hueco
+        return hueco if hueco < self.numero_huecos else None
+
+    def fecha_hora_hueco(self, fecha, hueco: int) -> datetime:
+        """Fecha y hora de inicio del hueco número hueco de un día"""
+        inicio_dia = datetime(fecha.year, fecha.month, fecha.day)
+        return inicio_dia + timedelta(minutes=self.__inicio + hueco * self.__minutos_hueco)
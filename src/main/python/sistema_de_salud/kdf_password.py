@@ -0,0 +1,109 @@
+"""Module kdf_password"""
+import os
+import sys
+import json
+import time
+import threading
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.storage.transaccion_store import escribir_fichero_atomico
+from sistema_de_salud.cfg.gestor_centro_salud_config import KDF_ALGORITMO
+from sistema_de_salud.cfg.gestor_centro_salud_config import KDF_PARAMETROS
+from sistema_de_salud.cfg.gestor_centro_salud_config import KDF_PARAMETROS_FILE_PATH
+
+KDF_PBKDF2 = "pbkdf2_sha256"
+KDF_SCRYPT = "scrypt"
+# Parámetros de las credenciales guardadas antes de registrar el algoritmo en store_credenciales
+KDF_LEGACY = {"algoritmo": KDF_PBKDF2, "iteraciones": 480000}
+# Memoria máxima que puede usar scrypt al calibrar (128 * n * r bytes)
+SCRYPT_MEMORIA_MAXIMA = 256 * 1024 * 1024
+
+_ERROR_MESSAGE_KDF_DESCONOCIDA = "Algoritmo KDF desconocido: "
+
+# Parámetros leídos de KDF_PARAMETROS_FILE_PATH y (inodo, mtime, tamaño) del fichero cuando se leyeron
+_cache_parametros = {"firma": None, "kdf": None}
+_cache_lock = threading.Lock()
+
+
+def derivar_clave_password(password: bytes, salt: bytes, kdf: dict) -> bytes:
+    """Deriva una clave de 32 bytes con el algoritmo y los parámetros de kdf
+    (función de módulo para poder ejecutarla en otro proceso)"""
+    if kdf["algoritmo"] == KDF_PBKDF2:
+        # Algoritmo de coste variable PBKDF2 (Password Based Key Derivation Function 2) con SHA256
+        derivador = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=kdf["iteraciones"])
+    elif kdf["algoritmo"] == KDF_SCRYPT:
+        # scrypt: coste en CPU y en memoria (n), tamaño de bloque (r) y paralelismo (p)
+        derivador = Scrypt(salt=salt, length=32, n=kdf["n"], r=kdf["r"], p=kdf["p"])
+    else:
+        raise ExcepcionesGestor(_ERROR_MESSAGE_KDF_DESCONOCIDA + str(kdf["algoritmo"]))
+    return derivador.derive(password)
+
+
+def parametros_kdf_actuales() -> dict:
+    """Algoritmo y parámetros con los que se derivan las contraseñas nuevas
+    (los calibrados en KDF_PARAMETROS_FILE_PATH o, si no hay, los de la configuración)"""
+    try:
+        stat = os.stat(KDF_PARAMETROS_FILE_PATH)
+        firma = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        firma = None
+    with _cache_lock:
+        # Solo se vuelve a leer el fichero si ha cambiado (guardar_parametros_kdf lo sustituye con rename)
+        if firma is None or firma != _cache_parametros["firma"]:
+            _cache_parametros["firma"] = firma
+            _cache_parametros["kdf"] = _leer_parametros_kdf() if firma is not None else None
+        kdf = _cache_parametros["kdf"]
+    if kdf is None:
+        kdf = {"algoritmo": KDF_ALGORITMO}
+        kdf.update(KDF_PARAMETROS[KDF_ALGORITMO])
+    # Copia: el llamante puede modificar el diccionario
+    return dict(kdf)
+
+
+def _leer_parametros_kdf():
+    """Parámetros calibrados guardados en KDF_PARAMETROS_FILE_PATH, o None si no hay"""
+    try:
+        with open(KDF_PARAMETROS_FILE_PATH, "r", encoding="utf-8", newline="") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _medir(kdf: dict) -> float:
+    """Segundos que tarda una derivación con los parámetros kdf"""
+    inicio = time.perf_counter()
+    derivar_clave_password(b"calibracion", os.urandom(16), kdf)
+    return time.perf_counter() - inicio
+
+
+def calibrar_kdf(algoritmo: str, latencia_objetivo: float) -> dict:
+    """Busca los parámetros de un algoritmo con los que una derivación tarda aproximadamente latencia_objetivo segundos"""
+    if algoritmo == KDF_PBKDF2:
+        # El coste de PBKDF2 es lineal en el número de iteraciones
+        muestra = {"algoritmo": KDF_PBKDF2, "iteraciones": 100000}
+        segundos = min(_medir(muestra) for _ in range(3))
+        iteraciones = int(muestra["iteraciones"] * latencia_objetivo / segundos) // 10000 * 10000
+        return {"algoritmo": KDF_PBKDF2, "iteraciones": max(iteraciones, KDF_LEGACY["iteraciones"])}
+    if algoritmo == KDF_SCRYPT:
+        # n tiene que ser potencia de 2: lo duplicamos hasta alcanzar la latencia o el límite de memoria
+        kdf = {"algoritmo": KDF_SCRYPT, "n": 2 ** 14, "r": 8, "p": 1}
+        while 128 * kdf["n"] * 2 * kdf["r"] <= SCRYPT_MEMORIA_MAXIMA and _medir(kdf) < latencia_objetivo / 2:
+            kdf["n"] *= 2
+        return kdf
+    raise ExcepcionesGestor(_ERROR_MESSAGE_KDF_DESCONOCIDA + str(algoritmo))
+
+
+def guardar_parametros_kdf(kdf: dict) -> None:
+    """Guarda los parámetros calibrados para las contraseñas nuevas y los rehash al iniciar sesión"""
+    escribir_fichero_atomico(KDF_PARAMETROS_FILE_PATH, json.dumps(kdf))
+
+
+if __name__ == "__main__":
+    # Uso: python -m sistema_de_salud.kdf_password <pbkdf2_sha256|scrypt> <milisegundos objetivo>
+    parametros = calibrar_kdf(sys.argv[1], int(sys.argv[2]) / 1000)
+    guardar_parametros_kdf(parametros)
+    print("Parámetros KDF calibrados: " + json.dumps(parametros))
@@ -0,0 +1,81 @@
+"""Module migracion_cifrado_citas"""
+from sistema_de_salud.storage.paciente_json_store import PacienteJsonStore
+from sistema_de_salud.storage.cita_json_store import CitaJsonStore
+from sistema_de_salud.storage.transaccion_store import TransaccionStore
+from sistema_de_salud.registro_paciente import RegistroPaciente
+from sistema_de_salud.cita_medica import CitaMedica
+from sistema_de_salud.criptografia import Criptografia
+
+from cryptography.exceptions import InvalidTag
+
+KEY_LABEL_PACIENTE_ID = "_RegistroPaciente__id_paciente"
+KEY_LABEL_PACIENTE_CITAS = "_RegistroPaciente__mis_citas"
+KEY_LABEL_CITA_ID = "_CitaMedica__identificador_cita"
+KEY_LABEL_CITA_CLAVE = "_CitaMedica__clave_cita"
+PREFIJO_CITA = "_CitaMedica__"
+
+
+def _desencriptar_campos_RSA(criptografia, item: dict, paciente: RegistroPaciente) -> dict:
+    """Desencripta con RSA los campos cifrados de una cita guardada en el formato antiguo"""
+    return {campo: criptografia.desencriptar_asimetrico(bytes.fromhex(item[PREFIJO_CITA + campo]),
+                                                 paciente.private_key_file_name)
+            for campo in CitaMedica.CAMPOS_CIFRADOS}
+
+
+def _pacientes_candidatos(item: dict, paciente_cita: dict, ids_pacientes: list, sin_titular: bool) -> list:
+    """Pacientes que pueden ser el titular de la cita: el que la tiene en mis_citas o, si se pide, todos"""
+    id_paciente = paciente_cita.get(item[KEY_LABEL_CITA_ID])
+    if id_paciente is not None:
+        return [id_paciente]
+    if sin_titular:
+        # Las citas canceladas ya no están en mis_citas y su id_paciente va cifrado: probamos las claves
+        # de todos los pacientes (un descifrado RSA por paciente)
+        return ids_pacientes
+    return []
+
+
+def migrar_citas_a_sobre(sin_titular: bool = False) -> int:
+    """Vuelve a cifrar con sobre digital (AES-GCM + RSA) las citas cifradas campo a campo con RSA
+    y devuelve el número de citas migradas. Las citas sin titular en mis_citas (canceladas) siguen
+    en el formato antiguo, que se sigue pudiendo leer, salvo con sin_titular=True"""
+    criptografia = Criptografia()
+    store_citas = CitaJsonStore()
+    paciente_cita = {}
+    ids_pacientes = []
+    for item in PacienteJsonStore().iter_items():
+        ids_pacientes.append(item[KEY_LABEL_PACIENTE_ID])
+        for info_cita in item[KEY_LABEL_PACIENTE_CITAS]:
+            paciente_cita[info_cita[KEY_LABEL_CITA_ID]] = item[KEY_LABEL_PACIENTE_ID]
+    pacientes = {}
+    nuevos_items = []
+    # Todas las citas se reescriben juntas al final
+    with TransaccionStore(store_citas):
+        for item in store_citas.load_store():
+            if item.get(KEY_LABEL_CITA_CLAVE) is not None:
+                continue
+            for id_paciente in _pacientes_candidatos(item, paciente_cita, ids_pacientes, sin_titular):
+                if id_paciente not in pacientes:
+                    pacientes[id_paciente] = RegistroPaciente.obtener_paciente(id_paciente)
+                paciente = pacientes[id_paciente]
+                try:
+                    campos = _desencriptar_campos_RSA(criptografia, item, paciente)
+                except (ValueError, InvalidTag):
+                    # OAEP (o ECIES) falla con la clave de otro paciente
+                    continue
+                cert_paciente = criptografia.obtener_certificado(paciente.cert_file_name)
+                clave_cita, campos_cifrados = criptografia.encriptar_sobre(campos, cert_paciente,
+                                                                           item[KEY_LABEL_CITA_ID])
+                nuevo_item = dict(item)
+                nuevo_item[KEY_LABEL_CITA_CLAVE] = clave_cita.hex()
+                for campo, valor in campos_cifrados.items():
+                    nuevo_item[PREFIJO_CITA + campo] = valor.hex()
+                nuevos_items.append(nuevo_item)
+                break
+        # Una sola actualización con todas las citas migradas
+        if nuevos_items:
+            store_citas.update_items(nuevos_items)
+    return len(nuevos_items)
+
+
+if __name__ == "__main__":
+    print(str(migrar_citas_a_sobre()) + " citas migradas a sobre digital")
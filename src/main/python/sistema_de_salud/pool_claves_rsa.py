@@ -0,0 +1,80 @@
+"""Module pool_claves_rsa"""
+import queue
+import threading
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+class PoolClavesRSA:
+    """Pool de claves RSA generadas por adelantado en hilos en segundo plano.
+    Si el pool está vacío quien pide una clave la genera en el momento"""
+
+    def __init__(self, tamano: int, num_workers: int, key_size: int = 2048):
+        self.__tamano = tamano
+        self.__num_workers = num_workers
+        self.__key_size = key_size
+        self.__claves = queue.Queue(maxsize=max(tamano, 1))
+        self.__lock = threading.Lock()
+        self.__workers = []
+        self.__detenido = threading.Event()
+        self.__servidas_pool = 0
+        self.__generadas_en_linea = 0
+
+    def __generar(self):
+        """Genera una pareja de claves RSA"""
+        return rsa.generate_private_key(
+            public_exponent=65537,              # Almost everyone should use 65537
+            key_size=self.__key_size            # Se recomienda que la clave sea de al menos 2048 bits (NIST 2016)
+        )
+
+    def __rellenar(self) -> None:
+        """Bucle de un worker: mantiene el pool lleno hasta que se detenga"""
+        while not self.__detenido.is_set():
+            private_key = self.__generar()
+            while not self.__detenido.is_set():
+                try:
+                    # Con el pool lleno esperamos a que se saque alguna clave
+                    self.__claves.put(private_key, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+
+    def iniciar(self) -> None:
+        """Arranca los workers que rellenan el pool (si no estaban ya arrancados)"""
+        with self.__lock:
+            if self.__workers or self.__tamano <= 0:
+                return
+            self.__detenido.clear()
+            for numero in range(self.__num_workers):
+                worker = threading.Thread(target=self.__rellenar, name="pool-claves-rsa-" + str(numero), daemon=True)
+                worker.start()
+                self.__workers.append(worker)
+
+    def detener(self) -> None:
+        """Detiene los workers y vacía el pool"""
+        with self.__lock:
+            self.__detenido.set()
+            workers, self.__workers = self.__workers, []
+        for worker in workers:
+            worker.join()
+        while not self.__claves.empty():
+            self.__claves.get_nowait()
+
+    def obtener_clave(self):
+        """Devuelve una clave del pool o, si está vacío, una generada en el momento"""
+        self.iniciar()
+        try:
+            private_key = self.__claves.get_nowait()
+        except queue.Empty:
+            with self.__lock:
+                self.__generadas_en_linea += 1
+            return self.__generar()
+        with self.__lock:
+            self.__servidas_pool += 1
+        return private_key
+
+    def estadisticas(self) -> dict:
+        """Devuelve las claves servidas desde el pool, las generadas en el momento y las disponibles"""
+        with self.__lock:
+            return {"servidas_pool": self.__servidas_pool, "generadas_en_linea": self.__generadas_en_linea,
+                    "disponibles": self.__claves.qsize()}
@@ -0,0 +1,206 @@
+"""Module registro_masivo"""
+import os
+import csv
+import sys
+import json
+import time
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from sistema_de_salud.storage.paciente_json_store import PacienteJsonStore
+from sistema_de_salud.storage.medico_json_store import MedicoJsonStore
+from sistema_de_salud.storage.autenticacion_json_store import AutenticacionJsonStore
+from sistema_de_salud.storage.transaccion_store import TransaccionStore
+from sistema_de_salud.storage.transaccion_store import transaccion_activa
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.registro_paciente import RegistroPaciente
+from sistema_de_salud.registro_medico import RegistroMedico
+from sistema_de_salud.criptografia import Criptografia
+from sistema_de_salud.criptografia import obtener_pool_kdf
+from sistema_de_salud.emisor_certificados import EmisorCertificados
+from sistema_de_salud.kdf_password import derivar_clave_password
+from sistema_de_salud.kdf_password import parametros_kdf_actuales
+from sistema_de_salud.cfg.gestor_centro_salud_config import USER_KEY_PROFILE
+from sistema_de_salud.cfg.gestor_centro_salud_config import KEY_FILES_PATH
+from sistema_de_salud.cfg.gestor_centro_salud_config import CERT_FILES_PATH
+
+TIPO_PACIENTE = "paciente"
+TIPO_MEDICO = "medico"
+# Columnas del fichero de usuarios (especialidad solo para médicos)
+CAMPOS_PACIENTE = ("tipo", "id", "nombre_completo", "telefono", "edad", "password")
+CAMPOS_MEDICO = CAMPOS_PACIENTE + ("especialidad",)
+
+KEY_LABEL_PACIENTE_ID = "_RegistroPaciente__id_paciente"
+KEY_LABEL_MEDICO_ID = "_RegistroMedico__id_medico"
+KEY_LABEL_USER_ID = "_AutenticacionUsuario__id_usuario"
+
+_ERROR_MESSAGE_TIPO = "Tipo de usuario desconocido: "
+_ERROR_MESSAGE_CAMPO = "Falta el campo: "
+_ERROR_MESSAGE_ID_REGISTRADO = "ID de usuario ya registrado: "
+
+
+def leer_usuarios(ruta_fichero: str) -> list:
+    """Lee las filas de un fichero CSV (con cabecera) o JSONL (un usuario por línea)"""
+    with open(ruta_fichero, "r", encoding="utf-8", newline="") as file:
+        if ruta_fichero.endswith(".csv"):
+            return list(csv.DictReader(file))
+        return [json.loads(linea) for linea in file if linea.strip()]
+
+
+def _crear_usuario(fila: dict):
+    """Devuelve el RegistroPaciente o RegistroMedico de una fila"""
+    if fila["tipo"] == TIPO_MEDICO:
+        return RegistroMedico(fila["id"], fila["nombre_completo"], fila["telefono"], fila["edad"],
+                              fila["especialidad"])
+    return RegistroPaciente(fila["id"], fila["nombre_completo"], fila["telefono"], fila["edad"])
+
+
+def _validar_fila(fila: dict, ids_registrados: set) -> None:
+    """Comprueba que una fila tiene todos sus campos y que su id no está ya registrado"""
+    tipo = fila.get("tipo")
+    if tipo not in (TIPO_PACIENTE, TIPO_MEDICO):
+        raise ExcepcionesGestor(_ERROR_MESSAGE_TIPO + str(tipo))
+    for campo in CAMPOS_MEDICO if tipo == TIPO_MEDICO else CAMPOS_PACIENTE:
+        if not fila.get(campo):
+            raise ExcepcionesGestor(_ERROR_MESSAGE_CAMPO + campo)
+    if fila["id"] in ids_registrados:
+        raise ExcepcionesGestor(_ERROR_MESSAGE_ID_REGISTRADO + fila["id"])
+
+
+def _preparar_usuario(fila: dict, centro_salud, perfil: str, salt: bytes, kdf: dict):
+    """Deriva la clave de la contraseña, genera la pareja de claves y firma la CSR de un usuario
+    (se ejecuta en el pool de procesos: devuelve la clave derivada y los PEM de la clave privada y la CSR)"""
+    key = derivar_clave_password(fila["password"].encode('utf-8'), salt, kdf)
+    if perfil == Criptografia.PERFIL_EC_P256:
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    criptografia = Criptografia()
+    usuario = _crear_usuario(fila)
+    if fila["tipo"] == TIPO_MEDICO:
+        csr = criptografia.crear_CSR_medico(centro_salud, usuario, private_key)
+    else:
+        csr = criptografia.crear_CSR_paciente(usuario, private_key)
+    private_key_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    return key, private_key_pem, csr.public_bytes(serialization.Encoding.PEM)
+
+
+def _id_registrado(id_usuario: str) -> bool:
+    """Comprueba si un id ya está en alguno de los stores de usuarios"""
+    return (PacienteJsonStore().find_item(id_usuario) is not None or
+            MedicoJsonStore().find_item(id_usuario) is not None or
+            AutenticacionJsonStore().find_item(id_usuario) is not None)
+
+
+def _borrar_ficheros(rutas: list) -> None:
+    """Borra los PEM escritos para una transacción que se ha descartado"""
+    for ruta in rutas:
+        if os.path.isfile(ruta):
+            os.remove(ruta)
+
+
+def registrar_usuarios(centro_salud, filas: list) -> dict:
+    """Registra pacientes y médicos en bloque: deriva las contraseñas, genera las claves y firma las CSR
+    en el pool de procesos, emite los certificados por lotes y escribe cada store una sola vez.
+    Devuelve los registrados, los errores por fila y el rendimiento"""
+    inicio = time.perf_counter()
+    # Ids ya registrados, leídos una sola vez en lugar de buscar cada usuario en los stores
+    ids_registrados = {item[KEY_LABEL_PACIENTE_ID] for item in PacienteJsonStore().iter_items()}
+    ids_registrados.update(item[KEY_LABEL_MEDICO_ID] for item in MedicoJsonStore().iter_items())
+    ids_registrados.update(item[KEY_LABEL_USER_ID] for item in AutenticacionJsonStore().iter_items())
+    errores = []
+    kdf = parametros_kdf_actuales()
+    futuros = []
+    for numero_fila, fila in enumerate(filas, start=1):
+        try:
+            _validar_fila(fila, ids_registrados)
+        except ExcepcionesGestor as e:
+            errores.append({"fila": numero_fila, "error": str(e)})
+            continue
+        # Los duplicados dentro del propio fichero también se rechazan
+        ids_registrados.add(fila["id"])
+        salt = os.urandom(16)
+        futuro = obtener_pool_kdf().submit(_preparar_usuario, fila, centro_salud, USER_KEY_PROFILE, salt, kdf)
+        futuros.append((numero_fila, fila, salt, futuro))
+
+    criptografia = Criptografia()
+    # Filas preparadas por tipo de usuario: (numero_fila, usuario, clave privada, CSR, credenciales)
+    preparados = {TIPO_PACIENTE: [], TIPO_MEDICO: []}
+    for numero_fila, fila, salt, futuro in futuros:
+        try:
+            key, private_key_pem, csr_pem = futuro.result()
+        except Exception as e:
+            # Cualquier error en el worker solo descarta su fila
+            errores.append({"fila": numero_fila, "error": str(e)})
+            continue
+        private_key = serialization.load_pem_private_key(private_key_pem, password=None)
+        preparados[fila["tipo"]].append((numero_fila, _crear_usuario(fila), private_key,
+                                         x509.load_pem_x509_csr(csr_pem),
+                                         criptografia.credenciales_usuario(fila["id"], salt, key, kdf)))
+
+    # Cada Autoridad de Certificación carga su clave una vez y firma su lote en paralelo.
+    # Los PEM se escriben dentro de la transacción, solo para las filas que se registran
+    emisores = {TIPO_PACIENTE: EmisorCertificados.policia,
+                TIPO_MEDICO: lambda: EmisorCertificados.centro_salud(centro_salud)}
+    registros = []
+    for tipo, filas_tipo in preparados.items():
+        if not filas_tipo:
+            continue
+        certs = emisores[tipo]().emitir_lote([(csr, private_key.public_key(), usuario.cert_file_name)
+                                             for _, usuario, private_key, csr, _ in filas_tipo], guardar=False)
+        for (numero_fila, usuario, private_key, _, credencial), cert in zip(filas_tipo, certs):
+            if isinstance(cert, Exception):
+                errores.append({"fila": numero_fila, "error": str(cert) or type(cert).__name__})
+                continue
+            registros.append((numero_fila, tipo, usuario, private_key, cert, credencial))
+
+    # Una sola escritura por store al confirmar la transacción
+    registrados = 0
+    with TransaccionStore(PacienteJsonStore(), MedicoJsonStore(), AutenticacionJsonStore()):
+        # Con los bloqueos exclusivos ya tomados, comprobamos otra vez los ids: otro proceso
+        # puede haberlos registrado mientras se preparaban las filas
+        usuarios = {TIPO_PACIENTE: [], TIPO_MEDICO: []}
+        credenciales = []
+        ficheros = []
+        transaccion_activa().al_descartar(lambda: _borrar_ficheros(ficheros))
+        for numero_fila, tipo, usuario, private_key, cert, credencial in registros:
+            id_usuario = credencial[KEY_LABEL_USER_ID]
+            if _id_registrado(id_usuario):
+                errores.append({"fila": numero_fila, "error": _ERROR_MESSAGE_ID_REGISTRADO + id_usuario})
+                continue
+            ficheros.append(os.path.join(KEY_FILES_PATH, usuario.private_key_file_name))
+            criptografia.guardar_clave_privada(private_key, usuario.private_key_file_name)
+            ficheros.append(os.path.join(CERT_FILES_PATH, usuario.cert_file_name))
+            criptografia.guardar_certificado(cert, usuario.cert_file_name)
+            usuarios[tipo].append(usuario)
+            credenciales.append(credencial)
+        PacienteJsonStore().add_items(usuarios[TIPO_PACIENTE])
+        MedicoJsonStore().add_items(usuarios[TIPO_MEDICO])
+        AutenticacionJsonStore().add_items(credenciales)
+        registrados = len(credenciales)
+    errores.sort(key=lambda error: error["fila"])
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "registrados": registrados,
+        "errores": errores,
+        "segundos": round(segundos, 3),
+        "usuarios_por_segundo": round(registrados / segundos, 1) if segundos > 0 else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    # Uso: python -m sistema_de_salud.registro_masivo <usuarios.csv|usuarios.jsonl>
+    from sistema_de_salud.gestor_centro_salud import GestorCentroSalud
+    informe = GestorCentroSalud().registro_masivo(sys.argv[1])
+    for error in informe["errores"]:
+        print("Fila " + str(error["fila"]) + ": " + error["error"])
+    print(str(informe["registrados"]) + " usuarios registrados en " + str(informe["segundos"]) + " s (" +
+          str(informe["usuarios_por_segundo"]) + " usuarios/s)")
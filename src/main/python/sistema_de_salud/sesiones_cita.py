@@ -0,0 +1,121 @@
+"""Module sesiones_cita"""
+import os
+import time
+import threading
+
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+
+
+class SesionCita:
+    """Canal establecido entre un paciente y un médico: clave simétrica y certificados ya validados"""
+
+    def __init__(self, id_paciente: str, id_medico: str, key: bytes, cert_paciente, cert_medico, caducidad: float):
+        self.__id_sesion = os.urandom(16).hex()
+        self.__id_paciente = id_paciente
+        self.__id_medico = id_medico
+        self.__key = key
+        self.__cert_paciente = cert_paciente
+        self.__cert_medico = cert_medico
+        self.__caducidad = caducidad
+        self.__usos = 0
+
+    @property
+    def id_sesion(self) -> str:
+        """Identificador de la sesión que comparten paciente y médico"""
+        return self.__id_sesion
+
+    @property
+    def id_paciente(self) -> str:
+        """DNI del paciente"""
+        return self.__id_paciente
+
+    @property
+    def id_medico(self) -> str:
+        """DNI del médico"""
+        return self.__id_medico
+
+    @property
+    def key(self) -> bytes:
+        """Clave simétrica (Fernet) de la sesión"""
+        return self.__key
+
+    @property
+    def cert_paciente(self):
+        """Certificado del paciente validado al establecer la sesión"""
+        return self.__cert_paciente
+
+    @property
+    def cert_medico(self):
+        """Certificado del médico validado al establecer la sesión"""
+        return self.__cert_medico
+
+    @property
+    def usos(self) -> int:
+        """Número de veces que se ha reutilizado la sesión"""
+        return self.__usos
+
+    def vigente(self, max_usos: int) -> bool:
+        """Comprueba que la sesión no ha caducado ni ha agotado sus usos"""
+        return time.monotonic() < self.__caducidad and self.__usos < max_usos
+
+    def usar(self) -> None:
+        """Cuenta un uso de la sesión"""
+        self.__usos += 1
+
+
+class CacheSesionesCita:
+    """Sesiones (paciente, médico) reutilizables durante ttl segundos y como mucho max_usos veces"""
+
+    __ERROR_MESSAGE_SESION_NO_VALIDA = "Sesión de cita no válida o caducada"
+
+    def __init__(self, ttl: float, max_usos: int):
+        self.__ttl = ttl
+        self.__max_usos = max_usos
+        self.__lock = threading.Lock()
+        # (id_paciente, id_medico) -> sesión
+        self.__sesiones = {}
+        # id_sesion -> sesión
+        self.__sesiones_id = {}
+
+    def __descartar(self, sesion: SesionCita) -> None:
+        """Olvida una sesión"""
+        self.__sesiones.pop((sesion.id_paciente, sesion.id_medico), None)
+        self.__sesiones_id.pop(sesion.id_sesion, None)
+
+    def crear(self, id_paciente: str, id_medico: str, key: bytes, cert_paciente, cert_medico) -> SesionCita:
+        """Registra la sesión establecida tras un intercambio completo (RSA y certificados) entre paciente y médico"""
+        sesion = SesionCita(id_paciente, id_medico, key, cert_paciente, cert_medico, time.monotonic() + self.__ttl)
+        with self.__lock:
+            anterior = self.__sesiones.get((id_paciente, id_medico))
+            if anterior is not None:
+                self.__descartar(anterior)
+            self.__sesiones[(id_paciente, id_medico)] = sesion
+            self.__sesiones_id[sesion.id_sesion] = sesion
+        return sesion
+
+    def reutilizar(self, id_paciente: str, id_medico: str):
+        """Devuelve la sesión vigente entre un paciente y un médico contando un uso, o None"""
+        with self.__lock:
+            sesion = self.__sesiones.get((id_paciente, id_medico))
+            if sesion is None:
+                return None
+            if not sesion.vigente(self.__max_usos):
+                self.__descartar(sesion)
+                return None
+            sesion.usar()
+            return sesion
+
+    def obtener(self, id_sesion: str, id_medico: str) -> SesionCita:
+        """Devuelve al médico la sesión con el identificador recibido"""
+        with self.__lock:
+            sesion = self.__sesiones_id.get(id_sesion)
+        # El uso ya lo contó el paciente al reutilizarla, aquí solo comprobamos que sigue siendo válida
+        if sesion is None or sesion.id_medico != id_medico or not sesion.vigente(self.__max_usos + 1):
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_SESION_NO_VALIDA)
+        return sesion
+
+    def vaciar(self) -> None:
+        """Olvida todas las sesiones"""
+        with self.__lock:
+            self.__sesiones.clear()
+            self.__sesiones_id.clear()
@@ -1,5 +1,6 @@
 """Module autenticacion_json_store"""
 from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.motor_store import MotorStore
 from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
 from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
 
@@ -7,7 +8,7 @@ from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
 class AutenticacionJsonStore(JsonStore):
     """Clase hija de JsonStore con los atributos para store_credenciales"""
 
-    class __AutenticacionJsonStore(JsonStore):
+    class __AutenticacionJsonStore(MotorStore):
         """Clase privada, patron singleton"""
         _FILE_PATH = JSON_FILES_PATH + "store_credenciales.json"
         _ID_FIELD = "_AutenticacionUsuario__id_usuario"
@@ -17,12 +18,6 @@ class AutenticacionJsonStore(JsonStore):
         __ERROR_MESSAGE_ID_REGISTRADO = "Credenciales de usuario ya registradas"
         __ERROR_MESSAGE_ID_NO_ENCONTRADO = "Credenciales de usuario no encontradas"
 
-        def add_item(self, usuario: dict) -> None:
-            """Añade un diccionario a un fichero Json"""
-            data_list = self.load_store()
-            data_list.append(usuario)
-            self.save_store(data_list)
-
         def guardar_credenciales_store(self, usuario: dict) -> True:
             """Guarda la autenticación de un usuario en un fichero Json"""
             found = False
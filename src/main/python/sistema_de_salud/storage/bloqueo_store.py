@@ -0,0 +1,94 @@
+"""Module bloqueo_store"""
+import os
+import threading
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+
+try:
+    import fcntl
+except ImportError:
+    # En sistemas sin fcntl (Windows) no hay bloqueo entre procesos
+    fcntl = None
+
+# Bloqueos que tiene el hilo actual: ruta -> [exclusivo, contador, descriptor]
+_local = threading.local()
+
+
+def _bloqueos_hilo() -> dict:
+    """Devuelve los bloqueos que tiene el hilo actual"""
+    if not hasattr(_local, "bloqueos"):
+        _local.bloqueos = {}
+    return _local.bloqueos
+
+
+class BloqueoStore:
+    """Bloqueo de un fichero .lock entre procesos con flock: compartido para lectores y exclusivo para escritores.
+    Es reentrante en el mismo hilo, así que un método con el bloqueo puede llamar a otro que también lo pide"""
+
+    __ERROR_MESSAGE_FILE_NOT_FOUND = "Nombre del fichero o ruta de archivo incorrectos"
+    __ERROR_MESSAGE_AMPLIAR = "No se puede pedir un bloqueo exclusivo teniendo uno compartido"
+
+    def __init__(self, ruta: str, exclusivo: bool = False):
+        self.__ruta = ruta
+        self.__exclusivo = exclusivo
+
+    def adquirir(self) -> None:
+        """Espera hasta obtener el bloqueo"""
+        self.__adquirir(esperar=True)
+
+    def intentar_adquirir(self) -> bool:
+        """Intenta obtener el bloqueo sin esperar; devuelve False si lo tiene otro proceso o hilo"""
+        return self.__adquirir(esperar=False)
+
+    def __adquirir(self, esperar: bool) -> bool:
+        """Obtiene el bloqueo; sin esperar devuelve False si está ocupado"""
+        bloqueos = _bloqueos_hilo()
+        bloqueo = bloqueos.get(self.__ruta)
+        if bloqueo is not None:
+            if self.__exclusivo and not bloqueo[0]:
+                if not esperar:
+                    return False
+                # Ampliar el bloqueo podría bloquear a dos lectores esperándose el uno al otro
+                raise ExcepcionesGestor(self.__ERROR_MESSAGE_AMPLIAR)
+            bloqueo[1] += 1
+            return True
+        descriptor = None
+        if fcntl is not None:
+            try:
+                descriptor = os.open(self.__ruta, os.O_RDWR | os.O_CREAT, 0o666)
+            except FileNotFoundError as exception:
+                raise ExcepcionesGestor(self.__ERROR_MESSAGE_FILE_NOT_FOUND) from exception
+            operacion = fcntl.LOCK_EX if self.__exclusivo else fcntl.LOCK_SH
+            try:
+                fcntl.flock(descriptor, operacion if esperar else operacion | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(descriptor)
+                if esperar:
+                    raise
+                return False
+            except OSError:
+                os.close(descriptor)
+                raise
+        bloqueos[self.__ruta] = [self.__exclusivo, 1, descriptor]
+        return True
+
+    def liberar(self) -> None:
+        """Libera el bloqueo cuando se ha liberado tantas veces como se adquirió"""
+        bloqueos = _bloqueos_hilo()
+        bloqueo = bloqueos.get(self.__ruta)
+        if bloqueo is None:
+            return
+        bloqueo[1] -= 1
+        if bloqueo[1] > 0:
+            return
+        del bloqueos[self.__ruta]
+        if bloqueo[2] is not None:
+            fcntl.flock(bloqueo[2], fcntl.LOCK_UN)
+            os.close(bloqueo[2])
+
+    def __enter__(self):
+        self.adquirir()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.liberar()
+        return False
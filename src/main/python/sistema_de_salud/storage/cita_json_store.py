@@ -1,25 +1,241 @@
 """Module cita_json_store"""
+import os
+import json
 from datetime import datetime
 from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.motor_store import MotorStore
+from sistema_de_salud.storage.particion_store import StoreParticionadoMes
+from sistema_de_salud.storage.transaccion_store import transaccion_activa
+from sistema_de_salud.storage.transaccion_store import escribir_fichero_atomico
 from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.horario_medico import HorarioMedico
 from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
+from sistema_de_salud.cfg.gestor_centro_salud_config import CITAS_PARTICIONADAS_POR_MES
+
+# Con CITAS_PARTICIONADAS_POR_MES las citas se guardan en un store por mes
+_StoreCitas = StoreParticionadoMes if CITAS_PARTICIONADAS_POR_MES else MotorStore
 
 
 class CitaJsonStore(JsonStore):
     """Clase hija de JsonStore con los atributos para store_citas"""
 
-    class __CitaJsonStore(JsonStore):
+    class __CitaJsonStore(_StoreCitas):
         """Clase privada, patron singleton"""
         _FILE_PATH = JSON_FILES_PATH + "store_citas.json"
         _ID_FIELD = "_CitaMedica__identificador_cita"
         __MEDICO_FIELD = "_CitaMedica__id_medico"
         __FECHA_FIELD = "_CitaMedica__fecha_hora"
         __ESTADO_FIELD = "_CitaMedica__estado_cita"
+        _INDEX_FIELDS = (__MEDICO_FIELD, __FECHA_FIELD, __ESTADO_FIELD)
+        _PARTITION_FIELD = __FECHA_FIELD
 
         __ERROR_MESSAGE_INVALID_OBJECT = "Objeto CitaMedica invalido"
         __ERROR_MESSAGE_ID_REGISTRADO = "Cita ya registrada"
         __ERROR_MESSAGE_ID_NO_ENCONTRADO = "Cita no registrada"
 
+        # Índice secundario persistente de citas activas: id_medico -> fecha -> identificador_cita -> fecha_hora
+        __INDICE_FILE_PATH = JSON_FILES_PATH + "store_citas_indice_medico_dia.json"
+        __FORMATO_FECHA_HORA = "%Y-%m-%d %H:%M:%S"
+
+        def __init__(self):
+            super().__init__()
+            # Índice confirmado: {indice, inverso, ocupados, version}
+            # - indice: id_medico -> fecha -> identificador_cita -> fecha_hora
+            # - inverso: identificador_cita -> (id_medico, fecha), para poder quitar una cita del índice
+            # - ocupados: (id_medico, fecha) -> bitmap de huecos ocupados (bit n = hueco n del horario del médico)
+            # - version: version_store() del store cuando se construyó el índice
+            # Las escrituras modifican una copia, que sustituye a esta al guardarla (o al confirmar la transacción)
+            self.__estado_indice = None
+
+        def __version_indice(self):
+            """Versión del store en un formato comparable con la guardada en el fichero del índice"""
+            # Ida y vuelta por Json para que las tuplas (también anidadas) se comparen como listas
+            return json.loads(json.dumps(self.version_store()))
+
+        def __indexar(self, estado: dict, item: dict) -> None:
+            """Añade una cita al índice si está activa"""
+            if item[self.__ESTADO_FIELD] != "Activa":
+                return
+            id_medico = item[self.__MEDICO_FIELD]
+            fecha = item[self.__FECHA_FIELD][:10]     # YYYY-MM-DD
+            estado["indice"].setdefault(id_medico, {}).setdefault(fecha, {})[item[self._ID_FIELD]] = \
+                item[self.__FECHA_FIELD]
+            estado["inverso"][item[self._ID_FIELD]] = (id_medico, fecha)
+            if (id_medico, fecha) in estado["ocupados"]:
+                # Marcamos el hueco en el bitmap del día sin recalcularlo
+                hueco = self.__hueco(id_medico, item[self.__FECHA_FIELD])
+                if hueco is not None:
+                    estado["ocupados"][(id_medico, fecha)] |= 1 << hueco
+
+        def __desindexar(self, estado: dict, identificador_cita: str) -> None:
+            """Quita una cita del índice"""
+            posicion = estado["inverso"].pop(identificador_cita, None)
+            if posicion is None:
+                return
+            id_medico, fecha = posicion
+            citas_dia = estado["indice"][id_medico][fecha]
+            fecha_hora = citas_dia.pop(identificador_cita, None)
+            if (id_medico, fecha) in estado["ocupados"]:
+                # Liberamos el hueco salvo que otra cita activa del día lo siga ocupando
+                hueco = self.__hueco(id_medico, fecha_hora)
+                if hueco is not None and fecha_hora not in citas_dia.values():
+                    estado["ocupados"][(id_medico, fecha)] &= ~(1 << hueco)
+            if not citas_dia:
+                del estado["indice"][id_medico][fecha]
+            if not estado["indice"][id_medico]:
+                del estado["indice"][id_medico]
+
+        def __guardar_indice(self, estado: dict) -> None:
+            """Guarda el índice; dentro de una transacción solo lo ve ella hasta confirmarla"""
+            transaccion = transaccion_activa()
+            if transaccion is not None:
+                # La versión del store solo se conoce cuando se confirme la transacción
+                transaccion.guardar_pendiente(self.__INDICE_FILE_PATH, estado, self.__publicar_indice)
+                return
+            self.__publicar_indice(estado)
+
+        def __publicar_indice(self, estado: dict) -> None:
+            """Escribe el índice con la versión del store a la que corresponde y lo hace visible a todos"""
+            estado["version"] = self.__version_indice()
+            escribir_fichero_atomico(self.__INDICE_FILE_PATH,
+                                     json.dumps({"version": estado["version"], "indice": estado["indice"]},
+                                                separators=(",", ":")))
+            self.__estado_indice = estado
+
+        def __invalidar_indice(self) -> None:
+            """Descarta el índice en memoria (se recargará del fichero o del store)"""
+            self.__estado_indice = None
+
+        def __indice_lectura(self) -> dict:
+            """Índice que ve el hilo actual: el de su transacción o el confirmado"""
+            transaccion = transaccion_activa()
+            if transaccion is not None and transaccion.pendiente(self.__INDICE_FILE_PATH) is not None:
+                return transaccion.pendiente(self.__INDICE_FILE_PATH)
+            return self.__cargar_indice()
+
+        def __indice_escritura(self) -> dict:
+            """Copia del índice para modificarla y guardarla con __guardar_indice
+            (dentro de una transacción es siempre la misma)"""
+            estado = self.__indice_lectura()
+            transaccion = transaccion_activa()
+            if transaccion is not None and transaccion.pendiente(self.__INDICE_FILE_PATH) is estado:
+                return estado
+            return {"indice": {id_medico: {fecha: dict(citas_dia) for fecha, citas_dia in fechas.items()}
+                               for id_medico, fechas in estado["indice"].items()},
+                    "inverso": dict(estado["inverso"]), "ocupados": dict(estado["ocupados"]),
+                    "version": estado["version"]}
+
+        def __cargar_indice(self) -> dict:
+            """Devuelve el índice confirmado, reconstruyéndolo si el store ha cambiado por otra vía"""
+            estado = self.__estado_indice
+            version = self.__version_indice()
+            if estado is not None and version == estado["version"]:
+                return estado
+            try:
+                with open(self.__INDICE_FILE_PATH, "r", encoding="utf-8", newline="") as file:
+                    contenido = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                contenido = None
+            if contenido is not None and contenido["version"] == version:
+                estado = {"indice": contenido["indice"], "inverso": {}, "ocupados": {}, "version": version}
+                for id_medico, fechas in estado["indice"].items():
+                    for fecha, citas_dia in fechas.items():
+                        for identificador_cita in citas_dia:
+                            estado["inverso"][identificador_cita] = (id_medico, fecha)
+                self.__estado_indice = estado
+                return estado
+            # Índice inexistente u obsoleto: lo reconstruimos recorriendo el store una vez
+            estado = {"indice": {}, "inverso": {}, "ocupados": {}, "version": None}
+            for item in self.load_store():
+                self.__indexar(estado, item)
+            self.__guardar_indice(estado)
+            return estado
+
+        def add_item(self, item: object) -> None:
+            """Añade una cita al store y al índice (medico, día)"""
+            # Con el bloqueo exclusivo ningún otro proceso modifica el store entre cargar y guardar el índice
+            with self._bloqueo_store(exclusivo=True):
+                estado = self.__indice_escritura()
+                super().add_item(item)
+                self.__indexar(estado, self._item_dict(item))
+                self.__guardar_indice(estado)
+
+        def add_items(self, items) -> None:
+            """Añade varias citas al store con una sola escritura y las añade al índice (medico, día)"""
+            with self._bloqueo_store(exclusivo=True):
+                estado = self.__indice_escritura()
+                super().add_items(items)
+                for item in items:
+                    self.__indexar(estado, self._item_dict(item))
+                self.__guardar_indice(estado)
+
+        def update_item(self, new_item, key_value):
+            """Actualiza una cita en el store y en el índice (medico, día)"""
+            with self._bloqueo_store(exclusivo=True):
+                estado = self.__indice_escritura()
+                super().update_item(new_item, key_value)
+                self.__desindexar(estado, key_value)
+                self.__indexar(estado, self._item_dict(new_item))
+                self.__guardar_indice(estado)
+
+        def update_items(self, items) -> None:
+            """Actualiza varias citas en el store con una sola escritura y en el índice (medico, día)"""
+            with self._bloqueo_store(exclusivo=True):
+                estado = self.__indice_escritura()
+                super().update_items(items)
+                for item in items:
+                    item_dict = self._item_dict(item)
+                    self.__desindexar(estado, item_dict[self._ID_FIELD])
+                    self.__indexar(estado, item_dict)
+                self.__guardar_indice(estado)
+
+        def delete_item(self, key_value) -> None:
+            """Borra una cita del store y del índice (medico, día)"""
+            with self._bloqueo_store(exclusivo=True):
+                estado = self.__indice_escritura()
+                super().delete_item(key_value)
+                self.__desindexar(estado, key_value)
+                self.__guardar_indice(estado)
+
+        def borrar_store(self) -> None:
+            """Elimina el store de citas y su índice"""
+            super().borrar_store()
+            if os.path.isfile(self.__INDICE_FILE_PATH):
+                os.remove(self.__INDICE_FILE_PATH)
+            self.__invalidar_indice()
+
+        def __citas_activas_medico_dia(self, id_medico: str, fecha: str) -> dict:
+            """Devuelve {identificador_cita: fecha_hora} de las citas activas de un médico en un día"""
+            return self.__indice_lectura()["indice"].get(id_medico, {}).get(fecha, {})
+
+        def __hueco(self, id_medico: str, fecha_hora_str: str):
+            """Número de hueco del horario del médico que ocupa una cita (None si no coincide con ninguno)"""
+            return HorarioMedico.de_medico(id_medico).hueco(datetime.strptime(fecha_hora_str,
+                                                                              self.__FORMATO_FECHA_HORA))
+
+        def huecos_ocupados_medico_dia(self, id_medico: str, fecha: str) -> int:
+            """Bitmap de los huecos ocupados de un médico en un día (YYYY-MM-DD): el bit n es el hueco n.
+            Se construye con el índice (médico, día) la primera vez y después se actualiza con cada cita"""
+            return self.__bitmap_ocupados(self.__indice_lectura(), id_medico, fecha)
+
+        def consulta_huecos_ocupados(self):
+            """Función (id_medico, fecha) -> bitmap de huecos ocupados sobre el índice actual, cuya vigencia se
+            comprueba una sola vez: para recorrer muchos días sin volver a mirar si el store ha cambiado"""
+            estado = self.__indice_lectura()
+            return lambda id_medico, fecha: self.__bitmap_ocupados(estado, id_medico, fecha)
+
+        def __bitmap_ocupados(self, estado: dict, id_medico: str, fecha: str) -> int:
+            """Bitmap de huecos ocupados de un médico en un día según un índice"""
+            ocupados = estado["ocupados"].get((id_medico, fecha))
+            if ocupados is None:
+                ocupados = 0
+                for fecha_hora in estado["indice"].get(id_medico, {}).get(fecha, {}).values():
+                    hueco = self.__hueco(id_medico, fecha_hora)
+                    if hueco is not None:
+                        ocupados |= 1 << hueco
+                estado["ocupados"][(id_medico, fecha)] = ocupados
+            return ocupados
+
         def guardar_cita_store(self, cita: object, id_paciente) -> True:
             """Guarda un cita en un fichero Json"""
             # Importamos aquí CitaMedica para evitar import circular
@@ -40,6 +256,18 @@ class CitaJsonStore(JsonStore):
                 raise ExcepcionesGestor(self.__ERROR_MESSAGE_ID_REGISTRADO)
             return True
 
+        def guardar_citas_store(self, citas_pacientes: list) -> True:
+            """Guarda varias citas [(cita, id_paciente)] en store_citas con una sola escritura"""
+            from sistema_de_salud.cita_medica import CitaMedica
+            for cita, id_paciente in citas_pacientes:
+                if not isinstance(cita, CitaMedica):
+                    raise ExcepcionesGestor(self.__ERROR_MESSAGE_INVALID_OBJECT)
+                if self.find_item(cita.identificador_cita) is not None:
+                    raise ExcepcionesGestor(self.__ERROR_MESSAGE_ID_REGISTRADO)
+                cita.encriptar_cita(id_paciente)
+            self.add_items([cita for cita, _ in citas_pacientes])
+            return True
+
         def buscar_cita_store(self, identificador_cita: str):
             """Busca una cita en store_citas"""
             item_found = self.find_item(identificador_cita)
@@ -61,37 +289,19 @@ class CitaJsonStore(JsonStore):
 
         def buscar_citas_activas_medico_fecha_store(self, id_medico: str, fecha_hora_str: str) -> list:
             """Busca todas las citas de un médico para una fecha en store_citas"""
-            items_found = self.find_items_list(id_medico, self.__MEDICO_FIELD)
-            if not items_found:
-                # si la lista está vacía
-                return items_found
-            lista_citas = []
-            for item in items_found:
-                if item[self.__ESTADO_FIELD] == "Activa":
-                    # Convertimos la fecha y hora a objeto datetime
-                    fecha_hora_item = datetime.strptime(item[self.__FECHA_FIELD], "%Y-%m-%d %H:%M:%S")
-                    fecha_item = (fecha_hora_item.year, fecha_hora_item.month, fecha_hora_item.day)
-                    fecha_hora_solicitada = datetime.strptime(fecha_hora_str, "%Y-%m-%d %H:%M:%S")
-                    fecha_solicitada = (fecha_hora_solicitada.year, fecha_hora_solicitada.month, fecha_hora_solicitada.day)
-                    if fecha_item == fecha_solicitada:
-                        lista_citas.append(item)
-            return lista_citas
+            # Convertimos la fecha solicitada una sola vez y consultamos el índice (medico, día)
+            fecha_solicitada = datetime.strptime(fecha_hora_str, self.__FORMATO_FECHA_HORA).strftime("%Y-%m-%d")
+            citas_dia = self.__citas_activas_medico_dia(id_medico, fecha_solicitada)
+            return [self.find_item(identificador_cita) for identificador_cita in citas_dia]
 
         def buscar_citas_activas_medico_fecha_hora_store(self, id_medico: str, fecha_hora_str: str) -> list:
             """Busca todas las citas de un médico para una fecha_hora en store_citas"""
-            items_found = self.find_items_list(id_medico, self.__MEDICO_FIELD)
-            if not items_found:
-                # si la lista está vacía
-                return items_found
-            lista_citas = []
-            for item in items_found:
-                if item[self.__ESTADO_FIELD] == "Activa":
-                    # Convertimos la fecha y hora a objeto datetime
-                    fecha_hora_item = datetime.strptime(item[self.__FECHA_FIELD], "%Y-%m-%d %H:%M:%S")
-                    fecha_hora_solicitada = datetime.strptime(fecha_hora_str, "%Y-%m-%d %H:%M:%S")
-                    if fecha_hora_item == fecha_hora_solicitada:
-                        lista_citas.append(item)
-            return lista_citas
+            fecha_hora_solicitada = datetime.strptime(fecha_hora_str, self.__FORMATO_FECHA_HORA)
+            # Normalizamos la fecha_hora para compararla con las guardadas en el índice
+            fecha_hora_str = fecha_hora_solicitada.strftime(self.__FORMATO_FECHA_HORA)
+            citas_dia = self.__citas_activas_medico_dia(id_medico, fecha_hora_str[:10])
+            return [self.find_item(identificador_cita) for identificador_cita, fecha_hora_item in citas_dia.items()
+                    if fecha_hora_item == fecha_hora_str]
 
     __instance = None
 
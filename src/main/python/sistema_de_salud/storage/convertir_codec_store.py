@@ -0,0 +1,27 @@
+"""Module convertir_codec_store"""
+import os
+import sys
+from sistema_de_salud.storage.json_store import convertir_fichero_store
+from sistema_de_salud.storage.paciente_json_store import PacienteJsonStore
+from sistema_de_salud.storage.medico_json_store import MedicoJsonStore
+from sistema_de_salud.storage.autenticacion_json_store import AutenticacionJsonStore
+from sistema_de_salud.storage.cita_json_store import CitaJsonStore
+
+
+def convertir_stores(nombre_codec: str) -> dict:
+    """Convierte los ficheros de todos los stores al codec indicado y devuelve su tamaño antes y después"""
+    resultado = {}
+    for store in (PacienteJsonStore(), MedicoJsonStore(), AutenticacionJsonStore(), CitaJsonStore()):
+        ruta = store._FILE_PATH
+        if not os.path.isfile(ruta):
+            continue
+        tamano_inicial = os.path.getsize(ruta)
+        convertir_fichero_store(ruta, nombre_codec)
+        resultado[os.path.basename(ruta)] = (tamano_inicial, os.path.getsize(ruta))
+    return resultado
+
+
+if __name__ == "__main__":
+    # Uso: python -m sistema_de_salud.storage.convertir_codec_store <json|json_compacto|msgpack|binario>
+    for fichero, (antes, despues) in convertir_stores(sys.argv[1]).items():
+        print(fichero + ": " + str(antes) + " -> " + str(despues) + " bytes")
@@ -0,0 +1,21 @@
+"""Module crear_snapshot_stores"""
+import os
+from sistema_de_salud.storage.paciente_json_store import PacienteJsonStore
+from sistema_de_salud.storage.medico_json_store import MedicoJsonStore
+from sistema_de_salud.storage.autenticacion_json_store import AutenticacionJsonStore
+from sistema_de_salud.storage.cita_json_store import CitaJsonStore
+
+
+def crear_snapshots() -> list:
+    """Escribe el snapshot binario de todos los stores y devuelve los nombres de los stores"""
+    stores = []
+    for store in (PacienteJsonStore(), MedicoJsonStore(), AutenticacionJsonStore(), CitaJsonStore()):
+        store.guardar_snapshot()
+        stores.append(os.path.basename(store._FILE_PATH))
+    return stores
+
+
+if __name__ == "__main__":
+    # Uso: python -m sistema_de_salud.storage.crear_snapshot_stores
+    for nombre_store in crear_snapshots():
+        print("Snapshot creado: " + nombre_store)
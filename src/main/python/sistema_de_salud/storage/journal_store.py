@@ -0,0 +1,312 @@
+"""Module journal_store"""
+import os
+import copy
+import json
+import struct
+import threading
+from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.json_store import copiar_item
+from sistema_de_salud.storage.json_store import detectar_codec
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.storage.transaccion_store import transaccion_activa
+from sistema_de_salud.storage.transaccion_store import escribir_fichero_atomico
+from sistema_de_salud.cfg.gestor_centro_salud_config import JOURNAL_COMPACTION_THRESHOLD
+
+
+class JournalStore(JsonStore):
+    """Store que guarda las operaciones en un log JSONL append-only en lugar de reescribir el fichero"""
+    # Tipos de registro del log
+    OP_INSERT = "insert"
+    OP_UPDATE = "update"
+    OP_DELETE = "delete"
+
+    __ERROR_MESSAGE_FILE_NOT_FOUND = "Nombre del fichero o ruta de archivo incorrectos"
+    __ERROR_MESSAGE_JSON_DECODE = "JSON Decode Error - Wrong JSON Format"
+
+    def __init__(self):
+        super().__init__()
+        # Estado reconstruido a partir del log: id -> item, en orden de inserción
+        self.__estado = {}
+        # Bytes del log ya aplicados y número de registros que contienen
+        self.__offset = 0
+        self.__num_registros = 0
+        # Inodo del log, para detectar que otro proceso lo ha compactado
+        self.__inodo = None
+        self.__lock = threading.RLock()
+        self.__compactando = False
+        self.__crear_log_desde_fichero_store()
+
+    @property
+    def journal_path(self) -> str:
+        """Ruta del log JSONL asociado al store"""
+        return os.path.splitext(self._FILE_PATH)[0] + ".jsonl"
+
+    @property
+    def registros_muertos(self) -> int:
+        """Registros del log que ya no aportan nada al estado (sobrescritos o borrados)"""
+        return self.__num_registros - len(self.__estado)
+
+    def __crear_log_desde_fichero_store(self) -> None:
+        """Si el store no tiene log pero sí fichero store (de cuando se usaba otro motor), crea el log con su
+        contenido: así se puede cambiar STORE_ENGINE a "journal" sin perder los datos ya guardados"""
+        if os.path.isfile(self.journal_path) or not os.path.isfile(self._FILE_PATH):
+            return
+        with self._bloqueo_store(exclusivo=True):
+            # Otro proceso puede haberlo creado mientras esperábamos el bloqueo
+            if os.path.isfile(self.journal_path) or not os.path.isfile(self._FILE_PATH):
+                return
+            try:
+                with open(self._FILE_PATH, "rb") as file:
+                    contenido = file.read()
+                data_list = detectar_codec(contenido).deserializar(contenido)
+            except (ValueError, IndexError, struct.error) as exception:
+                raise ExcepcionesGestor(self.__ERROR_MESSAGE_JSON_DECODE) from exception
+            # Se escribe fuera de cualquier transacción: son datos ya confirmados con el otro motor
+            escribir_fichero_atomico(self.journal_path, self.__contenido_log(data_list))
+
+    def __contenido_log(self, data_list: list) -> str:
+        """Log con un registro insert por cada item de data_list"""
+        return "".join(json.dumps({"op": self.OP_INSERT, "item": item}, separators=(",", ":")) + "\n"
+                       for item in data_list)
+
+    def version_store(self):
+        """Devuelve (inodo, tamaño) del log, que cambia con cada registro o compactación"""
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def __reiniciar_estado(self) -> None:
+        """Vacía el estado en memoria"""
+        self.__estado = {}
+        self.__offset = 0
+        self.__num_registros = 0
+        self.__inodo = None
+
+    def __aplicar_registro(self, registro: dict, estado: dict) -> None:
+        """Aplica un registro del log a un estado (id -> item)"""
+        operacion = registro["op"]
+        if operacion == self.OP_INSERT:
+            item = registro["item"]
+            estado.setdefault(item[self._ID_FIELD], item)
+        elif operacion == self.OP_UPDATE:
+            # Igual que JsonStore.update_item: el item actualizado pasa al final
+            estado.pop(registro["id"], None)
+            item = registro["item"]
+            estado[item[self._ID_FIELD]] = item
+        elif operacion == self.OP_DELETE:
+            estado.pop(registro["id"], None)
+
+    def __pendiente_transaccion(self):
+        """Cambios de la transacción activa aún no confirmados, o None:
+        {estado: estado con sus registros aplicados, lineas: registros a añadir al log, reescrito: si sustituye el log}.
+        Solo los ve esa transacción: los demás hilos siguen leyendo el estado compartido"""
+        transaccion = transaccion_activa()
+        if transaccion is None:
+            return None
+        return transaccion.pendiente(self.journal_path)
+
+    def __estado_lectura(self) -> dict:
+        """Estado que ve el hilo actual (con el lock tomado): el de su transacción o el del log"""
+        pendiente = self.__pendiente_transaccion()
+        if pendiente is not None:
+            return pendiente["estado"]
+        self.__sincronizar()
+        return self.__estado
+
+    def __sincronizar(self) -> None:
+        """Aplica al estado en memoria los registros añadidos al log desde la última lectura"""
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            self.__reiniciar_estado()
+            return
+        if stat.st_ino != self.__inodo or stat.st_size < self.__offset:
+            # Log nuevo o compactado: reconstruimos el estado desde el principio
+            self.__reiniciar_estado()
+            self.__inodo = stat.st_ino
+        if stat.st_size == self.__offset:
+            return
+        try:
+            with open(self.journal_path, "rb") as file:
+                file.seek(self.__offset)
+                for linea in file:
+                    if not linea.endswith(b"\n"):
+                        # Registro a medio escribir por otro proceso, se leerá la próxima vez
+                        break
+                    self.__aplicar_registro(json.loads(linea), self.__estado)
+                    self.__num_registros += 1
+                    self.__offset += len(linea)
+        except json.JSONDecodeError as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_JSON_DECODE) from exception
+
+    def __escribir_registro(self, registro: dict) -> None:
+        """Añade un registro al final del log y actualiza el estado"""
+        linea = (json.dumps(registro, separators=(",", ":")) + "\n").encode("utf-8")
+        transaccion = transaccion_activa()
+        if transaccion is not None:
+            # El registro se añade al log al confirmar la transacción; hasta entonces solo se aplica
+            # a una copia del estado propia de la transacción
+            pendiente = self.__pendiente_transaccion()
+            if pendiente is None:
+                self.__sincronizar()
+                pendiente = {"estado": dict(self.__estado), "lineas": [], "reescrito": False}
+            pendiente["lineas"].append(linea)
+            self.__aplicar_registro(registro, pendiente["estado"])
+            transaccion.guardar_pendiente(self.journal_path, pendiente, self.__confirmar_pendientes)
+            return
+        try:
+            with open(self.journal_path, "ab") as file:
+                file.write(linea)
+        except FileNotFoundError as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_FILE_NOT_FOUND) from exception
+        # Releemos desde el último offset por si otro proceso ha escrito antes que nosotros
+        self.__sincronizar()
+        self.__comprobar_compactacion()
+
+    def __confirmar_pendientes(self, pendiente: dict) -> None:
+        """Añade al log, en una sola escritura, los registros de la transacción confirmada
+        (el log reescrito por la transacción ya se ha sustituido) y publica su estado"""
+        with self._bloqueo_store(exclusivo=True), self.__lock:
+            lineas = b"".join(pendiente["lineas"])
+            try:
+                stat = os.stat(self.journal_path)
+                al_dia = (not pendiente["reescrito"] and stat.st_ino == self.__inodo and
+                          stat.st_size == self.__offset)
+            except FileNotFoundError:
+                al_dia = False
+            if lineas:
+                with open(self.journal_path, "ab") as file:
+                    file.write(lineas)
+            if al_dia:
+                # Nadie más ha escrito: el estado de la transacción es el del log
+                self.__estado = pendiente["estado"]
+                self.__offset += len(lineas)
+                self.__num_registros += len(pendiente["lineas"])
+            else:
+                self.__reiniciar_estado()
+                self.__sincronizar()
+            self.__comprobar_compactacion()
+
+    def __comprobar_compactacion(self) -> None:
+        """Lanza la compactación en segundo plano si hay demasiados registros muertos"""
+        muertos = self.registros_muertos
+        if self.__compactando or muertos < JOURNAL_COMPACTION_THRESHOLD or muertos <= len(self.__estado):
+            return
+        self.__compactando = True
+        hilo = threading.Thread(target=self.compactar, name="compactacion-" + os.path.basename(self.journal_path),
+                                daemon=True)
+        hilo.start()
+
+    def compactar(self) -> None:
+        """Reescribe el log dejando un único registro insert por item vivo"""
+        # Sin el bloqueo exclusivo, un registro añadido por otro proceso al log antiguo se perdería
+        with self._bloqueo_store(exclusivo=True), self.__lock:
+            try:
+                # Dentro de una transacción se compacta su estado, con sus registros pendientes
+                self.__reescribir(list(self.__estado_lectura().values()))
+            finally:
+                self.__compactando = False
+
+    def __reescribir(self, data_list: list) -> None:
+        """Sustituye atómicamente el log por uno con un insert por cada item de data_list"""
+        contenido = self.__contenido_log(data_list)
+        transaccion = transaccion_activa()
+        if transaccion is not None:
+            # El log se sustituye al confirmar; los registros posteriores se añadirán después
+            transaccion.registrar_fichero(self.journal_path, contenido)
+            estado = {}
+            for item in data_list:
+                estado.setdefault(item[self._ID_FIELD], item)
+            transaccion.guardar_pendiente(self.journal_path, {"estado": estado, "lineas": [], "reescrito": True},
+                                          self.__confirmar_pendientes)
+            return
+        try:
+            escribir_fichero_atomico(self.journal_path, contenido)
+        except FileNotFoundError as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_FILE_NOT_FOUND) from exception
+        self.__reiniciar_estado()
+        self.__sincronizar()
+
+    def save_store(self, data_list: list) -> None:
+        """Guarda una lista completa en el log (equivale a compactarlo con ese contenido)"""
+        with self._bloqueo_store(exclusivo=True), self.__lock:
+            self.__reescribir(data_list)
+
+    def load_store(self) -> list:
+        """Reconstruye el contenido del store a partir del log"""
+        with self.__lock:
+            # Copias: si el llamante modifica los items no debe cambiar el estado en memoria
+            return [copiar_item(item) for item in self.__estado_lectura().values()]
+
+    def iter_items(self, predicate=None):
+        """Devuelve uno a uno los items del store (los que cumplan predicate, si se indica)"""
+        with self.__lock:
+            items = list(self.__estado_lectura().values())
+        for item in items:
+            if predicate is None or predicate(item):
+                yield copiar_item(item)
+
+    def find_item(self, key_value: str, key=None):
+        """Busca el primer item con item[key]=key_value en el log"""
+        with self.__lock:
+            estado = self.__estado_lectura()
+            if key is None or key == self._ID_FIELD:
+                return copiar_item(estado.get(key_value))
+            for item in estado.values():
+                if item[key] == key_value:
+                    return copiar_item(item)
+        return None
+
+    def find_items_list(self, key_value, key=None, stream=False):
+        """Busca todos los items con item[key]=key_value en el log
+        (con stream=True devuelve un generador en lugar de una lista)"""
+        if key is None:
+            key = self._ID_FIELD
+        items = self.iter_items(lambda item: item[key] == key_value)
+        if stream:
+            return items
+        return list(items)
+
+    def add_item(self, item: object) -> None:
+        """Añade un registro insert al log"""
+        with self._bloqueo_store(exclusivo=True), self.__lock:
+            self.__sincronizar()
+            self.__escribir_registro({"op": self.OP_INSERT, "item": copy.deepcopy(self._item_dict(item))})
+
+    def add_items(self, items) -> None:
+        """Añade un registro insert al log por cada item (en una sola escritura dentro de una TransaccionStore)"""
+        with self._bloqueo_store(exclusivo=True), self.__lock:
+            self.__sincronizar()
+            for item in items:
+                self.__escribir_registro({"op": self.OP_INSERT, "item": copy.deepcopy(self._item_dict(item))})
+
+    def update_item(self, new_item, key_value):
+        """Añade un registro update al log"""
+        with self._bloqueo_store(exclusivo=True), self.__lock:
+            self.__sincronizar()
+            self.__escribir_registro({"op": self.OP_UPDATE, "id": key_value,
+                                      "item": copy.deepcopy(self._item_dict(new_item))})
+
+    def update_items(self, items) -> None:
+        """Añade un registro update al log por cada item (en una sola escritura dentro de una TransaccionStore)"""
+        with self._bloqueo_store(exclusivo=True), self.__lock:
+            self.__sincronizar()
+            for item in items:
+                item_dict = copy.deepcopy(self._item_dict(item))
+                self.__escribir_registro({"op": self.OP_UPDATE, "id": item_dict[self._ID_FIELD], "item": item_dict})
+
+    def delete_item(self, key_value) -> None:
+        """Añade un registro tombstone (delete) al log"""
+        with self._bloqueo_store(exclusivo=True), self.__lock:
+            self.__sincronizar()
+            self.__escribir_registro({"op": self.OP_DELETE, "id": key_value})
+
+    def borrar_store(self) -> None:
+        """Elimina el log del store"""
+        with self.__lock:
+            if os.path.isfile(self.journal_path):
+                os.remove(self.journal_path)
+            self.__reiniciar_estado()
+        super().borrar_store()
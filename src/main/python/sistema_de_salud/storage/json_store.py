@@ -1,6 +1,331 @@
 """Module json_store"""
+import io
+import os
+import copy
 import json
+import struct
+import threading
 from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.storage.transaccion_store import TransaccionStore
+from sistema_de_salud.storage.transaccion_store import transaccion_activa
+from sistema_de_salud.storage.transaccion_store import escribir_fichero_atomico
+from sistema_de_salud.storage.snapshot_store import LectorSnapshot
+from sistema_de_salud.storage.bloqueo_store import BloqueoStore
+from sistema_de_salud.storage.snapshot_store import escribir_snapshot
+from sistema_de_salud.cfg.gestor_centro_salud_config import STORE_CODEC
+
+try:
+    import msgpack
+except ImportError:
+    # msgpack es opcional, solo hace falta para el codec "msgpack"
+    msgpack = None
+
+
+class CodecJson:
+    """Codec Json indentado (formato original de los stores)"""
+    NOMBRE = "json"
+
+    def serializar(self, data_list: list) -> bytes:
+        """Convierte una lista en el contenido del fichero"""
+        return json.dumps(data_list, indent=2).encode("utf-8")
+
+    def deserializar(self, contenido: bytes) -> list:
+        """Convierte el contenido del fichero en una lista"""
+        return json.loads(contenido)
+
+    def iterar(self, file, tamano_bloque: int = 65536):
+        """Devuelve uno a uno los items de un array Json leyendo el fichero por bloques"""
+        decoder = json.JSONDecoder()
+        texto = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        bloque = texto.read(tamano_bloque)
+        buffer = bloque.lstrip()
+        # Los espacios iniciales pueden ocupar más de un bloque
+        while bloque and not buffer:
+            bloque = texto.read(tamano_bloque)
+            buffer = bloque.lstrip()
+        if not buffer.startswith("["):
+            raise json.JSONDecodeError("Se esperaba un array Json", buffer, 0)
+        posicion = 1
+        while True:
+            # Saltamos separadores entre items
+            while posicion < len(buffer) and buffer[posicion] in " \t\r\n,":
+                posicion += 1
+            if posicion < len(buffer) and buffer[posicion] == "]":
+                return
+            try:
+                if posicion == len(buffer):
+                    raise json.JSONDecodeError("Fin del bloque", buffer, posicion)
+                item, posicion = decoder.raw_decode(buffer, posicion)
+            except json.JSONDecodeError:
+                # Item incompleto: leemos otro bloque y lo volvemos a intentar
+                bloque = texto.read(tamano_bloque)
+                if not bloque:
+                    raise
+                buffer = buffer[posicion:] + bloque
+                posicion = 0
+                continue
+            yield item
+            if posicion > tamano_bloque:
+                # Descartamos lo ya leído para que la memoria no crezca con el fichero
+                buffer = buffer[posicion:]
+                posicion = 0
+
+
+class CodecJsonLineas(CodecJson):
+    """Codec Json con un item por línea: sigue siendo un array Json válido y se puede leer en streaming"""
+    NOMBRE = "json_lineas"
+
+    def serializar(self, data_list: list) -> bytes:
+        """Convierte una lista en el contenido del fichero"""
+        lineas = ",\n".join(json.dumps(item, separators=(",", ":")) for item in data_list)
+        return ("[\n" + lineas + "\n]\n").encode("utf-8")
+
+
+class CodecJsonCompacto(CodecJson):
+    """Codec Json sin espacios ni indentación"""
+    NOMBRE = "json_compacto"
+
+    def serializar(self, data_list: list) -> bytes:
+        """Convierte una lista en el contenido del fichero"""
+        return json.dumps(data_list, separators=(",", ":")).encode("utf-8")
+
+
+class CodecMsgpack:
+    """Codec MessagePack (requiere el paquete msgpack)"""
+    NOMBRE = "msgpack"
+
+    __ERROR_MESSAGE_NO_INSTALADO = "El codec msgpack requiere instalar el paquete msgpack"
+
+    def __comprobar_instalado(self) -> None:
+        """Lanza una excepción si msgpack no está instalado"""
+        if msgpack is None:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_NO_INSTALADO)
+
+    def serializar(self, data_list: list) -> bytes:
+        """Convierte una lista en el contenido del fichero"""
+        self.__comprobar_instalado()
+        return msgpack.packb(data_list, use_bin_type=True)
+
+    def deserializar(self, contenido: bytes) -> list:
+        """Convierte el contenido del fichero en una lista"""
+        self.__comprobar_instalado()
+        return msgpack.unpackb(contenido, raw=False)
+
+    def iterar(self, file):
+        """Devuelve uno a uno los items del array msgpack sin cargarlo entero"""
+        self.__comprobar_instalado()
+        unpacker = msgpack.Unpacker(file, raw=False)
+        for _ in range(unpacker.read_array_header()):
+            yield unpacker.unpack()
+
+
+class CodecBinario:
+    """Codec binario propio: guarda las claves de los diccionarios una sola vez y los textos
+    hexadecimales (textos cifrados, salts, hashes) como bytes en lugar de como texto"""
+    NOMBRE = "binario"
+    MAGIC = b"SSB\x01"
+    # Longitud mínima de un texto para guardarlo como bytes si es hexadecimal
+    LONGITUD_MINIMA_HEX = 32
+
+    __TIPO_NONE = 0
+    __TIPO_TRUE = 1
+    __TIPO_FALSE = 2
+    __TIPO_INT = 3
+    __TIPO_FLOAT = 4
+    __TIPO_STR = 5
+    __TIPO_HEX = 6
+    __TIPO_LIST = 7
+    __TIPO_DICT = 8
+    __TIPO_INT_GRANDE = 9
+    __CARACTERES_HEX = frozenset("0123456789abcdef")
+
+    @staticmethod
+    def __escribir_varint(salida: bytearray, valor: int) -> None:
+        """Escribe un entero no negativo en formato LEB128"""
+        while valor > 0x7F:
+            salida.append((valor & 0x7F) | 0x80)
+            valor >>= 7
+        salida.append(valor)
+
+    @staticmethod
+    def __leer_varint(contenido: bytes, posicion: int):
+        """Lee un entero LEB128 y devuelve (valor, nueva posición)"""
+        valor = 0
+        desplazamiento = 0
+        while True:
+            byte = contenido[posicion]
+            posicion += 1
+            valor |= (byte & 0x7F) << desplazamiento
+            if byte < 0x80:
+                return valor, posicion
+            desplazamiento += 7
+
+    def __es_hex(self, texto: str) -> bool:
+        """Comprueba si un texto se puede guardar como bytes y recuperar idéntico con bytes.hex()"""
+        return (len(texto) >= self.LONGITUD_MINIMA_HEX and len(texto) % 2 == 0
+                and self.__CARACTERES_HEX.issuperset(texto))
+
+    def __escribir_texto(self, salida: bytearray, texto: str) -> None:
+        """Escribe un texto utf-8 precedido de su longitud"""
+        datos = texto.encode("utf-8")
+        self.__escribir_varint(salida, len(datos))
+        salida += datos
+
+    def __codificar(self, salida: bytearray, valor, claves: dict) -> None:
+        """Añade un valor a la salida"""
+        if valor is None:
+            salida.append(self.__TIPO_NONE)
+        elif valor is True:
+            salida.append(self.__TIPO_TRUE)
+        elif valor is False:
+            salida.append(self.__TIPO_FALSE)
+        elif isinstance(valor, int):
+            if -2 ** 63 <= valor < 2 ** 63:
+                salida.append(self.__TIPO_INT)
+                salida += struct.pack(">q", valor)
+            else:
+                salida.append(self.__TIPO_INT_GRANDE)
+                self.__escribir_texto(salida, str(valor))
+        elif isinstance(valor, float):
+            salida.append(self.__TIPO_FLOAT)
+            salida += struct.pack(">d", valor)
+        elif isinstance(valor, str):
+            if self.__es_hex(valor):
+                datos = bytes.fromhex(valor)
+                salida.append(self.__TIPO_HEX)
+                self.__escribir_varint(salida, len(datos))
+                salida += datos
+            else:
+                salida.append(self.__TIPO_STR)
+                self.__escribir_texto(salida, valor)
+        elif isinstance(valor, (list, tuple)):
+            salida.append(self.__TIPO_LIST)
+            self.__escribir_varint(salida, len(valor))
+            for elemento in valor:
+                self.__codificar(salida, elemento, claves)
+        elif isinstance(valor, dict):
+            salida.append(self.__TIPO_DICT)
+            self.__escribir_varint(salida, len(valor))
+            for clave, elemento in valor.items():
+                # Cada clave se escribe completa la primera vez (0 + texto) y después por su número (n + 1)
+                numero = claves.get(clave)
+                if numero is None:
+                    claves[clave] = len(claves)
+                    salida.append(0)
+                    self.__escribir_texto(salida, clave)
+                else:
+                    self.__escribir_varint(salida, numero + 1)
+                self.__codificar(salida, elemento, claves)
+        else:
+            raise TypeError("Tipo no serializable: " + type(valor).__name__)
+
+    def __decodificar(self, contenido: bytes, posicion: int, claves: list):
+        """Lee un valor y devuelve (valor, nueva posición)"""
+        tipo = contenido[posicion]
+        posicion += 1
+        if tipo == self.__TIPO_NONE:
+            return None, posicion
+        if tipo == self.__TIPO_TRUE:
+            return True, posicion
+        if tipo == self.__TIPO_FALSE:
+            return False, posicion
+        if tipo == self.__TIPO_INT:
+            return struct.unpack_from(">q", contenido, posicion)[0], posicion + 8
+        if tipo == self.__TIPO_FLOAT:
+            return struct.unpack_from(">d", contenido, posicion)[0], posicion + 8
+        if tipo in (self.__TIPO_STR, self.__TIPO_HEX, self.__TIPO_INT_GRANDE):
+            longitud, posicion = self.__leer_varint(contenido, posicion)
+            datos = contenido[posicion:posicion + longitud]
+            posicion += longitud
+            if tipo == self.__TIPO_HEX:
+                return bytes(datos).hex(), posicion
+            if tipo == self.__TIPO_INT_GRANDE:
+                return int(bytes(datos).decode("utf-8")), posicion
+            return bytes(datos).decode("utf-8"), posicion
+        if tipo == self.__TIPO_LIST:
+            longitud, posicion = self.__leer_varint(contenido, posicion)
+            lista = []
+            for _ in range(longitud):
+                elemento, posicion = self.__decodificar(contenido, posicion, claves)
+                lista.append(elemento)
+            return lista, posicion
+        if tipo == self.__TIPO_DICT:
+            longitud, posicion = self.__leer_varint(contenido, posicion)
+            diccionario = {}
+            for _ in range(longitud):
+                numero, posicion = self.__leer_varint(contenido, posicion)
+                if numero == 0:
+                    longitud_clave, posicion = self.__leer_varint(contenido, posicion)
+                    clave = bytes(contenido[posicion:posicion + longitud_clave]).decode("utf-8")
+                    posicion += longitud_clave
+                    claves.append(clave)
+                else:
+                    clave = claves[numero - 1]
+                diccionario[clave], posicion = self.__decodificar(contenido, posicion, claves)
+            return diccionario, posicion
+        raise ValueError("Tipo desconocido en el fichero binario: " + str(tipo))
+
+    def serializar(self, data_list: list) -> bytes:
+        """Convierte una lista en el contenido del fichero"""
+        salida = bytearray(self.MAGIC)
+        self.__codificar(salida, data_list, {})
+        return bytes(salida)
+
+    def deserializar(self, contenido: bytes) -> list:
+        """Convierte el contenido del fichero en una lista"""
+        data_list, _ = self.__decodificar(contenido, len(self.MAGIC), [])
+        return data_list
+
+    def iterar(self, file):
+        """Devuelve uno a uno los items (el formato binario necesita leer el fichero entero)"""
+        yield from self.deserializar(file.read())
+
+
+CODECS_STORE = {
+    CodecJson.NOMBRE: CodecJson(),
+    CodecJsonLineas.NOMBRE: CodecJsonLineas(),
+    CodecJsonCompacto.NOMBRE: CodecJsonCompacto(),
+    CodecMsgpack.NOMBRE: CodecMsgpack(),
+    CodecBinario.NOMBRE: CodecBinario(),
+}
+
+
+def obtener_codec(nombre_codec: str = STORE_CODEC):
+    """Devuelve el codec con el nombre indicado"""
+    try:
+        return CODECS_STORE[nombre_codec]
+    except KeyError as exception:
+        raise ExcepcionesGestor("Codec de store desconocido: " + str(nombre_codec)) from exception
+
+
+def detectar_codec(contenido: bytes):
+    """Devuelve el codec con el que está escrito el contenido de un fichero store"""
+    if contenido.startswith(CodecBinario.MAGIC):
+        return CODECS_STORE[CodecBinario.NOMBRE]
+    inicio = contenido.lstrip()[:1]
+    # Un array msgpack empieza por 0x90-0x9f (fixarray), 0xdc o 0xdd
+    if inicio and (0x90 <= inicio[0] <= 0x9F or inicio[0] in (0xDC, 0xDD)):
+        return CODECS_STORE[CodecMsgpack.NOMBRE]
+    return CODECS_STORE[CodecJson.NOMBRE]
+
+
+def copiar_item(valor):
+    """Copia profunda de un valor Json (diccionarios, listas y escalares), más rápida que copy.deepcopy"""
+    if isinstance(valor, dict):
+        return {clave: copiar_item(elemento) for clave, elemento in valor.items()}
+    if isinstance(valor, list):
+        return [copiar_item(elemento) for elemento in valor]
+    return valor
+
+
+def convertir_fichero_store(ruta_origen: str, nombre_codec: str, ruta_destino: str = None) -> None:
+    """Convierte un fichero store (en cualquier formato) al codec indicado"""
+    if ruta_destino is None:
+        ruta_destino = ruta_origen
+    with open(ruta_origen, "rb") as file:
+        contenido = file.read()
+    data_list = detectar_codec(contenido).deserializar(contenido)
+    escribir_fichero_atomico(ruta_destino, obtener_codec(nombre_codec).serializar(data_list))
 
 
 class JsonStore:
@@ -9,70 +334,334 @@ class JsonStore:
     _FILE_PATH = ""
     # Key a buscar
     _ID_FIELD = ""
+    # Otras keys por las que se busca (los motores con índices crean uno por cada una)
+    _INDEX_FIELDS = ()
 
     __ERROR_MESSAGE_FILE_NOT_FOUND = "Nombre del fichero o ruta de archivo incorrectos"
     __ERROR_MESSAGE_JSON_DECODE = "JSON Decode Error - Wrong JSON Format"
 
     def __init__(self):
-        pass
+        # Caché en memoria del contenido del fichero y su índice por _ID_FIELD
+        # (el lock protege la caché entre hilos; el bloqueo del fichero se toma siempre antes que él)
+        self.__cache_lock = threading.RLock()
+        self.__cache_data_list = None
+        self.__cache_indice = {}
+        # (inodo, mtime, tamaño) del fichero cuando se rellenó la caché
+        self.__cache_firma = None
+        # Snapshot binario abierto con mmap y (mtime, tamaño) de su fichero. El lock protege su sustitución;
+        # el lector sustituido no se cierra, su mmap se libera cuando ningún hilo lo usa
+        self.__snapshot_lock = threading.Lock()
+        self.__snapshot = None
+        self.__snapshot_firma = None
+        # Si el proceso anterior murió confirmando una transacción, la terminamos
+        TransaccionStore.recuperar()
+
+    def __firma_fichero(self):
+        """Devuelve (inodo, mtime, tamaño) del fichero store, o None si no existe.
+        Cada escritura es un rename, así que el inodo cambia aunque el tamaño y el mtime coincidan"""
+        try:
+            stat = os.stat(self._FILE_PATH)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def __indexar(self, data_list: list) -> dict:
+        """Índice por _ID_FIELD de una lista"""
+        indice = {}
+        for item in data_list:
+            # Si hubiera ids repetidos find_item devuelve el primero
+            indice.setdefault(item.get(self._ID_FIELD), item)
+        return indice
+
+    def __actualizar_cache(self, data_list: list, firma=None, indice=None) -> None:
+        """Guarda en la caché la lista y su índice por _ID_FIELD
+        (firma es la del fichero del que se leyó la lista; si no se indica se toma la actual)"""
+        if indice is None:
+            indice = self.__indexar(data_list)
+        with self.__cache_lock:
+            self.__cache_data_list = data_list
+            self.__cache_indice = indice
+            self.__cache_firma = firma if firma is not None else self.__firma_fichero()
+
+    def __invalidar_cache(self) -> None:
+        """Vacía la caché"""
+        with self.__cache_lock:
+            self.__cache_data_list = None
+            self.__cache_indice = {}
+            self.__cache_firma = None
+
+    def __pendiente_transaccion(self):
+        """(lista, índice) escritos por la transacción activa y aún no confirmados, o None.
+        Solo los ve esa transacción: los demás hilos siguen leyendo la caché compartida"""
+        transaccion = transaccion_activa()
+        if transaccion is None:
+            return None
+        return transaccion.pendiente(self._FILE_PATH)
+
+    def __publicar_pendiente(self, pendiente: tuple) -> None:
+        """Pasa a la caché compartida los datos de una transacción tras escribir su fichero al confirmarla"""
+        self.__actualizar_cache(pendiente[0], indice=pendiente[1])
+
+    def __cache_valida(self) -> bool:
+        """Comprueba que el fichero no ha cambiado desde que se rellenó la caché"""
+        if self.__cache_data_list is None:
+            return False
+        firma = self.__firma_fichero()
+        if firma is None or firma != self.__cache_firma:
+            # El fichero ha sido modificado o borrado fuera de este store
+            self.__invalidar_cache()
+            return False
+        return True
+
+    def version_store(self):
+        """Devuelve un valor que cambia cada vez que se modifica el store"""
+        return self.__firma_fichero()
+
+    @property
+    def lock_path(self) -> str:
+        """Ruta del fichero de bloqueo del store"""
+        return os.path.splitext(self._FILE_PATH)[0] + ".lock"
+
+    def _bloqueo_store(self, exclusivo: bool = False) -> BloqueoStore:
+        """Bloqueo del store entre procesos (compartido para leer, exclusivo para leer-modificar-escribir)"""
+        transaccion = transaccion_activa()
+        if transaccion is not None:
+            if exclusivo:
+                # Dentro de una transacción el bloqueo exclusivo se mantiene hasta confirmarla o descartarla
+                transaccion.bloquear(self.lock_path)
+            else:
+                transaccion.comprobar_orden(self.lock_path)
+        return BloqueoStore(self.lock_path, exclusivo)
+
+    @property
+    def snapshot_path(self) -> str:
+        """Ruta del snapshot binario del store"""
+        return os.path.splitext(self._FILE_PATH)[0] + ".snap"
+
+    def guardar_snapshot(self) -> None:
+        """Escribe el snapshot binario del store con su índice por _ID_FIELD"""
+        transaccion = transaccion_activa()
+        if transaccion is not None:
+            # El snapshot debe corresponder a la versión confirmada del store
+            transaccion.al_confirmar(self.guardar_snapshot)
+            return
+        with self._bloqueo_store():
+            escribir_snapshot(self.snapshot_path, self.load_store(), self._ID_FIELD, self.version_store())
+
+    def __soltar_snapshot(self) -> None:
+        """Deja de usar el snapshot abierto (otro hilo puede estar aún leyéndolo)"""
+        with self.__snapshot_lock:
+            self.__snapshot = None
+            self.__snapshot_firma = None
+
+    def __snapshot_valido(self):
+        """Devuelve el snapshot si corresponde a la versión actual del store, o None"""
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            self.__soltar_snapshot()
+            return None
+        firma = (stat.st_mtime_ns, stat.st_size)
+        with self.__snapshot_lock:
+            if self.__snapshot is None or firma != self.__snapshot_firma:
+                self.__snapshot = None
+                self.__snapshot_firma = None
+                try:
+                    self.__snapshot = LectorSnapshot(self.snapshot_path, self._ID_FIELD)
+                except (FileNotFoundError, ValueError, struct.error):
+                    # Snapshot borrado o corrupto: se ignora y se usa el fichero store
+                    return None
+                self.__snapshot_firma = firma
+            snapshot = self.__snapshot
+        if snapshot.version != self.version_store():
+            return None
+        return snapshot
 
     def save_store(self, data_list: list) -> None:
         """Guarda una lista en un fichero Json"""
+        # Copiamos los items para que la caché no cambie si el llamante modifica después la lista
+        self.__guardar_lista([copiar_item(item) for item in data_list])
+
+    def __guardar_lista(self, data_list: list) -> None:
+        """Guarda una lista cuyos items pasan a ser de la caché (nadie más debe modificarlos)"""
+        contenido = obtener_codec().serializar(data_list)
+        transaccion = transaccion_activa()
+        if transaccion is not None:
+            # El fichero se escribe una sola vez al confirmar la transacción; hasta entonces
+            # los datos nuevos solo los ve ella y la caché compartida sigue con los confirmados
+            transaccion.registrar_fichero(self._FILE_PATH, contenido)
+            transaccion.guardar_pendiente(self._FILE_PATH, (data_list, self.__indexar(data_list)),
+                                          self.__publicar_pendiente)
+            return
         try:
-            with open(self._FILE_PATH, "w", encoding="utf-8", newline="") as file:
-                json.dump(data_list, file, indent=2)
+            # Escribimos un temporal y lo renombramos: los lectores nunca ven un fichero a medias
+            with self._bloqueo_store(exclusivo=True):
+                escribir_fichero_atomico(self._FILE_PATH, contenido)
+                # Write-through: la caché refleja lo que acabamos de escribir
+                # (dentro del bloqueo, para que otro hilo no escriba entre medias)
+                self.__actualizar_cache(data_list)
         except FileNotFoundError as exception:
             raise ExcepcionesGestor(self.__ERROR_MESSAGE_FILE_NOT_FOUND) from exception
 
     def load_store(self) -> list:
         """Carga el contenido de un fichero Json en una lista"""
+        # Copiamos los items: si el llamante los modifica no debe cambiar la caché
+        return [copiar_item(item) for item in self.__cargar_lista()]
+
+    def __cargar_lista(self) -> list:
+        """Lista del store con los mismos items que la caché (solo para leerlos o sustituirlos, no modificarlos)"""
+        pendiente = self.__pendiente_transaccion()
+        if pendiente is not None:
+            return list(pendiente[0])
+        with self.__cache_lock:
+            if self.__cache_valida():
+                return list(self.__cache_data_list)
         try:
-            with open(self._FILE_PATH, "r", encoding="utf-8", newline="") as file:
-                data_list = json.load(file)
+            with self._bloqueo_store(), open(self._FILE_PATH, "rb") as file:
+                contenido = file.read()
+                # La firma se toma con el bloqueo: es la del contenido leído aunque otro hilo escriba después
+                firma = self.__firma_fichero()
+            # El fichero puede estar en cualquier codec, no solo en el configurado
+            data_list = detectar_codec(contenido).deserializar(contenido)
         except FileNotFoundError:
             # si el fichero no existe inicializar un data list nuevo
             data_list = []
-        except json.JSONDecodeError as exception:
+        except (ValueError, IndexError, struct.error) as exception:
+            # json.JSONDecodeError es un ValueError
             raise ExcepcionesGestor(self.__ERROR_MESSAGE_JSON_DECODE) from exception
+        else:
+            if firma is not None:
+                self.__actualizar_cache(list(data_list), firma)
         return data_list
 
+    def iter_items(self, predicate=None):
+        """Devuelve uno a uno los items del store (los que cumplan predicate, si se indica)"""
+        pendiente = self.__pendiente_transaccion()
+        with self.__cache_lock:
+            # Copiamos la lista por si el store se modifica mientras se recorre
+            if pendiente is not None:
+                items = list(pendiente[0])
+            else:
+                items = list(self.__cache_data_list) if self.__cache_valida() else None
+        if items is not None:
+            # Los items de la caché se copian al entregarlos; los del snapshot y el fichero ya son nuevos
+            items = map(copiar_item, items)
+        else:
+            snapshot = self.__snapshot_valido()
+            if snapshot is not None:
+                # El snapshot solo decodifica cada item cuando se pide
+                items = snapshot
+            else:
+                # Sin caché leemos el fichero en streaming, sin cargarlo entero en memoria
+                items = self.__iterar_fichero()
+        for item in items:
+            if predicate is None or predicate(item):
+                yield item
+
+    def __iterar_fichero(self):
+        """Lee los items del fichero uno a uno con el parser incremental de su codec"""
+        try:
+            with open(self._FILE_PATH, "rb") as file:
+                codec = detectar_codec(file.peek(4096)[:4096])
+                yield from codec.iterar(file)
+        except FileNotFoundError:
+            return
+        except (ValueError, IndexError, struct.error) as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_JSON_DECODE) from exception
+
     def find_item(self, key_value: str, key=None):
         """Busca el primer item con item[key]=key_value en un fichero Json"""
-        data_list = self.load_store()
-        if key is None:     # si no se especifica key será ID_FIELD
-            key = self._ID_FIELD
-        for item in data_list:
-            if item[key] == key_value:
-                return item
+        if key is None or key == self._ID_FIELD:
+            # Búsqueda por ID en el índice hash de la caché
+            pendiente = self.__pendiente_transaccion()
+            if pendiente is not None:
+                return copiar_item(pendiente[1].get(key_value))
+            with self.__cache_lock:
+                if self.__cache_valida():
+                    return copiar_item(self.__cache_indice.get(key_value))
+            snapshot = self.__snapshot_valido()
+            if snapshot is not None:
+                # Sin caché buscamos en el índice del snapshot sin cargar el store
+                return snapshot.buscar(key_value)
+            # Buscamos en la lista cargada: otro hilo puede haber cambiado la caché entretanto
+            for item in self.__cargar_lista():
+                if item.get(self._ID_FIELD) == key_value:
+                    return copiar_item(item)
+            return None
+        # Paramos en el primer item que coincide
+        for item in self.iter_items(lambda item: item[key] == key_value):
+            return item
         return None
 
-    def find_items_list(self, key_value, key=None):
-        """Busca todos los items con item[key]=key_value en un fichero Json"""
-        data_list = self.load_store()
+    def find_items_list(self, key_value, key=None, stream=False):
+        """Busca todos los items con item[key]=key_value en un fichero Json
+        (con stream=True devuelve un generador en lugar de una lista)"""
         if key is None:
             key = self._ID_FIELD
-        data_list_result = []
-        for item in data_list:
-            if item[key] == key_value:
-                data_list_result.append(item)
-        return data_list_result
+        items = self.iter_items(lambda item: item[key] == key_value)
+        if stream:
+            return items
+        return list(items)
 
     def add_item(self, item: object) -> None:
-        """Añade un item a un fichero Json"""
-        data_list = self.load_store()
-        data_list.append(item.__dict__)
-        self.save_store(data_list)
+        """Añade un item (objeto o diccionario) a un fichero Json"""
+        # El bloqueo exclusivo evita perder escrituras de otro proceso entre la lectura y la escritura
+        with self._bloqueo_store(exclusivo=True):
+            data_list = self.__cargar_lista()
+            # Copiamos el item para que la caché no cambie si luego se modifica el objeto
+            data_list.append(copy.deepcopy(self._item_dict(item)))
+            self.__guardar_lista(data_list)
+
+    def add_items(self, items) -> None:
+        """Añade varios items a un fichero Json con una sola lectura y una sola escritura"""
+        with self._bloqueo_store(exclusivo=True):
+            data_list = self.__cargar_lista()
+            data_list.extend(copy.deepcopy(self._item_dict(item)) for item in items)
+            self.__guardar_lista(data_list)
 
     def update_item(self, new_item, key_value):
         """Actualiza un item en el datalist y modifica el fichero Json"""
-        # Cargamos los datos del fichero
-        data_list = self.load_store()
-        # Creamos una nueva lista quitando el item antiguo que se quiere actualizar
-        data_list_result = []
-        for item in data_list:
-            if item[self._ID_FIELD] != key_value:
-                data_list_result.append(item)
-        # Añadimos el item nuevo a la lista de diccionarios
-        data_list_result.append(new_item.__dict__)
-        # Guardamos la lista en el fichero
-        self.save_store(data_list_result)
+        with self._bloqueo_store(exclusivo=True):
+            # Cargamos los datos del fichero
+            data_list = self.__cargar_lista()
+            # Creamos una nueva lista quitando el item antiguo que se quiere actualizar
+            data_list_result = []
+            for item in data_list:
+                if item[self._ID_FIELD] != key_value:
+                    data_list_result.append(item)
+            # Añadimos el item nuevo a la lista de diccionarios
+            data_list_result.append(copy.deepcopy(self._item_dict(new_item)))
+            # Guardamos la lista en el fichero
+            self.__guardar_lista(data_list_result)
+
+    def update_items(self, items) -> None:
+        """Actualiza varios items (por su _ID_FIELD) con una sola lectura y una sola escritura del fichero Json"""
+        with self._bloqueo_store(exclusivo=True):
+            nuevos = [copy.deepcopy(self._item_dict(item)) for item in items]
+            ids = {item[self._ID_FIELD] for item in nuevos}
+            data_list_result = [item for item in self.__cargar_lista() if item[self._ID_FIELD] not in ids]
+            data_list_result.extend(nuevos)
+            self.__guardar_lista(data_list_result)
+
+    def delete_item(self, key_value) -> None:
+        """Borra el item con item[_ID_FIELD]=key_value del fichero Json"""
+        with self._bloqueo_store(exclusivo=True):
+            data_list = self.__cargar_lista()
+            data_list_result = [item for item in data_list if item[self._ID_FIELD] != key_value]
+            self.__guardar_lista(data_list_result)
+
+    def borrar_store(self) -> None:
+        """Elimina el fichero store"""
+        if os.path.isfile(self._FILE_PATH):
+            os.remove(self._FILE_PATH)
+        self.__soltar_snapshot()
+        if os.path.isfile(self.snapshot_path):
+            os.remove(self.snapshot_path)
+        self.__invalidar_cache()
+
+    @staticmethod
+    def _item_dict(item) -> dict:
+        """Devuelve el diccionario que se guarda en el store para un item"""
+        if isinstance(item, dict):
+            return item
+        return item.__dict__
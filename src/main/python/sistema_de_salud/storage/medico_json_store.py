@@ -1,5 +1,6 @@
 """Module medico_json_store"""
 from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.motor_store import MotorStore
 from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
 from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
 
@@ -7,10 +8,11 @@ from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
 class MedicoJsonStore(JsonStore):
     """Clase hija de JsonStore con los atributos para store_medicos"""
 
-    class __MedicoJsonStore(JsonStore):
+    class __MedicoJsonStore(MotorStore):
         """Clase privada, patron singleton"""
         _FILE_PATH = JSON_FILES_PATH + "store_medicos.json"
         _ID_FIELD = "_RegistroMedico__id_medico"
+        __ESPECIALIDAD_FIELD = "_RegistroMedico__especialidad"
 
         __ERROR_MESSAGE_INVALID_OBJECT = "Objeto RegistroMedico invalido"
         __ERROR_MESSAGE_ID_REGISTRADO = "ID del médico ya registrado"
@@ -51,6 +53,11 @@ class MedicoJsonStore(JsonStore):
                 print(e)
                 return None
 
+        def buscar_medicos_especialidad_store(self, especialidad: str) -> list:
+            """Devuelve los id de los médicos de una especialidad"""
+            return [item[self._ID_FIELD] for item in self.find_items_list(especialidad, self.__ESPECIALIDAD_FIELD,
+                                                                          stream=True)]
+
     __instance = None
 
     def __new__(cls):
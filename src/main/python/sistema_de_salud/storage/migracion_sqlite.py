@@ -0,0 +1,36 @@
+"""Module migracion_sqlite"""
+import os
+from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.sqlite_store import SqliteStore
+from sistema_de_salud.storage.paciente_json_store import PacienteJsonStore
+from sistema_de_salud.storage.medico_json_store import MedicoJsonStore
+from sistema_de_salud.storage.autenticacion_json_store import AutenticacionJsonStore
+from sistema_de_salud.storage.cita_json_store import CitaJsonStore
+
+
+def migrar_store_a_sqlite(store) -> int:
+    """Importa el fichero Json de un store en su tabla SQLite y devuelve el número de items"""
+    atributos = {
+        "_FILE_PATH": store._FILE_PATH,
+        "_ID_FIELD": store._ID_FIELD,
+        "_INDEX_FIELDS": store._INDEX_FIELDS,
+    }
+    # Leemos siempre el fichero Json, sea cual sea el motor configurado
+    origen = type("OrigenJson", (JsonStore,), atributos)()
+    destino = type("DestinoSqlite", (SqliteStore,), atributos)()
+    data_list = origen.load_store()
+    destino.save_store(data_list)
+    return len(data_list)
+
+
+def migrar_json_a_sqlite() -> dict:
+    """Importa los ficheros src/JsonFiles/*.json de todos los stores en la base de datos SQLite"""
+    resultado = {}
+    for store in (PacienteJsonStore(), MedicoJsonStore(), AutenticacionJsonStore(), CitaJsonStore()):
+        resultado[os.path.basename(store._FILE_PATH)] = migrar_store_a_sqlite(store)
+    return resultado
+
+
+if __name__ == "__main__":
+    for fichero, num_items in migrar_json_a_sqlite().items():
+        print(fichero + ": " + str(num_items) + " items migrados")
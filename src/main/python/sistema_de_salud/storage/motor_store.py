@@ -0,0 +1,25 @@
+"""Module motor_store"""
+from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.journal_store import JournalStore
+from sistema_de_salud.storage.sqlite_store import SqliteStore
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.cfg.gestor_centro_salud_config import STORE_ENGINE
+
+# Motores de almacenamiento disponibles, todos con la interfaz de JsonStore
+MOTORES_STORE = {
+    "json": JsonStore,
+    "journal": JournalStore,
+    "sqlite": SqliteStore,
+}
+
+
+def obtener_motor_store(nombre_motor: str = STORE_ENGINE):
+    """Devuelve la clase del motor de almacenamiento configurado"""
+    try:
+        return MOTORES_STORE[nombre_motor]
+    except KeyError as exception:
+        raise ExcepcionesGestor("Motor de almacenamiento desconocido: " + str(nombre_motor)) from exception
+
+
+# Clase base de los stores singleton (CitaJsonStore, MedicoJsonStore...)
+MotorStore = obtener_motor_store()
@@ -1,5 +1,6 @@
 """Module paciente_json_store"""
 from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.motor_store import MotorStore
 from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
 from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
 
@@ -7,7 +8,7 @@ from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
 class PacienteJsonStore(JsonStore):
     """Clase hija de JsonStore con los atributos para store_pacientes"""
 
-    class __PacienteJsonStore(JsonStore):
+    class __PacienteJsonStore(MotorStore):
         """Clase privada, patron singleton"""
         _FILE_PATH = JSON_FILES_PATH + "store_pacientes.json"
         _ID_FIELD = "_RegistroPaciente__id_paciente"
@@ -0,0 +1,285 @@
+"""Module particion_store"""
+import os
+import copy
+import json
+from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.motor_store import MotorStore
+from sistema_de_salud.storage.transaccion_store import transaccion_activa
+from sistema_de_salud.storage.transaccion_store import escribir_fichero_atomico
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+
+
+class StoreParticionadoMes(JsonStore):
+    """Store con la interfaz de JsonStore repartido en un store por mes de _PARTITION_FIELD
+    (formato "YYYY-MM-DD HH:MM:SS"), con un manifiesto que indica en qué mes está cada item"""
+    # Key con la fecha por la que se particiona
+    _PARTITION_FIELD = ""
+
+    __ERROR_MESSAGE_JSON_DECODE = "JSON Decode Error - Wrong JSON Format"
+
+    def __init__(self):
+        super().__init__()
+        # mes (YYYY-MM) -> store de ese mes
+        self.__particiones = {}
+        self.__manifiesto = None
+        self.__manifiesto_firma = None
+
+    @property
+    def manifiesto_path(self) -> str:
+        """Ruta del manifiesto de particiones"""
+        return os.path.splitext(self._FILE_PATH)[0] + "_manifiesto.json"
+
+    def _clave_particion(self, item: dict) -> str:
+        """Mes (YYYY-MM) en el que se guarda un item"""
+        return item[self._PARTITION_FIELD][:7]
+
+    def particion(self, mes: str):
+        """Devuelve el store de un mes"""
+        store = self.__particiones.get(mes)
+        if store is None:
+            ruta, extension = os.path.splitext(self._FILE_PATH)
+            atributos = {
+                "_FILE_PATH": ruta + "_" + mes + extension,
+                "_ID_FIELD": self._ID_FIELD,
+                "_INDEX_FIELDS": self._INDEX_FIELDS,
+                # Las particiones usan el bloqueo del store: solo se escriben con él tomado y así
+                # no añaden bloqueos que ordenar dentro de una transacción
+                "lock_path": self.lock_path,
+            }
+            if hasattr(self, "_DB_PATH"):
+                # Con el motor sqlite, las particiones van en la misma base de datos que el store
+                atributos["_DB_PATH"] = self._DB_PATH
+            store = type("Particion" + mes.replace("-", ""), (MotorStore,), atributos)()
+            self.__particiones[mes] = store
+        return store
+
+    def __firma_manifiesto(self):
+        """Devuelve (mtime, tamaño) del manifiesto, o None si no existe"""
+        try:
+            stat = os.stat(self.manifiesto_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def __cargar_manifiesto(self) -> dict:
+        """Devuelve el manifiesto {version, meses, items: id -> mes}"""
+        if self.__manifiesto is not None and self.__manifiesto_firma == self.__firma_manifiesto():
+            return self.__manifiesto
+        try:
+            with open(self.manifiesto_path, "r", encoding="utf-8", newline="") as file:
+                self.__manifiesto = json.load(file)
+        except FileNotFoundError:
+            self.__manifiesto = {"version": 0, "meses": [], "items": {}}
+            # Si existe el store sin particionar, lo repartimos por meses la primera vez
+            if os.path.isfile(self._FILE_PATH):
+                self.__particionar_store_original()
+        except json.JSONDecodeError as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_JSON_DECODE) from exception
+        self.__manifiesto_firma = self.__firma_manifiesto()
+        return self.__manifiesto
+
+    def __particionar_store_original(self) -> None:
+        """Reparte el contenido del store sin particionar entre los stores de cada mes"""
+        original = type("Original", (JsonStore,), {"_FILE_PATH": self._FILE_PATH, "_ID_FIELD": self._ID_FIELD})()
+        self.save_store(original.load_store())
+        original.borrar_store()
+
+    def __manifiesto_lectura(self) -> dict:
+        """Manifiesto que ve el hilo actual: el modificado por su transacción o el guardado"""
+        # Se carga antes de mirar la transacción: cargarlo puede repartir el store original dentro de ella
+        manifiesto = self.__cargar_manifiesto()
+        transaccion = transaccion_activa()
+        if transaccion is not None and transaccion.pendiente(self.manifiesto_path) is not None:
+            return transaccion.pendiente(self.manifiesto_path)
+        return manifiesto
+
+    def __manifiesto_escritura(self, base: dict = None) -> dict:
+        """Copia del manifiesto (o de base) para modificarla y guardarla con __guardar_manifiesto;
+        dentro de una transacción es siempre la misma, la que solo ve ella hasta confirmarla"""
+        if base is None:
+            base = self.__cargar_manifiesto()
+        transaccion = transaccion_activa()
+        if transaccion is not None and transaccion.pendiente(self.manifiesto_path) is not None:
+            return transaccion.pendiente(self.manifiesto_path)
+        return copy.deepcopy(base)
+
+    def __guardar_manifiesto(self, manifiesto: dict) -> None:
+        """Guarda el manifiesto incrementando su versión"""
+        manifiesto["version"] += 1
+        manifiesto["meses"] = sorted(manifiesto["meses"])
+        contenido = json.dumps(manifiesto, separators=(",", ":"))
+        transaccion = transaccion_activa()
+        if transaccion is not None:
+            transaccion.registrar_fichero(self.manifiesto_path, contenido)
+            transaccion.guardar_pendiente(self.manifiesto_path, manifiesto, self.__publicar_manifiesto)
+            return
+        escribir_fichero_atomico(self.manifiesto_path, contenido)
+        self.__publicar_manifiesto(manifiesto)
+
+    def __publicar_manifiesto(self, manifiesto: dict) -> None:
+        """Sustituye el manifiesto en memoria por el recién escrito en el fichero"""
+        self.__manifiesto = manifiesto
+        self.__manifiesto_firma = self.__firma_manifiesto()
+
+    def __invalidar_manifiesto(self) -> None:
+        """Descarta el manifiesto en memoria"""
+        self.__manifiesto = None
+        self.__manifiesto_firma = None
+
+    def __registrar_item(self, manifiesto: dict, item: dict, mes: str) -> None:
+        """Apunta en el manifiesto el mes de un item"""
+        manifiesto["items"][item[self._ID_FIELD]] = mes
+        if mes not in manifiesto["meses"]:
+            manifiesto["meses"].append(mes)
+
+    def meses(self) -> list:
+        """Meses con particiones, en orden cronológico"""
+        return list(self.__manifiesto_lectura()["meses"])
+
+    def mes_item(self, key_value):
+        """Mes en el que está guardado el item con _ID_FIELD=key_value, o None"""
+        return self.__manifiesto_lectura()["items"].get(key_value)
+
+    def version_store(self):
+        """La versión del manifiesto cambia con cada modificación de cualquier partición"""
+        return self.__manifiesto_lectura()["version"]
+
+    def save_store(self, data_list: list) -> None:
+        """Reparte la lista entre los stores de cada mes"""
+        por_mes = {}
+        for item in data_list:
+            por_mes.setdefault(self._clave_particion(item), []).append(item)
+        with self._bloqueo_store(exclusivo=True):
+            self.__guardar_particiones(por_mes)
+
+    def __guardar_particiones(self, por_mes: dict) -> None:
+        """Sustituye el contenido de las particiones por el de por_mes (mes -> items)"""
+        # Al repartir el store original el manifiesto se está cargando: se parte del que hay en memoria
+        manifiesto = self.__manifiesto_escritura(self.__manifiesto)
+        for mes in manifiesto["meses"]:
+            if mes not in por_mes:
+                self.particion(mes).borrar_store()
+        for mes, items in por_mes.items():
+            self.particion(mes).save_store(items)
+        manifiesto["meses"] = []
+        manifiesto["items"] = {}
+        for mes, items in por_mes.items():
+            for item in items:
+                self.__registrar_item(manifiesto, item, mes)
+        self.__guardar_manifiesto(manifiesto)
+
+    def guardar_snapshot(self) -> None:
+        """Escribe el snapshot binario de cada partición"""
+        for mes in self.meses():
+            self.particion(mes).guardar_snapshot()
+
+    def load_store(self) -> list:
+        """Carga el contenido de todas las particiones en una lista"""
+        return list(self.iter_items())
+
+    def iter_items(self, predicate=None):
+        """Devuelve uno a uno los items de todas las particiones en orden cronológico"""
+        for mes in self.meses():
+            yield from self.particion(mes).iter_items(predicate)
+
+    def find_item(self, key_value: str, key=None):
+        """Busca el primer item con item[key]=key_value; por ID o por fecha solo se consulta una partición"""
+        if key is None or key == self._ID_FIELD:
+            mes = self.mes_item(key_value)
+            if mes is None:
+                return None
+            return self.particion(mes).find_item(key_value)
+        if key == self._PARTITION_FIELD:
+            # Por fecha solo se consulta la partición de ese mes
+            if key_value[:7] not in self.meses():
+                return None
+            return self.particion(key_value[:7]).find_item(key_value, key)
+        for item in self.iter_items(lambda item: item[key] == key_value):
+            return item
+        return None
+
+    def find_items_list(self, key_value, key=None, stream=False):
+        """Busca todos los items con item[key]=key_value en todas las particiones
+        (con stream=True devuelve un generador en lugar de una lista)"""
+        if key is None or key == self._ID_FIELD:
+            item = self.find_item(key_value)
+            items = iter([] if item is None else [item])
+        elif key == self._PARTITION_FIELD:
+            items = iter([])
+            if key_value[:7] in self.meses():
+                items = self.particion(key_value[:7]).find_items_list(key_value, key, stream=True)
+        else:
+            items = self.__iterar_busqueda(key_value, key)
+        if stream:
+            return items
+        return list(items)
+
+    def __iterar_busqueda(self, key_value, key):
+        """Devuelve uno a uno los items con item[key]=key_value de cada partición"""
+        for mes in self.meses():
+            yield from self.particion(mes).find_items_list(key_value, key, stream=True)
+
+    def add_item(self, item: object) -> None:
+        """Añade un item a la partición de su mes"""
+        item_dict = self._item_dict(item)
+        mes = self._clave_particion(item_dict)
+        # El bloqueo exclusivo del store protege el manifiesto de escrituras de otros procesos
+        with self._bloqueo_store(exclusivo=True):
+            manifiesto = self.__manifiesto_escritura()
+            self.particion(mes).add_item(item)
+            self.__registrar_item(manifiesto, item_dict, mes)
+            self.__guardar_manifiesto(manifiesto)
+
+    def add_items(self, items) -> None:
+        """Añade varios items, agrupados por partición, guardando el manifiesto una sola vez"""
+        por_mes = {}
+        for item in items:
+            por_mes.setdefault(self._clave_particion(self._item_dict(item)), []).append(item)
+        with self._bloqueo_store(exclusivo=True):
+            manifiesto = self.__manifiesto_escritura()
+            for mes, items_mes in por_mes.items():
+                self.particion(mes).add_items(items_mes)
+                for item in items_mes:
+                    self.__registrar_item(manifiesto, self._item_dict(item), mes)
+            self.__guardar_manifiesto(manifiesto)
+
+    def update_item(self, new_item, key_value):
+        """Actualiza un item, moviéndolo de partición si cambia de mes"""
+        item_dict = self._item_dict(new_item)
+        mes = self._clave_particion(item_dict)
+        with self._bloqueo_store(exclusivo=True):
+            manifiesto = self.__manifiesto_escritura()
+            mes_anterior = manifiesto["items"].pop(key_value, None)
+            if mes_anterior is not None and mes_anterior != mes:
+                self.particion(mes_anterior).delete_item(key_value)
+                self.particion(mes).add_item(new_item)
+            else:
+                self.particion(mes).update_item(new_item, key_value)
+            self.__registrar_item(manifiesto, item_dict, mes)
+            self.__guardar_manifiesto(manifiesto)
+
+    def update_items(self, items) -> None:
+        """Actualiza varios items, cada uno en la partición de su mes"""
+        with self._bloqueo_store(exclusivo=True):
+            for item in items:
+                self.update_item(item, self._item_dict(item)[self._ID_FIELD])
+
+    def delete_item(self, key_value) -> None:
+        """Borra un item de la partición de su mes"""
+        with self._bloqueo_store(exclusivo=True):
+            manifiesto = self.__manifiesto_escritura()
+            mes = manifiesto["items"].pop(key_value, None)
+            if mes is None:
+                return
+            self.particion(mes).delete_item(key_value)
+            self.__guardar_manifiesto(manifiesto)
+
+    def borrar_store(self) -> None:
+        """Elimina todas las particiones, el manifiesto y el store sin particionar si existe"""
+        if os.path.isfile(self.manifiesto_path):
+            for mes in self.meses():
+                self.particion(mes).borrar_store()
+            os.remove(self.manifiesto_path)
+        self.__invalidar_manifiesto()
+        self.__particiones = {}
+        super().borrar_store()
@@ -0,0 +1,108 @@
+"""Module snapshot_store"""
+import json
+import mmap
+import struct
+import hashlib
+from sistema_de_salud.storage.transaccion_store import escribir_fichero_atomico
+
+# Formato del snapshot:
+#   cabecera: MAGIC, longitud de la versión, número de items
+#   versión del store (Json) a la que corresponde el snapshot
+#   índice: (hash del id, número de item) ordenado, para buscar por id con búsqueda binaria
+#   posiciones: (offset, longitud) de cada item
+#   items en Json compacto, uno detrás de otro
+MAGIC = b"SSS\x01"
+_CABECERA = struct.Struct(">4sII")
+_ENTRADA_INDICE = struct.Struct(">QI")
+_ENTRADA_POSICION = struct.Struct(">QI")
+
+
+def hash_id(valor) -> int:
+    """Hash estable de 64 bits de un valor de _ID_FIELD"""
+    return int.from_bytes(hashlib.blake2b(json.dumps(valor).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def escribir_snapshot(ruta: str, data_list: list, id_field: str, version) -> None:
+    """Escribe el snapshot binario de una lista de items con su índice por id_field"""
+    version_bytes = json.dumps(version).encode("utf-8")
+    items = [json.dumps(item, separators=(",", ":")).encode("utf-8") for item in data_list]
+    indice = sorted((hash_id(item.get(id_field)), numero) for numero, item in enumerate(data_list))
+    inicio_items = (_CABECERA.size + len(version_bytes) +
+                    len(items) * (_ENTRADA_INDICE.size + _ENTRADA_POSICION.size))
+    contenido = bytearray(_CABECERA.pack(MAGIC, len(version_bytes), len(items)))
+    contenido += version_bytes
+    for entrada in indice:
+        contenido += _ENTRADA_INDICE.pack(*entrada)
+    offset = inicio_items
+    for item in items:
+        contenido += _ENTRADA_POSICION.pack(offset, len(item))
+        offset += len(item)
+    for item in items:
+        contenido += item
+    escribir_fichero_atomico(ruta, bytes(contenido))
+
+
+class LectorSnapshot:
+    """Lee un snapshot con mmap: solo se decodifican los items que se piden"""
+
+    def __init__(self, ruta: str, id_field: str):
+        self.__id_field = id_field
+        with open(ruta, "rb") as file:
+            self.__mapa = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, longitud_version, self.__num_items = _CABECERA.unpack_from(self.__mapa, 0)
+        if magic != MAGIC:
+            self.__mapa.close()
+            raise ValueError("El fichero no es un snapshot de store")
+        inicio_version = _CABECERA.size
+        version = json.loads(self.__mapa[inicio_version:inicio_version + longitud_version])
+        # Json devuelve las tuplas como listas: así se compara directamente con version_store()
+        self.__version = tuple(version) if isinstance(version, list) else version
+        self.__inicio_indice = inicio_version + longitud_version
+        self.__inicio_posiciones = self.__inicio_indice + self.__num_items * _ENTRADA_INDICE.size
+
+    @property
+    def version(self):
+        """Versión del store a la que corresponde el snapshot"""
+        return self.__version
+
+    def __len__(self):
+        return self.__num_items
+
+    def item(self, numero: int) -> dict:
+        """Decodifica el item número numero"""
+        offset, longitud = _ENTRADA_POSICION.unpack_from(self.__mapa,
+                                                         self.__inicio_posiciones + numero * _ENTRADA_POSICION.size)
+        return json.loads(self.__mapa[offset:offset + longitud])
+
+    def __iter__(self):
+        for numero in range(self.__num_items):
+            yield self.item(numero)
+
+    def __entrada_indice(self, posicion: int):
+        """Devuelve (hash, número de item) de una posición del índice"""
+        return _ENTRADA_INDICE.unpack_from(self.__mapa, self.__inicio_indice + posicion * _ENTRADA_INDICE.size)
+
+    def buscar(self, key_value):
+        """Busca el primer item con _ID_FIELD=key_value con una búsqueda binaria en el índice"""
+        buscado = hash_id(key_value)
+        inferior, superior = 0, self.__num_items
+        while inferior < superior:
+            medio = (inferior + superior) // 2
+            if self.__entrada_indice(medio)[0] < buscado:
+                inferior = medio + 1
+            else:
+                superior = medio
+        # Las entradas con el mismo hash están ordenadas por número de item
+        while inferior < self.__num_items:
+            hash_entrada, numero = self.__entrada_indice(inferior)
+            if hash_entrada != buscado:
+                break
+            item = self.item(numero)
+            if item.get(self.__id_field) == key_value:
+                return item
+            inferior += 1
+        return None
+
+    def cerrar(self) -> None:
+        """Libera el mmap"""
+        self.__mapa.close()
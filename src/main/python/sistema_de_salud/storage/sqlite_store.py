@@ -0,0 +1,220 @@
+"""Module sqlite_store"""
+import os
+import json
+import sqlite3
+import threading
+from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.storage.transaccion_store import transaccion_activa
+from sistema_de_salud.cfg.gestor_centro_salud_config import SQLITE_DB_PATH
+
+# Conexiones abiertas en cada hilo (ruta de la base de datos -> conexión), compartidas por todos los stores
+_conexiones = threading.local()
+
+
+class SqliteStore(JsonStore):
+    """Store con la interfaz de JsonStore guardado en una tabla SQLite con índices por _ID_FIELD e _INDEX_FIELDS"""
+    _DB_PATH = SQLITE_DB_PATH
+
+    __ERROR_MESSAGE_DB = "Error en la base de datos SQLite"
+
+    def __init__(self):
+        super().__init__()
+        self.__tabla_creada = False
+
+    @property
+    def tabla(self) -> str:
+        """Nombre de la tabla del store (nombre del fichero Json sin extensión)"""
+        return os.path.splitext(os.path.basename(self._FILE_PATH))[0]
+
+    @staticmethod
+    def _columna(key: str) -> str:
+        """Nombre de la columna indexada para una key"""
+        return "c" + key
+
+    def __conexion(self) -> sqlite3.Connection:
+        """Devuelve la conexión del hilo actual, creando la tabla si hace falta"""
+        # sqlite3 no permite compartir conexiones entre hilos, abrimos una por hilo
+        if not hasattr(_conexiones, "por_ruta"):
+            _conexiones.por_ruta = {}
+        conexion = _conexiones.por_ruta.get(self._DB_PATH)
+        if conexion is None:
+            try:
+                conexion = sqlite3.connect(self._DB_PATH, timeout=30, isolation_level=None)
+            except sqlite3.OperationalError as exception:
+                raise ExcepcionesGestor(self.__ERROR_MESSAGE_DB) from exception
+            # WAL: los lectores no bloquean al escritor ni al revés
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            _conexiones.por_ruta[self._DB_PATH] = conexion
+        if not self.__tabla_creada:
+            self.__crear_tabla(conexion)
+        return conexion
+
+    def __crear_tabla(self, conexion: sqlite3.Connection) -> None:
+        """Crea la tabla del store y sus índices"""
+        columnas = "".join(', "' + self._columna(key) + '"' for key in self._INDEX_FIELDS)
+        conexion.execute('CREATE TABLE IF NOT EXISTS "' + self.tabla + '" ('
+                         'seq INTEGER PRIMARY KEY AUTOINCREMENT, id, data TEXT NOT NULL' + columnas + ')')
+        conexion.execute('CREATE INDEX IF NOT EXISTS "' + self.tabla + '_id" ON "' + self.tabla + '" (id)')
+        for key in self._INDEX_FIELDS:
+            conexion.execute('CREATE INDEX IF NOT EXISTS "' + self.tabla + '_' + self._columna(key) + '" ON "' +
+                             self.tabla + '" ("' + self._columna(key) + '")')
+        # Contador de modificaciones de cada tabla, para version_store
+        conexion.execute("CREATE TABLE IF NOT EXISTS store_versiones (tabla TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        self.__tabla_creada = True
+
+    def __incrementar_version(self, conexion: sqlite3.Connection) -> None:
+        """Incrementa el contador de modificaciones de la tabla (dentro de la transacción de escritura)"""
+        conexion.execute("INSERT INTO store_versiones (tabla, version) VALUES (?, 1) "
+                         "ON CONFLICT(tabla) DO UPDATE SET version = version + 1", (self.tabla,))
+
+    def version_store(self):
+        """Devuelve el contador de modificaciones de la tabla"""
+        try:
+            fila = self.__conexion().execute("SELECT version FROM store_versiones WHERE tabla = ?",
+                                             (self.tabla,)).fetchone()
+        except sqlite3.DatabaseError as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_DB) from exception
+        if fila is None:
+            return None
+        return fila[0]
+
+    def __insertar(self, conexion: sqlite3.Connection, item: dict) -> None:
+        """Inserta un item en la tabla con sus columnas indexadas"""
+        columnas = "".join(', "' + self._columna(key) + '"' for key in self._INDEX_FIELDS)
+        valores = [item.get(self._ID_FIELD), json.dumps(item)] + [item.get(key) for key in self._INDEX_FIELDS]
+        conexion.execute('INSERT INTO "' + self.tabla + '" (id, data' + columnas + ') VALUES (' +
+                         ", ".join("?" * len(valores)) + ")", valores)
+
+    def __escribir(self, operacion) -> None:
+        """Ejecuta operacion(conexion) en una transacción de escritura e incrementa la versión de la tabla"""
+        conexion = self.__conexion()
+        transaccion = transaccion_activa()
+        try:
+            if transaccion is not None:
+                # Todas las escrituras de la TransaccionStore van en una única transacción SQLite
+                if not conexion.in_transaction:
+                    conexion.execute("BEGIN IMMEDIATE")
+                    transaccion.al_confirmar(conexion.commit)
+                    transaccion.al_descartar(conexion.rollback)
+                operacion(conexion)
+                self.__incrementar_version(conexion)
+                return
+            with conexion:
+                conexion.execute("BEGIN IMMEDIATE")
+                operacion(conexion)
+                self.__incrementar_version(conexion)
+        except sqlite3.DatabaseError as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_DB) from exception
+
+    def __consultar(self, condicion: str = "", parametros=(), limite=None) -> list:
+        """Devuelve los items que cumplen la condición SQL, en orden de inserción"""
+        sql = 'SELECT data FROM "' + self.tabla + '"'
+        if condicion:
+            sql += " WHERE " + condicion
+        sql += " ORDER BY seq"
+        if limite is not None:
+            sql += " LIMIT " + str(int(limite))
+        try:
+            filas = self.__conexion().execute(sql, parametros).fetchall()
+        except sqlite3.DatabaseError as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_DB) from exception
+        return [json.loads(fila[0]) for fila in filas]
+
+    def __condicion_key(self, key) -> str:
+        """Condición SQL para item[key] = ?, usando un índice si existe"""
+        if key is None or key == self._ID_FIELD:
+            return "id = ?"
+        if key in self._INDEX_FIELDS:
+            return '"' + self._columna(key) + '" = ?'
+        # Key sin índice: filtramos sobre el propio Json
+        return "json_extract(data, '$.\"" + key.replace('"', '') + "\"') = ?"
+
+    def save_store(self, data_list: list) -> None:
+        """Sustituye el contenido de la tabla por la lista"""
+        def operacion(conexion):
+            conexion.execute('DELETE FROM "' + self.tabla + '"')
+            for item in data_list:
+                self.__insertar(conexion, item)
+        self.__escribir(operacion)
+
+    def load_store(self) -> list:
+        """Carga el contenido de la tabla en una lista"""
+        return self.__consultar()
+
+    def find_item(self, key_value: str, key=None):
+        """Busca el primer item con item[key]=key_value con una consulta indexada"""
+        items = self.__consultar(self.__condicion_key(key), (key_value,), limite=1)
+        if not items:
+            return None
+        return items[0]
+
+    def iter_items(self, predicate=None):
+        """Devuelve uno a uno los items de la tabla (los que cumplan predicate, si se indica)"""
+        try:
+            # El cursor va leyendo filas de SQLite según se piden, sin cargar la tabla entera
+            cursor = self.__conexion().execute('SELECT data FROM "' + self.tabla + '" ORDER BY seq')
+            for fila in cursor:
+                item = json.loads(fila[0])
+                if predicate is None or predicate(item):
+                    yield item
+        except sqlite3.DatabaseError as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_DB) from exception
+
+    def find_items_list(self, key_value, key=None, stream=False):
+        """Busca todos los items con item[key]=key_value con una consulta indexada
+        (con stream=True devuelve un generador en lugar de una lista)"""
+        if stream:
+            return self.__iterar_consulta(self.__condicion_key(key), (key_value,))
+        return self.__consultar(self.__condicion_key(key), (key_value,))
+
+    def __iterar_consulta(self, condicion: str, parametros):
+        """Devuelve uno a uno los items que cumplen la condición SQL, en orden de inserción"""
+        try:
+            cursor = self.__conexion().execute('SELECT data FROM "' + self.tabla + '" WHERE ' + condicion +
+                                               " ORDER BY seq", parametros)
+            for fila in cursor:
+                yield json.loads(fila[0])
+        except sqlite3.DatabaseError as exception:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_DB) from exception
+
+    def add_item(self, item: object) -> None:
+        """Inserta un item en la tabla"""
+        self.__escribir(lambda conexion: self.__insertar(conexion, self._item_dict(item)))
+
+    def add_items(self, items) -> None:
+        """Inserta varios items en la tabla en una sola transacción"""
+        def operacion(conexion):
+            for item in items:
+                self.__insertar(conexion, self._item_dict(item))
+        self.__escribir(operacion)
+
+    def update_item(self, new_item, key_value):
+        """Sustituye el item con _ID_FIELD=key_value por el nuevo (que pasa al final, como en JsonStore)"""
+        def operacion(conexion):
+            conexion.execute('DELETE FROM "' + self.tabla + '" WHERE id = ?', (key_value,))
+            self.__insertar(conexion, self._item_dict(new_item))
+        self.__escribir(operacion)
+
+    def update_items(self, items) -> None:
+        """Sustituye varios items (por su _ID_FIELD) en una sola transacción"""
+        def operacion(conexion):
+            for item in items:
+                item_dict = self._item_dict(item)
+                conexion.execute('DELETE FROM "' + self.tabla + '" WHERE id = ?', (item_dict[self._ID_FIELD],))
+                self.__insertar(conexion, item_dict)
+        self.__escribir(operacion)
+
+    def delete_item(self, key_value) -> None:
+        """Borra el item con _ID_FIELD=key_value de la tabla"""
+        self.__escribir(lambda conexion: conexion.execute('DELETE FROM "' + self.tabla + '" WHERE id = ?',
+                                                          (key_value,)))
+
+    def borrar_store(self) -> None:
+        """Elimina la tabla del store (la base de datos es compartida con los demás stores)"""
+        if not os.path.isfile(self._DB_PATH):
+            return
+        # No borramos el contador de versiones: una tabla nueva no debe repetir versiones antiguas
+        self.__escribir(lambda conexion: conexion.execute('DROP TABLE IF EXISTS "' + self.tabla + '"'))
+        self.__tabla_creada = False
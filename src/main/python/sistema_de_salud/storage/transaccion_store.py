@@ -0,0 +1,254 @@
+"""Module transaccion_store"""
+import os
+import json
+import uuid
+import threading
+from sistema_de_salud.storage.bloqueo_store import BloqueoStore
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
+
+# Transacción activa en cada hilo
+_local = threading.local()
+
+
+def transaccion_activa():
+    """Devuelve la TransaccionStore activa en el hilo actual, o None"""
+    return getattr(_local, "transaccion", None)
+
+
+def escribir_fichero_atomico(ruta: str, contenido) -> None:
+    """Escribe un fichero completo (str o bytes) en un temporal y lo sustituye de forma atómica con rename"""
+    if isinstance(contenido, str):
+        contenido = contenido.encode("utf-8")
+    # Temporal distinto por proceso e hilo: dos escrituras a la vez no comparten temporal
+    ruta_tmp = ruta + "." + str(os.getpid()) + "_" + str(threading.get_ident()) + ".tmp"
+    with open(ruta_tmp, "wb") as file:
+        file.write(contenido)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(ruta_tmp, ruta)
+
+
+class TransaccionStore:
+    """Unidad de trabajo: agrupa las escrituras de varios stores y las confirma al salir del bloque with.
+    Los bloqueos exclusivos de los stores se mantienen hasta el final y se toman siempre en orden de ruta:
+    los stores que se indican al crearla se bloquean al entrar, en ese orden; después solo se puede
+    bloquear un store si su ruta va detrás de la de todos los ya bloqueados"""
+    # Manifiestos con los renames pendientes de cada confirmación, para terminar una que se interrumpió
+    _MANIFIESTO_DIR = JSON_FILES_PATH
+    _MANIFIESTO_PREFIJO = "transaccion_pendiente_"
+    # Manifiestos de las confirmaciones en curso en este proceso (recuperar() no los toca)
+    __manifiestos_en_curso = set()
+    __lock_en_curso = threading.Lock()
+
+    __ERROR_MESSAGE_ORDEN_BLOQUEOS = ("Bloqueo fuera de orden en la transacción (hay que indicar el store "
+                                      "al crear la TransaccionStore): ")
+
+    def __init__(self, *stores):
+        # ruta -> contenido final del fichero (la última escritura de cada fichero gana)
+        self.__ficheros = {}
+        self.__acciones_confirmar = []
+        self.__acciones_descartar = []
+        self.__acciones_terminar = []
+        self.__anidada = False
+        # Rutas de bloqueo de los stores indicados, que se bloquean al entrar
+        self.__rutas_bloqueo = sorted({store.lock_path for store in stores})
+        # Rutas con bloqueo exclusivo hasta el final de la transacción, en el orden en que se tomaron
+        self.__bloqueos = []
+        # Datos de los stores escritos en la transacción que solo ve ella hasta confirmarla (clave -> datos)
+        self.__pendientes = {}
+
+    def __enter__(self):
+        exterior = transaccion_activa()
+        if exterior is not None:
+            # Una transacción dentro de otra se une a la exterior
+            self.__anidada = True
+            for ruta in self.__rutas_bloqueo:
+                exterior.bloquear(ruta)
+            return exterior
+        self.recuperar()
+        _local.transaccion = self
+        try:
+            for ruta in self.__rutas_bloqueo:
+                self.bloquear(ruta)
+        except BaseException:
+            _local.transaccion = None
+            self.__terminar()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.__anidada:
+            return False
+        _local.transaccion = None
+        if exc_type is None:
+            self.confirmar()
+        else:
+            self.descartar()
+        return False
+
+    def comprobar_orden(self, ruta: str) -> None:
+        """Comprueba que esperar el bloqueo de ruta no rompe el orden global (por ruta) de los bloqueos:
+        con dos transacciones esperándose la una a la otra flock no volvería nunca"""
+        if self.__bloqueos and ruta not in self.__bloqueos and ruta < self.__bloqueos[-1]:
+            raise ExcepcionesGestor(self.__ERROR_MESSAGE_ORDEN_BLOQUEOS + ruta)
+
+    def bloquear(self, ruta: str) -> None:
+        """Toma el bloqueo exclusivo de un store hasta el final de la transacción"""
+        if ruta in self.__bloqueos:
+            return
+        self.comprobar_orden(ruta)
+        bloqueo = BloqueoStore(ruta, exclusivo=True)
+        bloqueo.adquirir()
+        self.__bloqueos.append(ruta)
+        self.al_terminar(bloqueo.liberar)
+
+    def registrar_fichero(self, ruta: str, contenido) -> None:
+        """Guarda el contenido (str o bytes) con el que se escribirá un fichero al confirmar"""
+        if isinstance(contenido, str):
+            contenido = contenido.encode("utf-8")
+        self.__ficheros[ruta] = contenido
+
+    def pendiente(self, clave: str):
+        """Datos de un store escritos en esta transacción y aún no confirmados (clave: ruta de su fichero), o None"""
+        return self.__pendientes.get(clave)
+
+    def guardar_pendiente(self, clave: str, datos, publicar) -> None:
+        """Guarda datos de un store que solo ve esta transacción. Al confirmarla se ejecuta publicar(datos)
+        con los últimos datos guardados, para pasarlos a la caché compartida del store"""
+        if clave not in self.__pendientes:
+            self.al_confirmar(lambda: publicar(self.__pendientes[clave]))
+        self.__pendientes[clave] = datos
+
+    def al_confirmar(self, accion) -> None:
+        """Registra una acción a ejecutar después de escribir los ficheros (una sola vez por acción)"""
+        if accion not in self.__acciones_confirmar:
+            self.__acciones_confirmar.append(accion)
+
+    def al_descartar(self, accion) -> None:
+        """Registra una acción a ejecutar si la transacción se descarta (una sola vez por acción)"""
+        if accion not in self.__acciones_descartar:
+            self.__acciones_descartar.append(accion)
+
+    def al_terminar(self, accion) -> None:
+        """Registra una acción a ejecutar al final, tanto si se confirma como si se descarta (p. ej. liberar bloqueos)"""
+        self.__acciones_terminar.append(accion)
+
+    def __terminar(self) -> None:
+        """Ejecuta las acciones de final de transacción"""
+        acciones, self.__acciones_terminar = self.__acciones_terminar, []
+        self.__bloqueos = []
+        for accion in acciones:
+            accion()
+
+    def confirmar(self) -> None:
+        """Escribe cada fichero modificado una sola vez y ejecuta las acciones de confirmación"""
+        # Temporales y manifiesto con nombres propios de esta confirmación
+        identificador = str(os.getpid()) + "_" + uuid.uuid4().hex
+        renames = []
+        try:
+            # Fase 1: escribimos todos los temporales
+            for ruta, contenido in self.__ficheros.items():
+                renames.append((ruta + "." + identificador + ".tx", ruta))
+                with open(renames[-1][0], "wb") as file:
+                    file.write(contenido)
+                    file.flush()
+                    os.fsync(file.fileno())
+        except OSError:
+            for ruta_tmp, _ in renames:
+                if os.path.isfile(ruta_tmp):
+                    os.remove(ruta_tmp)
+            self.descartar()
+            raise
+        # Fase 2: a partir del manifiesto la transacción se considera confirmada.
+        # Pase lo que pase se liberan los bloqueos; si falla un rename el manifiesto queda para recuperar()
+        manifiesto_path = self._MANIFIESTO_DIR + self._MANIFIESTO_PREFIJO + identificador + ".json"
+        with self.__lock_en_curso:
+            self.__manifiestos_en_curso.add(manifiesto_path)
+        try:
+            if len(renames) > 1:
+                escribir_fichero_atomico(manifiesto_path, json.dumps({"pid": os.getpid(), "bloqueos": self.__bloqueos,
+                                                                      "renames": renames}))
+            for ruta_tmp, ruta in renames:
+                os.replace(ruta_tmp, ruta)
+            if len(renames) > 1:
+                os.remove(manifiesto_path)
+            for accion in self.__acciones_confirmar:
+                accion()
+        finally:
+            with self.__lock_en_curso:
+                self.__manifiestos_en_curso.discard(manifiesto_path)
+            self.__terminar()
+
+    def descartar(self) -> None:
+        """Descarta las escrituras pendientes"""
+        self.__ficheros = {}
+        self.__pendientes = {}
+        try:
+            for accion in self.__acciones_descartar:
+                accion()
+        finally:
+            self.__terminar()
+
+    @classmethod
+    def recuperar(cls) -> None:
+        """Termina los renames de las confirmaciones que se interrumpieron a medias"""
+        if transaccion_activa() is not None:
+            # Con bloqueos tomados en este hilo no se puede recuperar sin romper su orden
+            return
+        try:
+            nombres = [entrada.name for entrada in os.scandir(cls._MANIFIESTO_DIR)
+                       if entrada.name.startswith(cls._MANIFIESTO_PREFIJO) and entrada.name.endswith(".json")]
+        except FileNotFoundError:
+            return
+        for nombre in nombres:
+            cls.__recuperar_manifiesto(cls._MANIFIESTO_DIR + nombre)
+
+    @classmethod
+    def __recuperar_manifiesto(cls, manifiesto_path: str) -> None:
+        """Termina una confirmación interrumpida si su dueño ya no la está haciendo"""
+        with cls.__lock_en_curso:
+            if manifiesto_path in cls.__manifiestos_en_curso:
+                # La está confirmando otro hilo de este proceso
+                return
+        try:
+            with open(manifiesto_path, "r", encoding="utf-8", newline="") as file:
+                manifiesto = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if manifiesto["pid"] != os.getpid() and _proceso_vivo(manifiesto["pid"]):
+            # El proceso que la confirma sigue en marcha
+            return
+        # Con los bloqueos de sus stores nadie más la está terminando ni usando sus ficheros.
+        # No esperamos por ellos: si están ocupados se terminará en otra llamada
+        bloqueos = []
+        try:
+            for ruta in sorted(manifiesto["bloqueos"]):
+                bloqueo = BloqueoStore(ruta, exclusivo=True)
+                if not bloqueo.intentar_adquirir():
+                    return
+                bloqueos.append(bloqueo)
+            if not os.path.isfile(manifiesto_path):
+                return
+            for ruta_tmp, ruta in manifiesto["renames"]:
+                if os.path.isfile(ruta_tmp):
+                    os.replace(ruta_tmp, ruta)
+            os.remove(manifiesto_path)
+        finally:
+            for bloqueo in reversed(bloqueos):
+                bloqueo.liberar()
+
+
+def _proceso_vivo(pid: int) -> bool:
+    """Comprueba si existe un proceso con ese pid"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe, pero es de otro usuario
+        return True
+    except OSError:
+        # Sin señales (Windows): lo damos por vivo
+        return True
+    return True
@@ -0,0 +1,39 @@
+"""Configuración común de las pruebas"""
+import os
+import sys
+import tempfile
+
+# La configuración calcula las rutas de los ficheros a partir de HOME al importarse:
+# las pruebas usan una carpeta temporal propia en lugar de la del usuario
+_HOME_PRUEBAS = tempfile.mkdtemp(prefix="cripto_23_pruebas_")
+os.environ["HOME"] = _HOME_PRUEBAS
+for _carpeta in ("JsonFiles", "Keys", "Cert"):
+    os.makedirs(os.path.join(_HOME_PRUEBAS, "PycharmProjects", "cripto_23", "src", _carpeta))
+
+# Mismas rutas de importación que en el proyecto: la carpeta python y el paquete (imports sin paquete)
+_PYTHON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "main", "python")
+sys.path.insert(0, os.path.join(_PYTHON_PATH, "sistema_de_salud"))
+sys.path.insert(0, _PYTHON_PATH)
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def crear_store(tmp_path):
+    """Crea stores de prueba de un motor (JsonStore, JournalStore...) con sus ficheros en tmp_path"""
+    def crear(motor, nombre: str = "store_prueba", **atributos):
+        atributos.setdefault("_FILE_PATH", str(tmp_path / (nombre + ".json")))
+        atributos.setdefault("_ID_FIELD", "id")
+        # El motor sqlite guarda todas las tablas en una base de datos propia de la prueba
+        atributos.setdefault("_DB_PATH", str(tmp_path / "store.db"))
+        return type(nombre.title().replace("_", ""), (motor,), atributos)()
+    return crear
+
+
+@pytest.fixture(scope="session")
+def centro_salud():
+    """Gestor con el sistema preparado: Autoridades de Certificación, pacientes y médicos iniciales"""
+    from sistema_de_salud.gestor_centro_salud import GestorCentroSalud
+    gestor = GestorCentroSalud()
+    gestor.preparacion_sistema()
+    return gestor
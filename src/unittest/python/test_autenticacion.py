@@ -0,0 +1,63 @@
+"""Pruebas de la comprobación de contraseñas y de la autenticación de pacientes y médicos"""
+import asyncio
+import pytest
+
+from sistema_de_salud import criptografia
+from sistema_de_salud.criptografia import Criptografia
+from sistema_de_salud.storage.autenticacion_json_store import AutenticacionJsonStore
+
+USUARIO_REHASH = "K0000001"
+# Parámetros distintos de los actuales y baratos de derivar
+KDF_NUEVA = {"algoritmo": "pbkdf2_sha256", "iteraciones": 1000}
+
+
+@pytest.fixture
+def credencial_obsoleta(monkeypatch):
+    """Usuario con una credencial derivada con unos parámetros KDF que ya no son los actuales"""
+    Criptografia().guardar_password(USUARIO_REHASH, "clave")
+    monkeypatch.setattr(criptografia, "parametros_kdf_actuales", lambda: KDF_NUEVA)
+    yield
+    AutenticacionJsonStore().delete_item(USUARIO_REHASH)
+
+
+def _kdf_guardada() -> dict:
+    return AutenticacionJsonStore().find_item(USUARIO_REHASH)[Criptografia.KEY_LABEL_USER_KDF]
+
+
+def test_comprobar_password_futuro_termina_con_el_rehash_guardado(credencial_obsoleta):
+    assert Criptografia().comprobar_password_futuro(USUARIO_REHASH, "clave").result() is True
+    assert _kdf_guardada() == KDF_NUEVA
+    assert Criptografia().comprobar_password_futuro(USUARIO_REHASH, "clave").result() is True
+    assert Criptografia().comprobar_password_futuro(USUARIO_REHASH, "otra").result() is False
+
+
+def test_error_del_rehash_llega_al_futuro(credencial_obsoleta, monkeypatch):
+    def update_item_con_error(item, id_item):
+        raise OSError("Disco lleno")
+
+    monkeypatch.setattr(AutenticacionJsonStore(), "update_item", update_item_con_error)
+    with pytest.raises(OSError):
+        Criptografia().comprobar_password_futuro(USUARIO_REHASH, "clave").result()
+    monkeypatch.undo()
+    assert _kdf_guardada() != KDF_NUEVA
+
+
+@pytest.mark.parametrize("tipo_usuario, id_usuario, password", [("paciente", "54026189V", "12345ABC"),
+                                                                 ("medico", "84202258V", "1234asdf")])
+def test_autenticacion(centro_salud, tipo_usuario, id_usuario, password):
+    autenticar = getattr(centro_salud, "autenticacion_" + tipo_usuario)
+    autenticar_async = getattr(centro_salud, "autenticacion_" + tipo_usuario + "_async")
+    for argumentos, esperado in [((id_usuario, password), 0), ((id_usuario, password + "x"), 2),
+                                 (("00000000X", password), 1)]:
+        assert autenticar(*argumentos) == esperado
+        assert asyncio.run(autenticar_async(*argumentos)) == esperado
+
+
+def test_autenticacion_async_concurrente(centro_salud):
+    async def autenticar_todos():
+        return await asyncio.gather(centro_salud.autenticacion_paciente_async("54026189V", "12345ABC"),
+                                    centro_salud.autenticacion_paciente_async("58849111T", "otra"),
+                                    centro_salud.autenticacion_medico_async("76281872A", "1234asdf"),
+                                    centro_salud.autenticacion_medico_async("54026189V", "12345ABC"))
+    # Un paciente no se autentica como médico
+    assert asyncio.run(autenticar_todos()) == [0, 2, 0, 1]
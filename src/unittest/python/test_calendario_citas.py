@@ -0,0 +1,172 @@
+"""Pruebas del índice (médico, día) de store_citas y del calendario de huecos libres"""
+import os
+import json
+from datetime import datetime, date, timedelta
+import pytest
+
+from sistema_de_salud.calendario_citas import CalendarioCitas
+from sistema_de_salud.storage.cita_json_store import CitaJsonStore
+from sistema_de_salud.storage.medico_json_store import MedicoJsonStore
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+from sistema_de_salud.cfg.gestor_centro_salud_config import JSON_FILES_PATH
+
+INDICE_FILE_PATH = JSON_FILES_PATH + "store_citas_indice_medico_dia.json"
+ESPECIALIDAD = "Especialidad de prueba"
+MEDICOS = ("M0000001", "M0000002")
+# Con el horario por defecto (08:00 a 15:00, huecos de 30 minutos) hay 14 huecos al día
+HUECOS_DIA = 14
+DIA = date(2040, 1, 10)
+
+
+@pytest.fixture
+def store_citas():
+    """store_citas vacío, con dos médicos de una especialidad propia de la prueba"""
+    store = CitaJsonStore()
+    store.borrar_store()
+    for id_medico in MEDICOS:
+        MedicoJsonStore().add_item({"_RegistroMedico__id_medico": id_medico,
+                                    "_RegistroMedico__especialidad": ESPECIALIDAD})
+    yield store
+    for id_medico in MEDICOS:
+        MedicoJsonStore().delete_item(id_medico)
+    store.borrar_store()
+
+
+def _cita(identificador: str, id_medico: str, fecha_hora: datetime, estado: str = "Activa") -> dict:
+    return {"_CitaMedica__identificador_cita": identificador, "_CitaMedica__id_medico": id_medico,
+            "_CitaMedica__fecha_hora": fecha_hora.strftime("%Y-%m-%d %H:%M:%S"), "_CitaMedica__estado_cita": estado}
+
+
+def _a_las(hora: int, minuto: int = 0, dia: date = DIA) -> datetime:
+    return datetime(dia.year, dia.month, dia.day, hora, minuto)
+
+
+def _otro_proceso(store):
+    """Store con el mismo motor y fichero que store_citas pero sin su índice, como el de otro proceso"""
+    atributos = {"_FILE_PATH": store._FILE_PATH, "_ID_FIELD": store._ID_FIELD,
+                 "_INDEX_FIELDS": store._INDEX_FIELDS, "_PARTITION_FIELD": store._PARTITION_FIELD}
+    return type("OtroProceso", (type(store).__bases__[0],), atributos)()
+
+
+def test_bitmap_de_huecos_ocupados(store_citas):
+    store_citas.add_items([_cita("c1", MEDICOS[0], _a_las(8)), _cita("c2", MEDICOS[0], _a_las(9, 30)),
+                           _cita("c3", MEDICOS[1], _a_las(8))])
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 0b1001
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[1], str(DIA)) == 0b1
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA + timedelta(days=1))) == 0
+
+
+def test_bitmap_se_actualiza_con_cada_escritura(store_citas):
+    store_citas.add_item(_cita("c1", MEDICOS[0], _a_las(8)))
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 0b1
+    store_citas.add_item(_cita("c2", MEDICOS[0], _a_las(8, 30)))
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 0b11
+    store_citas.update_item(_cita("c1", MEDICOS[0], _a_las(8), "Cancelada"), "c1")
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 0b10
+    store_citas.delete_item("c2")
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 0
+
+
+def test_hueco_sigue_ocupado_mientras_quede_una_cita_activa(store_citas):
+    store_citas.add_items([_cita("c1", MEDICOS[0], _a_las(10)), _cita("c2", MEDICOS[0], _a_las(10))])
+    store_citas.update_item(_cita("c1", MEDICOS[0], _a_las(10), "Cancelada"), "c1")
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 1 << 4
+
+
+def test_cita_fuera_del_horario_no_ocupa_hueco(store_citas):
+    store_citas.add_items([_cita("c1", MEDICOS[0], _a_las(8, 15)), _cita("c2", MEDICOS[0], _a_las(16))])
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 0
+    # Aunque no ocupen hueco, siguen en el índice (médico, día)
+    assert len(store_citas.buscar_citas_activas_medico_fecha_store(MEDICOS[0], str(DIA) + " 00:00:00")) == 2
+
+
+def test_indice_se_reconstruye_tras_una_escritura_externa(store_citas):
+    store_citas.add_item(_cita("c1", MEDICOS[0], _a_las(8)))
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 0b1
+    # Otro proceso añade una cita y cancela otra sin actualizar el índice
+    externo = _otro_proceso(store_citas)
+    externo.add_item(_cita("c2", MEDICOS[0], _a_las(9)))
+    externo.update_item(_cita("c1", MEDICOS[0], _a_las(8), "Cancelada"), "c1")
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 0b100
+    assert [cita["_CitaMedica__identificador_cita"] for cita in
+            store_citas.buscar_citas_activas_medico_fecha_hora_store(MEDICOS[0], str(DIA) + " 09:00:00")] == ["c2"]
+    assert store_citas.buscar_citas_activas_medico_fecha_hora_store(MEDICOS[0], str(DIA) + " 08:00:00") == []
+
+
+def test_indice_reconstruido_se_guarda_con_la_version_del_store(store_citas):
+    store_citas.add_item(_cita("c1", MEDICOS[0], _a_las(8)))
+    _otro_proceso(store_citas).add_item(_cita("c2", MEDICOS[1], _a_las(8)))
+    store_citas.huecos_ocupados_medico_dia(MEDICOS[1], str(DIA))
+    with open(INDICE_FILE_PATH, "r", encoding="utf-8") as file:
+        indice = json.load(file)
+    assert indice["version"] == json.loads(json.dumps(store_citas.version_store()))
+    assert sorted(indice["indice"]) == sorted(MEDICOS)
+
+
+@pytest.mark.parametrize("contenido", [None, "{corrupto", '{"version": [0, 0, 0], "indice": {}}'])
+def test_indice_borrado_corrupto_u_obsoleto_se_reconstruye(store_citas, contenido):
+    store_citas.add_item(_cita("c1", MEDICOS[0], _a_las(8)))
+    # Un store nuevo (otro proceso) solo tiene el fichero del índice
+    externo = _otro_proceso(store_citas)
+    externo.add_item(_cita("c2", MEDICOS[0], _a_las(8, 30)))
+    if contenido is None:
+        os.remove(INDICE_FILE_PATH)
+    else:
+        with open(INDICE_FILE_PATH, "w", encoding="utf-8") as file:
+            file.write(contenido)
+    assert store_citas.huecos_ocupados_medico_dia(MEDICOS[0], str(DIA)) == 0b11
+
+
+def test_calendario_ve_las_escrituras_externas(store_citas):
+    calendario = CalendarioCitas()
+    assert len(calendario.huecos_libres(MEDICOS[0], DIA)) == HUECOS_DIA
+    assert calendario.hueco_libre(MEDICOS[0], _a_las(11))
+    _otro_proceso(store_citas).add_item(_cita("c1", MEDICOS[0], _a_las(11)))
+    assert len(calendario.huecos_libres(MEDICOS[0], DIA)) == HUECOS_DIA - 1
+    assert not calendario.hueco_libre(MEDICOS[0], _a_las(11))
+    # Una hora que no es el inicio de un hueco nunca está libre
+    assert not calendario.hueco_libre(MEDICOS[0], _a_las(11, 10))
+
+
+def test_primeros_huecos_libres_de_la_especialidad(store_citas):
+    store_citas.add_items([_cita("c" + str(hueco), MEDICOS[0], _a_las(8) + timedelta(minutes=30 * hueco))
+                           for hueco in range(HUECOS_DIA)])
+    store_citas.add_item(_cita("c_otro", MEDICOS[1], _a_las(8)))
+    huecos = CalendarioCitas().primeros_huecos_libres(ESPECIALIDAD, _a_las(0), _a_las(0) + timedelta(days=2), 3)
+    # El primer médico tiene el día completo: los primeros huecos son del segundo
+    assert huecos == [(_a_las(8, 30), MEDICOS[1]), (_a_las(9), MEDICOS[1]), (_a_las(9, 30), MEDICOS[1])]
+
+
+def test_primeros_huecos_libres_mezcla_los_medicos_en_orden(store_citas):
+    huecos = CalendarioCitas().primeros_huecos_libres(ESPECIALIDAD, _a_las(14), _a_las(0) + timedelta(days=2), 4)
+    siguiente_dia = DIA + timedelta(days=1)
+    assert huecos == [(_a_las(14), MEDICOS[0]), (_a_las(14), MEDICOS[1]),
+                      (_a_las(14, 30), MEDICOS[0]), (_a_las(14, 30), MEDICOS[1])]
+    huecos = CalendarioCitas().primeros_huecos_libres(ESPECIALIDAD, _a_las(15), _a_las(0) + timedelta(days=2), 1)
+    assert huecos == [(_a_las(8, dia=siguiente_dia), MEDICOS[0])]
+
+
+def test_primeros_huecos_libres_no_devuelve_huecos_pasados(store_citas):
+    ahora = datetime.now()
+    huecos = CalendarioCitas().primeros_huecos_libres(ESPECIALIDAD, ahora - timedelta(days=30),
+                                                      ahora + timedelta(days=7), 5)
+    assert len(huecos) == 5
+    assert all(fecha_hora >= ahora for fecha_hora, _ in huecos)
+    assert CalendarioCitas().primeros_huecos_libres(ESPECIALIDAD, ahora - timedelta(days=30),
+                                                    ahora - timedelta(days=1), 5) == []
+
+
+@pytest.mark.parametrize("hora, minuto", [(9, 7), (3, 0), (15, 0)])
+def test_no_se_reservan_citas_fuera_de_los_huecos_del_horario(centro_salud, hora, minuto):
+    id_medico, dia = "84202258V", date(2042, 5, 6)
+    fecha_hora = _a_las(hora, minuto, dia)
+    argumentos = {"id_medico": id_medico, "especialidad": "Pediatria", "fecha_hora": fecha_hora,
+                  "id_paciente": "54026189V", "telefono_paciente": "+34666888166", "motivo_consulta": "Revision"}
+    calendario = CalendarioCitas()
+    with pytest.raises(ExcepcionesGestor):
+        centro_salud.registro_cita(**argumentos)
+    resultados = centro_salud.registro_citas_lote([argumentos])
+    assert resultados[0]["identificador_cita"] is None
+    assert fecha_hora.strftime("%Y-%m-%d %H:%M:%S") in resultados[0]["error"]
+    assert CitaJsonStore().buscar_citas_activas_medico_fecha_store(id_medico, str(dia) + " 00:00:00") == []
+    assert len(calendario.huecos_libres(id_medico, dia)) == HUECOS_DIA
@@ -0,0 +1,151 @@
+"""Pruebas de los codecs de los ficheros store"""
+import io
+import json
+import pytest
+
+from sistema_de_salud.storage import json_store
+from sistema_de_salud.storage.json_store import CODECS_STORE
+from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.json_store import obtener_codec
+from sistema_de_salud.storage.json_store import detectar_codec
+from sistema_de_salud.storage.json_store import convertir_fichero_store
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+
+# Items con todos los tipos que aparecen en los stores: textos cifrados en hexadecimal, textos que
+# parecen hexadecimales pero no lo son, listas y diccionarios anidados
+ITEMS = [
+    {"id": "54026189V", "nombre": "Isabel Gómez Rivas", "edad": 41, "activo": True, "baja": None,
+     "salt": "9f" * 16, "hash": "0123456789abcdef" * 4, "mis_citas": []},
+    {"id": "84202258V", "cifrado": "ab" * 256, "corto": "abcd", "mayusculas": "AB" * 20,
+     "impar": "a" * 33, "float": 0.1, "negativo": -2 ** 63, "falso": False,
+     "mis_citas": [{"id": "c1", "datos": ["x", 1, None, {"anidado": "ff" * 16}]}]},
+    {"id": "vacio", "texto": "", "lista": [], "diccionario": {}},
+]
+
+NOMBRES_CODECS = sorted(CODECS_STORE)
+
+
+def _codec(nombre: str):
+    """Devuelve un codec, saltando la prueba si necesita un paquete opcional no instalado"""
+    if nombre == "msgpack" and json_store.msgpack is None:
+        pytest.skip("msgpack no está instalado")
+    return obtener_codec(nombre)
+
+
+@pytest.mark.parametrize("nombre", NOMBRES_CODECS)
+@pytest.mark.parametrize("items", [ITEMS, [], ITEMS[:1]], ids=["varios", "vacio", "uno"])
+def test_serializar_deserializar_devuelve_los_mismos_items(nombre, items):
+    codec = _codec(nombre)
+    assert codec.deserializar(codec.serializar(items)) == items
+
+
+@pytest.mark.parametrize("nombre", NOMBRES_CODECS)
+def test_iterar_devuelve_los_mismos_items(nombre):
+    codec = _codec(nombre)
+    assert list(codec.iterar(io.BytesIO(codec.serializar(ITEMS)))) == ITEMS
+
+
+@pytest.mark.parametrize("nombre", NOMBRES_CODECS)
+def test_detectar_codec(nombre):
+    codec = _codec(nombre)
+    detectado = detectar_codec(codec.serializar(ITEMS))
+    # Los tres formatos Json se leen con el mismo codec
+    assert detectado.deserializar(codec.serializar(ITEMS)) == ITEMS
+    if nombre in ("msgpack", "binario"):
+        assert detectado is codec
+
+
+def test_codec_desconocido():
+    with pytest.raises(ExcepcionesGestor):
+        obtener_codec("xml")
+
+
+def test_binario_no_serializa_tipos_desconocidos():
+    with pytest.raises(TypeError):
+        obtener_codec("binario").serializar([{"id": object()}])
+
+
+def test_binario_enteros_de_mas_de_64_bits():
+    items = [{"id": "grande", "valores": [2 ** 63, -2 ** 63 - 1, 2 ** 80]}]
+    codec = obtener_codec("binario")
+    assert codec.deserializar(codec.serializar(items)) == items
+
+
+def test_binario_ocupa_menos_que_json_con_textos_cifrados():
+    items = [{"id": str(numero), "cifrado": "ab" * 256} for numero in range(10)]
+    assert len(obtener_codec("binario").serializar(items)) < len(obtener_codec("json_compacto").serializar(items))
+
+
+@pytest.mark.parametrize("origen", NOMBRES_CODECS)
+@pytest.mark.parametrize("destino", NOMBRES_CODECS)
+def test_convertir_fichero_store(tmp_path, origen, destino):
+    ruta = tmp_path / "store.json"
+    ruta.write_bytes(_codec(origen).serializar(ITEMS))
+    convertir_fichero_store(str(ruta), _codec(destino).NOMBRE)
+    assert detectar_codec(ruta.read_bytes()).deserializar(ruta.read_bytes()) == ITEMS
+
+
+@pytest.mark.parametrize("nombre", NOMBRES_CODECS)
+def test_store_lee_ficheros_en_cualquier_codec(crear_store, nombre):
+    store = crear_store(JsonStore)
+    with open(store._FILE_PATH, "wb") as file:
+        file.write(_codec(nombre).serializar(ITEMS))
+    assert store.load_store() == ITEMS
+    assert store.find_item("84202258V") == ITEMS[1]
+
+
+# Items con textos que contienen los separadores del array, caracteres de varios bytes y listas anidadas:
+# al cortar el fichero en bloques pueden quedar partidos en cualquier posición
+ITEMS_SEPARADORES = [
+    {"id": "a", "texto": "], [, {\"falso\": 1}"},
+    {"id": "ñ", "texto": "Gómez – 💉", "lista": [[1, 2], [], [[3]]]},
+    {"id": "b" * 70, "vacio": {}},
+]
+
+
+@pytest.mark.parametrize("nombre", ["json", "json_lineas", "json_compacto"])
+def test_iterar_json_en_todos_los_tamanos_de_bloque(nombre):
+    contenido = obtener_codec(nombre).serializar(ITEMS_SEPARADORES)
+    for tamano_bloque in range(1, len(contenido) + 2):
+        items = list(obtener_codec("json").iterar(io.BytesIO(contenido), tamano_bloque))
+        assert items == ITEMS_SEPARADORES, tamano_bloque
+
+
+@pytest.mark.parametrize("contenido", [b"[]", b"  \n[ ]\n", b"[\n]\n"])
+def test_iterar_json_array_vacio(contenido):
+    for tamano_bloque in (1, 2, 64):
+        assert list(obtener_codec("json").iterar(io.BytesIO(contenido), tamano_bloque)) == []
+
+
+@pytest.mark.parametrize("contenido", [b'{"id": "a"}', b"", b"  "])
+def test_iterar_json_sin_array(contenido):
+    with pytest.raises(json.JSONDecodeError):
+        list(obtener_codec("json").iterar(io.BytesIO(contenido), 4))
+
+
+def test_iterar_json_fichero_cortado():
+    contenido = obtener_codec("json_lineas").serializar(ITEMS_SEPARADORES)
+    items = obtener_codec("json").iterar(io.BytesIO(contenido[:-10]), 8)
+    # Los items completos se entregan antes de encontrar el corte
+    assert next(items) == ITEMS_SEPARADORES[0]
+    with pytest.raises(json.JSONDecodeError):
+        list(items)
+
+
+def test_iter_items_sin_cache_lee_el_fichero_en_streaming(crear_store):
+    store = crear_store(JsonStore)
+    items = [{"id": str(numero), "par": numero % 2 == 0} for numero in range(1000)]
+    with open(store._FILE_PATH, "wb") as file:
+        file.write(obtener_codec("json").serializar(items))
+    assert list(store.iter_items()) == items
+    assert list(store.iter_items(lambda item: item["par"])) == items[::2]
+    assert store.find_item(False, "par") == items[1]
+    assert store.find_items_list("7") == [items[7]]
+
+
+def test_iter_items_fichero_corrupto(crear_store):
+    store = crear_store(JsonStore)
+    with open(store._FILE_PATH, "wb") as file:
+        file.write(b'[{"id": "a"}, {"id": ')
+    with pytest.raises(ExcepcionesGestor):
+        list(store.iter_items())
@@ -0,0 +1,147 @@
+"""Pruebas de los motores de almacenamiento: todos deben dar los mismos resultados que JsonStore"""
+import os
+import pytest
+
+from sistema_de_salud.storage.motor_store import MOTORES_STORE
+from sistema_de_salud.storage.motor_store import obtener_motor_store
+from sistema_de_salud.storage.transaccion_store import TransaccionStore
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+
+NOMBRES_MOTORES = sorted(MOTORES_STORE)
+
+
+@pytest.fixture(autouse=True)
+def manifiestos(tmp_path, monkeypatch):
+    """Los manifiestos de las confirmaciones se escriben en la carpeta de la prueba"""
+    monkeypatch.setattr(TransaccionStore, "_MANIFIESTO_DIR", str(tmp_path) + "/")
+
+
+def _crear(crear_store, nombre_motor: str, nombre: str = "store_citas"):
+    """Store de citas de prueba, con un índice por médico para los motores que los crean"""
+    return crear_store(obtener_motor_store(nombre_motor), nombre, _INDEX_FIELDS=("medico",))
+
+
+def _cita(identificador: str, medico: str, estado: str = "Activa") -> dict:
+    return {"id": identificador, "medico": medico, "estado": estado, "datos": {"motivo": "m" + identificador}}
+
+
+def _consultas(store) -> dict:
+    """Resultados de todas las consultas de la interfaz de JsonStore"""
+    return {
+        "load_store": store.load_store(),
+        "iter_items": list(store.iter_items()),
+        "iter_items_filtro": list(store.iter_items(lambda item: item["estado"] == "Activa")),
+        "find_item": [store.find_item(identificador) for identificador in ("1", "2", "3", "4", "5", "no")],
+        "find_item_indice": store.find_item("medico_b", "medico"),
+        "find_item_sin_indice": store.find_item("Cancelada", "estado"),
+        "find_items_list_indice": store.find_items_list("medico_a", "medico"),
+        "find_items_list_sin_indice": store.find_items_list("Activa", "estado"),
+        "find_items_list_id": store.find_items_list("2"),
+        "find_items_list_stream": list(store.find_items_list("medico_a", "medico", stream=True)),
+    }
+
+
+def _operaciones(store) -> list:
+    """Aplica la misma secuencia de escrituras a un store y devuelve las consultas tras cada paso"""
+    resultados = [_consultas(store)]
+    store.add_item(_cita("1", "medico_a"))
+    store.add_items([_cita("2", "medico_b"), _cita("3", "medico_a"), _cita("4", "medico_c")])
+    resultados.append(_consultas(store))
+    # El item actualizado pasa al final
+    store.update_item(_cita("1", "medico_b", "Cancelada"), "1")
+    resultados.append(_consultas(store))
+    store.update_items([_cita("3", "medico_c"), _cita("2", "medico_a", "Cancelada")])
+    store.delete_item("4")
+    store.delete_item("no")
+    resultados.append(_consultas(store))
+    with TransaccionStore(store):
+        store.add_item(_cita("5", "medico_a"))
+        store.update_item(_cita("3", "medico_b"), "3")
+        store.delete_item("1")
+    resultados.append(_consultas(store))
+    with pytest.raises(RuntimeError):
+        with TransaccionStore(store):
+            store.delete_item("5")
+            raise RuntimeError
+    resultados.append(_consultas(store))
+    store.save_store([_cita("4", "medico_c"), _cita("2", "medico_a")])
+    resultados.append(_consultas(store))
+    return resultados
+
+
+@pytest.fixture
+def resultados_json(crear_store):
+    """Resultados del motor de referencia, JsonStore"""
+    return _operaciones(_crear(crear_store, "json", "store_referencia"))
+
+
+@pytest.mark.parametrize("nombre_motor", NOMBRES_MOTORES)
+def test_motores_devuelven_lo_mismo_que_json(crear_store, resultados_json, nombre_motor):
+    resultados = _operaciones(_crear(crear_store, nombre_motor))
+    for paso, (obtenido, esperado) in enumerate(zip(resultados, resultados_json)):
+        assert obtenido == esperado, paso
+
+
+@pytest.mark.parametrize("nombre_motor", NOMBRES_MOTORES)
+def test_motores_releen_lo_guardado(crear_store, nombre_motor):
+    store = _crear(crear_store, nombre_motor)
+    _operaciones(store)
+    # Otra instancia del store, sin la memoria de la primera, lee lo mismo
+    assert _consultas(_crear(crear_store, nombre_motor)) == _consultas(store)
+
+
+@pytest.mark.parametrize("nombre_motor", NOMBRES_MOTORES)
+def test_version_store_cambia_con_cada_escritura(crear_store, nombre_motor):
+    store = _crear(crear_store, nombre_motor)
+    versiones = [store.version_store()]
+    store.add_item(_cita("1", "medico_a"))
+    versiones.append(store.version_store())
+    store.update_item(_cita("1", "medico_b"), "1")
+    versiones.append(store.version_store())
+    store.delete_item("1")
+    versiones.append(store.version_store())
+    assert len(set(map(str, versiones))) == len(versiones)
+
+
+@pytest.mark.parametrize("nombre_motor", NOMBRES_MOTORES)
+def test_los_items_devueltos_son_copias(crear_store, nombre_motor):
+    store = _crear(crear_store, nombre_motor)
+    store.add_item(_cita("1", "medico_a"))
+    store.find_item("1")["datos"]["motivo"] = "cambiado"
+    store.load_store()[0]["datos"]["motivo"] = "cambiado"
+    next(store.iter_items())["datos"]["motivo"] = "cambiado"
+    assert store.find_item("1") == _cita("1", "medico_a")
+
+
+@pytest.mark.parametrize("nombre_motor", NOMBRES_MOTORES)
+def test_borrar_store(crear_store, nombre_motor):
+    store = _crear(crear_store, nombre_motor)
+    store.add_items([_cita("1", "medico_a"), _cita("2", "medico_b")])
+    store.borrar_store()
+    assert store.load_store() == []
+    assert store.find_item("1") is None
+    store.add_item(_cita("3", "medico_a"))
+    assert store.load_store() == [_cita("3", "medico_a")]
+
+
+def test_motor_desconocido():
+    with pytest.raises(ExcepcionesGestor):
+        obtener_motor_store("csv")
+
+
+def test_journal_lee_el_fichero_store_de_otro_motor(crear_store):
+    # Datos guardados con el motor json antes de cambiar STORE_ENGINE a "journal"
+    citas = [_cita("1", "medico_a"), _cita("2", "medico_b")]
+    _crear(crear_store, "json").add_items(citas)
+    store = _crear(crear_store, "journal")
+    assert store.load_store() == citas
+    assert store.find_items_list("medico_a", "medico") == [citas[0]]
+    store.add_item(_cita("3", "medico_a"))
+    # El log creado a partir del fichero es el que leen las instancias siguientes
+    assert _crear(crear_store, "journal").load_store() == citas + [_cita("3", "medico_a")]
+
+
+def test_journal_sin_fichero_store_no_crea_log(crear_store):
+    store = _crear(crear_store, "journal")
+    assert store.load_store() == []
+    assert not os.path.isfile(store.journal_path)
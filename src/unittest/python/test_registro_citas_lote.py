@@ -0,0 +1,94 @@
+"""Pruebas de GestorCentroSalud.registro_citas_lote"""
+from datetime import datetime
+import pytest
+
+from sistema_de_salud.gestor_centro_salud import GestorCentroSalud
+from sistema_de_salud.calendario_citas import CalendarioCitas
+from sistema_de_salud.storage.cita_json_store import CitaJsonStore
+
+PACIENTE = ("54026189V", "+34666888166")
+OTRO_PACIENTE = ("58849111T", "+34111555888")
+MEDICO = ("84202258V", "Pediatria")
+OTRO_MEDICO = ("76281872A", "Atencion Primaria")
+
+
+def _solicitud(hora: int, paciente=PACIENTE, medico=MEDICO, dia: int = 1, motivo: str = "Revision") -> dict:
+    return {"id_medico": medico[0], "especialidad": medico[1], "fecha_hora": datetime(2041, 3, dia, hora, 0),
+            "id_paciente": paciente[0], "telefono_paciente": paciente[1], "motivo_consulta": motivo}
+
+
+def _activas(id_medico: str, fecha_hora: datetime) -> list:
+    return CitaJsonStore().buscar_citas_activas_medico_fecha_hora_store(id_medico,
+                                                                        fecha_hora.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def test_registra_las_solicitudes_correctas(centro_salud):
+    solicitudes = [_solicitud(8), _solicitud(9, OTRO_PACIENTE), _solicitud(8, medico=OTRO_MEDICO)]
+    resultados = centro_salud.registro_citas_lote(solicitudes)
+    assert [resultado["error"] for resultado in resultados] == [None, None, None]
+    for solicitud, resultado in zip(solicitudes, resultados):
+        citas = _activas(solicitud["id_medico"], solicitud["fecha_hora"])
+        assert [cita["_CitaMedica__identificador_cita"] for cita in citas] == [resultado["identificador_cita"]]
+    assert not CalendarioCitas().hueco_libre(MEDICO[0], datetime(2041, 3, 1, 9, 0))
+
+
+def test_errores_por_solicitud(centro_salud):
+    centro_salud.registro_cita(*_solicitud(10, dia=2).values())
+    solicitudes = [
+        _solicitud(8, dia=2),
+        # Campos internos de CitaMedica, campos que faltan o solicitudes que no son diccionarios
+        dict(_solicitud(9, dia=2), clave_cita="00" * 16),
+        dict(_solicitud(9, dia=2), identificador_cita="abc"),
+        {clave: valor for clave, valor in _solicitud(9, dia=2).items() if clave != "motivo_consulta"},
+        "no es una solicitud",
+        # Fecha que no es un datetime
+        dict(_solicitud(9, dia=2), fecha_hora="2041-03-02 09:00:00"),
+        # Hueco ya reservado en el store y hueco pedido antes en el mismo lote
+        _solicitud(10, OTRO_PACIENTE, dia=2),
+        _solicitud(8, OTRO_PACIENTE, dia=2),
+        # Paciente no registrado
+        _solicitud(11, ("00000000X", "+34000000000"), dia=2),
+        _solicitud(12, OTRO_PACIENTE, dia=2),
+    ]
+    resultados = centro_salud.registro_citas_lote(solicitudes)
+    assert len(resultados) == len(solicitudes)
+    correctas = [posicion for posicion, resultado in enumerate(resultados) if resultado["error"] is None]
+    assert correctas == [0, 9]
+    assert all(resultados[posicion]["identificador_cita"] is None for posicion in range(1, 9))
+    assert "clave_cita" in resultados[1]["error"]
+    assert "identificador_cita" in resultados[2]["error"]
+    assert "motivo_consulta" in resultados[3]["error"]
+    assert "Hueco ya reservado" in resultados[6]["error"]
+    assert "Hueco ya reservado" in resultados[7]["error"]
+    # Las solicitudes rechazadas no reservan nada
+    assert _activas(MEDICO[0], datetime(2041, 3, 2, 9, 0)) == []
+    assert _activas(MEDICO[0], datetime(2041, 3, 2, 11, 0)) == []
+    assert len(_activas(MEDICO[0], datetime(2041, 3, 2, 10, 0))) == 1
+
+
+def test_error_en_un_intercambio_solo_descarta_su_cita(centro_salud, monkeypatch):
+    intercambiar = GestorCentroSalud._GestorCentroSalud__intercambiar_cita
+
+    def intercambiar_con_error(self, cita, paciente, medico):
+        if cita.motivo_consulta == "Falla":
+            raise ValueError("Error en el intercambio")
+        return intercambiar(self, cita, paciente, medico)
+
+    monkeypatch.setattr(GestorCentroSalud, "_GestorCentroSalud__intercambiar_cita", intercambiar_con_error)
+    solicitudes = [_solicitud(8, dia=3), _solicitud(9, dia=3, motivo="Falla"), _solicitud(10, dia=3)]
+    resultados = centro_salud.registro_citas_lote(solicitudes)
+    assert [resultado["error"] for resultado in resultados] == [None, "Error en el intercambio", None]
+    assert _activas(MEDICO[0], datetime(2041, 3, 3, 9, 0)) == []
+    assert len(_activas(MEDICO[0], datetime(2041, 3, 3, 10, 0))) == 1
+
+
+def test_lote_vacio(centro_salud):
+    assert centro_salud.registro_citas_lote([]) == []
+
+
+@pytest.mark.parametrize("solicitud", [{}, {"id_medico": "x"}])
+def test_lote_sin_solicitudes_correctas_no_escribe(centro_salud, solicitud):
+    version = CitaJsonStore().version_store()
+    resultados = centro_salud.registro_citas_lote([solicitud])
+    assert resultados[0]["identificador_cita"] is None
+    assert CitaJsonStore().version_store() == version
@@ -0,0 +1,126 @@
+"""Pruebas del registro masivo de pacientes y médicos"""
+import os
+import json
+import pytest
+from cryptography.exceptions import InvalidSignature
+
+from sistema_de_salud import registro_masivo
+from sistema_de_salud.registro_masivo import registrar_usuarios
+from sistema_de_salud.registro_masivo import leer_usuarios
+from sistema_de_salud.emisor_certificados import EmisorCertificados
+from sistema_de_salud.storage.paciente_json_store import PacienteJsonStore
+from sistema_de_salud.storage.medico_json_store import MedicoJsonStore
+from sistema_de_salud.storage.autenticacion_json_store import AutenticacionJsonStore
+from sistema_de_salud.cfg.gestor_centro_salud_config import KEY_FILES_PATH
+from sistema_de_salud.cfg.gestor_centro_salud_config import CERT_FILES_PATH
+
+
+def _paciente(id_paciente: str, **campos) -> dict:
+    fila = {"tipo": "paciente", "id": id_paciente, "nombre_completo": "Paciente Prueba", "telefono": "+34600000000",
+            "edad": "30", "password": "clave" + id_paciente}
+    fila.update(campos)
+    return fila
+
+
+def _medico(id_medico: str, **campos) -> dict:
+    fila = _paciente(id_medico, tipo="medico", nombre_completo="Medico Prueba", especialidad="Pediatria")
+    fila.update(campos)
+    return fila
+
+
+def _pem(id_usuario: str) -> tuple:
+    """Si existen la clave privada y el certificado del usuario"""
+    return (os.path.isfile(KEY_FILES_PATH + id_usuario + "_private_key.pem"),
+            os.path.isfile(CERT_FILES_PATH + id_usuario + "_cert.pem"))
+
+
+def _registrado(id_usuario: str) -> bool:
+    return (PacienteJsonStore().find_item(id_usuario) is not None or
+            MedicoJsonStore().find_item(id_usuario) is not None or
+            AutenticacionJsonStore().find_item(id_usuario) is not None)
+
+
+def test_registra_las_filas_correctas_y_devuelve_los_errores_por_fila(centro_salud):
+    filas = [
+        _paciente("R0000001"),
+        _paciente("R0000002", telefono=""),
+        _paciente("R0000003", tipo="administrador"),
+        # Id ya registrado por preparacion_sistema y id repetido en el propio fichero
+        _paciente("54026189V"),
+        _medico("R0000001"),
+        _medico("R0000006"),
+        _medico("R0000007", especialidad=None),
+    ]
+    informe = registrar_usuarios(centro_salud, filas)
+    assert informe["registrados"] == 2
+    assert [error["fila"] for error in informe["errores"]] == [2, 3, 4, 5, 7]
+    assert "telefono" in informe["errores"][0]["error"]
+    assert "administrador" in informe["errores"][1]["error"]
+    assert "especialidad" in informe["errores"][4]["error"]
+    assert PacienteJsonStore().find_item("R0000001") is not None
+    assert MedicoJsonStore().find_item("R0000006") is not None
+    assert _pem("R0000001") == (True, True)
+    assert _pem("R0000006") == (True, True)
+    for id_usuario in ("R0000002", "R0000003", "R0000007"):
+        assert not _registrado(id_usuario)
+        assert _pem(id_usuario) == (False, False)
+    assert centro_salud.autenticacion_paciente("R0000001", "claveR0000001") == 0
+    assert centro_salud.autenticacion_medico("R0000006", "claveR0000006") == 0
+
+
+def test_certificado_fallido_o_id_registrado_entretanto_solo_descartan_su_fila(centro_salud, monkeypatch):
+    policia = EmisorCertificados.policia
+
+    class EmisorConErrores:
+        """Emisor de la policía que rechaza la segunda CSR y, mientras firma, deja que
+        otro proceso registre el id de la tercera fila"""
+        @staticmethod
+        def emitir_lote(solicitudes, guardar=True):
+            certs = policia().emitir_lote(solicitudes, guardar)
+            certs[1] = InvalidSignature()
+            PacienteJsonStore().add_item({"_RegistroPaciente__id_paciente": "S0000003",
+                                          "_RegistroPaciente__mis_citas": []})
+            return certs
+
+    monkeypatch.setattr(EmisorCertificados, "policia", EmisorConErrores)
+    informe = registrar_usuarios(centro_salud, [_paciente("S000000" + str(numero)) for numero in range(1, 5)])
+    assert informe["registrados"] == 2
+    assert informe["errores"] == [{"fila": 2, "error": "InvalidSignature"},
+                                  {"fila": 3, "error": "ID de usuario ya registrado: S0000003"}]
+    assert [_pem("S000000" + str(numero)) for numero in range(1, 5)] == [(True, True), (False, False),
+                                                                         (False, False), (True, True)]
+    assert AutenticacionJsonStore().find_item("S0000002") is None
+    assert AutenticacionJsonStore().find_item("S0000003") is None
+
+
+def test_transaccion_descartada_borra_las_claves_y_certificados(centro_salud, monkeypatch):
+    def add_items_con_error(items):
+        raise OSError("Disco lleno")
+
+    monkeypatch.setattr(AutenticacionJsonStore(), "add_items", add_items_con_error)
+    with pytest.raises(OSError):
+        registrar_usuarios(centro_salud, [_paciente("D0000001"), _medico("D0000002")])
+    monkeypatch.undo()
+    for id_usuario in ("D0000001", "D0000002"):
+        assert not _registrado(id_usuario)
+        assert _pem(id_usuario) == (False, False)
+
+
+def test_sin_filas_correctas_no_registra_nada(centro_salud):
+    informe = registrar_usuarios(centro_salud, [_paciente("V0000001", password=""), {"tipo": "paciente"}])
+    assert informe["registrados"] == 0
+    assert [error["fila"] for error in informe["errores"]] == [1, 2]
+    assert not _registrado("V0000001")
+
+
+@pytest.mark.parametrize("formato", ["csv", "jsonl"])
+def test_leer_usuarios(tmp_path, formato):
+    filas = [_paciente("L0000001"), _paciente("L0000002")]
+    ruta = tmp_path / ("usuarios." + formato)
+    if formato == "csv":
+        ruta.write_text(",".join(registro_masivo.CAMPOS_PACIENTE) + "\n" +
+                        "".join(",".join(fila[campo] for campo in registro_masivo.CAMPOS_PACIENTE) + "\n"
+                                for fila in filas), encoding="utf-8")
+    else:
+        ruta.write_text("".join(json.dumps(fila) + "\n" for fila in filas) + "\n", encoding="utf-8")
+    assert leer_usuarios(str(ruta)) == filas
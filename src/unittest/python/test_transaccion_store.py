@@ -0,0 +1,228 @@
+"""Pruebas de TransaccionStore"""
+import os
+import json
+import subprocess
+import threading
+import pytest
+
+from sistema_de_salud.storage import transaccion_store
+from sistema_de_salud.storage.json_store import JsonStore
+from sistema_de_salud.storage.journal_store import JournalStore
+from sistema_de_salud.storage.particion_store import StoreParticionadoMes
+from sistema_de_salud.storage.bloqueo_store import BloqueoStore
+from sistema_de_salud.storage.transaccion_store import TransaccionStore
+from sistema_de_salud.storage.transaccion_store import transaccion_activa
+from sistema_de_salud.exception.excepciones_gestor import ExcepcionesGestor
+
+# Motores que guardan en la transacción los datos pendientes (sqlite usa la transacción de la base de datos)
+MOTORES = [JsonStore, JournalStore, StoreParticionadoMes]
+
+
+@pytest.fixture(autouse=True)
+def manifiestos(tmp_path, monkeypatch):
+    """Los manifiestos de las confirmaciones se escriben en la carpeta de la prueba"""
+    carpeta = str(tmp_path) + "/"
+    monkeypatch.setattr(TransaccionStore, "_MANIFIESTO_DIR", carpeta)
+    return carpeta
+
+
+def _crear(crear_store, motor, nombre: str):
+    """Store de prueba; el particionado reparte los items por el mes del campo fecha"""
+    return crear_store(motor, nombre, _PARTITION_FIELD="fecha")
+
+
+def _item(identificador: str, valor, mes: str = "2030-01") -> dict:
+    return {"id": identificador, "valor": valor, "fecha": mes + "-01 10:00:00"}
+
+
+@pytest.mark.parametrize("motor", MOTORES)
+def test_confirmar_escribe_todos_los_stores(crear_store, motor):
+    store_a = _crear(crear_store, motor, "store_a")
+    store_b = _crear(crear_store, motor, "store_b")
+    store_a.add_item(_item("1", 0))
+    with TransaccionStore(store_a, store_b):
+        store_a.update_item(_item("1", 1), "1")
+        store_a.add_item(_item("2", 2, "2030-02"))
+        store_b.add_items([_item("3", 3), _item("4", 4)])
+        # La transacción ve sus propias escrituras
+        assert store_a.find_item("1")["valor"] == 1
+        assert len(store_b.load_store()) == 2
+    assert transaccion_activa() is None
+    assert store_a.load_store() == [_item("1", 1), _item("2", 2, "2030-02")]
+    assert [item["id"] for item in store_b.load_store()] == ["3", "4"]
+    # Un store nuevo (como otro proceso) lee lo mismo de los ficheros
+    assert _crear(crear_store, motor, "store_a").load_store() == store_a.load_store()
+
+
+@pytest.mark.parametrize("motor", MOTORES)
+def test_descartar_no_escribe_nada(crear_store, motor):
+    store = _crear(crear_store, motor, "store_a")
+    store.add_item(_item("1", 0))
+    descartada = []
+    with pytest.raises(RuntimeError):
+        with TransaccionStore(store) as transaccion:
+            transaccion.al_descartar(lambda: descartada.append(True))
+            store.update_item(_item("1", 1), "1")
+            store.add_item(_item("2", 2, "2030-02"))
+            raise RuntimeError
+    assert descartada == [True]
+    assert store.load_store() == [_item("1", 0)]
+    assert _crear(crear_store, motor, "store_a").load_store() == [_item("1", 0)]
+
+
+@pytest.mark.parametrize("motor", MOTORES)
+def test_otros_hilos_no_ven_los_datos_sin_confirmar(crear_store, motor):
+    store = _crear(crear_store, motor, "store_a")
+    store.add_item(_item("1", 0))
+    dentro = threading.Event()
+    leido = threading.Event()
+    vistos = {}
+
+    def lector():
+        dentro.wait()
+        vistos["valor"] = store.find_item("1")["valor"]
+        vistos["items"] = len(store.load_store())
+        vistos["nuevo"] = store.find_item("2")
+        leido.set()
+
+    hilo = threading.Thread(target=lector)
+    hilo.start()
+    with TransaccionStore(store):
+        store.update_item(_item("1", 1), "1")
+        store.add_item(_item("2", 2, "2030-02"))
+        dentro.set()
+        leido.wait()
+    hilo.join()
+    assert vistos == {"valor": 0, "items": 1, "nuevo": None}
+    assert store.find_item("1")["valor"] == 1
+
+
+def test_transaccion_anidada_se_une_a_la_exterior(crear_store):
+    store = crear_store(JsonStore, "store_a")
+    with TransaccionStore(store) as exterior:
+        with TransaccionStore(store) as interior:
+            assert interior is exterior
+            store.add_item(_item("1", 0))
+        # Al salir de la interior todavía no se ha escrito nada
+        assert not os.path.isfile(store._FILE_PATH)
+    assert store.load_store() == [_item("1", 0)]
+
+
+def test_bloqueo_fuera_de_orden(crear_store):
+    store_a = crear_store(JsonStore, "store_a")
+    store_b = crear_store(JsonStore, "store_b")
+    with pytest.raises(ExcepcionesGestor):
+        with TransaccionStore(store_b):
+            # store_a va antes que store_b: habría que haberlo indicado al crear la transacción
+            store_a.add_item(_item("1", 0))
+    assert not os.path.isfile(store_a._FILE_PATH)
+
+
+def test_confirmacion_interrumpida_se_termina_al_recuperar(crear_store, monkeypatch, manifiestos):
+    store_a = crear_store(JsonStore, "store_a")
+    store_b = crear_store(JsonStore, "store_b")
+    replace = os.replace
+    renames = []
+
+    def replace_interrumpido(origen, destino):
+        # Falla el segundo rename de la confirmación, con el manifiesto ya escrito
+        if origen.endswith(".tx"):
+            renames.append(destino)
+            if len(renames) == 2:
+                raise OSError("interrumpido")
+        replace(origen, destino)
+
+    monkeypatch.setattr(transaccion_store.os, "replace", replace_interrumpido)
+    with pytest.raises(OSError):
+        with TransaccionStore(store_a, store_b):
+            store_a.add_item(_item("1", 1))
+            store_b.add_item(_item("2", 2))
+    monkeypatch.setattr(transaccion_store.os, "replace", replace)
+    assert len([nombre for nombre in os.listdir(manifiestos) if nombre.startswith("transaccion_pendiente_")]) == 1
+    TransaccionStore.recuperar()
+    assert not [nombre for nombre in os.listdir(manifiestos) if nombre.endswith((".tx", ".tmp"))
+                or nombre.startswith("transaccion_pendiente_")]
+    assert crear_store(JsonStore, "store_a").load_store() == [_item("1", 1)]
+    assert crear_store(JsonStore, "store_b").load_store() == [_item("2", 2)]
+
+
+def _manifiesto_pendiente(carpeta: str, nombre: str, pid: int) -> str:
+    """Deja en carpeta una confirmación interrumpida de a.json y b.json (antes "viejo", después "nuevo")"""
+    renames = []
+    for fichero in ("a.json", "b.json"):
+        with open(carpeta + fichero, "w", encoding="utf-8") as file:
+            file.write("viejo")
+        with open(carpeta + fichero + "." + nombre + ".tx", "w", encoding="utf-8") as file:
+            file.write("nuevo")
+        renames.append([carpeta + fichero + "." + nombre + ".tx", carpeta + fichero])
+    manifiesto_path = carpeta + TransaccionStore._MANIFIESTO_PREFIJO + nombre + ".json"
+    with open(manifiesto_path, "w", encoding="utf-8") as file:
+        json.dump({"pid": pid, "bloqueos": [carpeta + "a.lock", carpeta + "b.lock"], "renames": renames}, file)
+    return manifiesto_path
+
+
+def _leer(ruta: str) -> str:
+    with open(ruta, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+@pytest.fixture(scope="module")
+def pid_terminado():
+    """Pid de un proceso que ya ha terminado"""
+    proceso = subprocess.Popen(["true"])
+    proceso.wait()
+    return proceso.pid
+
+
+def test_recuperar_confirmacion_de_proceso_terminado(manifiestos, pid_terminado):
+    manifiesto_path = _manifiesto_pendiente(manifiestos, "terminado", pid_terminado)
+    TransaccionStore.recuperar()
+    assert _leer(manifiestos + "a.json") == "nuevo"
+    assert _leer(manifiestos + "b.json") == "nuevo"
+    assert not os.path.isfile(manifiesto_path)
+
+
+def test_recuperar_no_toca_la_confirmacion_de_un_proceso_vivo(manifiestos):
+    manifiesto_path = _manifiesto_pendiente(manifiestos, "vivo", os.getppid())
+    TransaccionStore.recuperar()
+    assert _leer(manifiestos + "a.json") == "viejo"
+    assert os.path.isfile(manifiesto_path)
+
+
+def test_recuperar_espera_a_que_se_liberen_los_bloqueos(manifiestos, pid_terminado):
+    manifiesto_path = _manifiesto_pendiente(manifiestos, "bloqueado", pid_terminado)
+    bloqueado = threading.Event()
+    liberar = threading.Event()
+
+    def ocupar_bloqueo():
+        with BloqueoStore(manifiestos + "b.lock", exclusivo=True):
+            bloqueado.set()
+            liberar.wait()
+
+    hilo = threading.Thread(target=ocupar_bloqueo)
+    hilo.start()
+    bloqueado.wait()
+    try:
+        # Con un bloqueo ocupado no se toca nada y se deja para otra llamada
+        TransaccionStore.recuperar()
+        assert _leer(manifiestos + "a.json") == "viejo"
+        assert os.path.isfile(manifiesto_path)
+    finally:
+        liberar.set()
+        hilo.join()
+    TransaccionStore.recuperar()
+    assert _leer(manifiestos + "a.json") == "nuevo"
+    assert _leer(manifiestos + "b.json") == "nuevo"
+    assert not os.path.isfile(manifiesto_path)
+
+
+def test_recuperar_no_hace_nada_dentro_de_una_transaccion(manifiestos, pid_terminado):
+    with TransaccionStore():
+        manifiesto_path = _manifiesto_pendiente(manifiestos, "dentro", pid_terminado)
+        TransaccionStore.recuperar()
+        assert os.path.isfile(manifiesto_path)
+    # Al terminar, la siguiente transacción la recupera al empezar
+    with TransaccionStore():
+        pass
+    assert _leer(manifiestos + "a.json") == "nuevo"
+    assert not os.path.isfile(manifiesto_path)